@@ -0,0 +1,232 @@
+"""
+Local SSH server that behaves like a small OpenWrt router.
+
+Built on paramiko's server side. Commands get canned `ifconfig`, `arp -a`,
+DHCP lease, `uptime`, /proc, `ping` and public IP answers after a configurable
+delay, snapshot scripts get one answer per section and `ip monitor address`
+stays open and reports every set_public_ip() call.
+"""
+
+import re
+import socket
+import threading
+import time
+
+import paramiko
+
+from router_utils.devices import LEASES_MARKER
+from router_utils.snapshot import SECTION_START
+
+IFCONFIG = """br-lan    Link encap:Ethernet  HWaddr 02:00:00:00:00:01
+          inet addr:192.168.1.1  Bcast:192.168.1.255  Mask:255.255.255.0
+          UP BROADCAST RUNNING MULTICAST  MTU:1500  Metric:1
+          RX packets:1234567 errors:0 dropped:0 overruns:0 frame:0
+          TX packets:7654321 errors:0 dropped:0 overruns:0 carrier:0
+
+eth1      Link encap:Ethernet  HWaddr 02:00:00:00:00:02
+          inet addr:203.0.113.7  Bcast:203.0.113.255  Mask:255.255.255.0
+          UP BROADCAST RUNNING MULTICAST  MTU:1500  Metric:1
+
+lo        Link encap:Local Loopback
+          inet addr:127.0.0.1  Mask:255.0.0.0
+          UP LOOPBACK RUNNING  MTU:65536  Metric:1
+"""
+
+UPTIME = " 12:00:00 up 12 days,  3:04,  load average: 0.08, 0.03, 0.01"
+
+LOADAVG = "0.08 0.03 0.01 1/98 4321"
+
+MEMINFO = """MemTotal:         245760 kB
+MemFree:           98304 kB
+MemAvailable:     143360 kB
+Buffers:            8192 kB
+Cached:            40960 kB
+"""
+
+# Provider names in the race script built by router_utils.external_ip
+RACE_PROVIDER = re.compile(r'echo "([\w-]+) \$\(')
+
+# One section of a script built by router_utils.snapshot.build_snapshot_script
+SNAPSHOT_SECTION = re.compile(r"echo '@@SNAPSHOT (\w+)@@'; \{ (.*?); \} 2>/dev/null; ")
+
+
+class FakeRouter:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, devices=50, public_ip="203.0.113.7"):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.device_count = devices
+        self.public_ip = public_ip
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.socket = None
+        self.thread = None
+        self.running = False
+        self.connections = 0
+        self.commands = 0
+        self.monitors = []
+        self.started_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def address(self):
+        return self.socket.getsockname()
+
+    def start(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(16)
+        self.running = True
+        self.thread = threading.Thread(target=self.accept_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.socket:
+            self.socket.close()
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                client, _ = self.socket.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections += 1
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.host_key)
+            transport.start_server(server=FakeRouterServer(self))
+
+    def set_public_ip(self, ip):
+        self.public_ip = ip
+        with self.lock:
+            monitors = list(self.monitors)
+        for channel in monitors:
+            try:
+                channel.sendall(f"3: eth1    inet {ip}/24 brd 203.0.113.255 scope global eth1\n".encode())
+            except Exception:
+                pass
+
+    def arp_table(self):
+        lines = []
+        for index in range(self.device_count):
+            lines.append(f"? (192.168.1.{index + 10}) at 02:00:00:00:{index // 256:02x}:{index % 256:02x} [ether]  on br-lan")
+        return "\n".join(lines)
+
+    def net_dev(self):
+        # Counters grow with the time since start, about 1 MB/s down and 100 kB/s up on the WAN
+        elapsed = time.monotonic() - self.started_at
+        lines = [
+            "Inter-|   Receive                                                |  Transmit",
+            " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed",
+        ]
+        for name, rx_rate, tx_rate in (("lo", 1000, 1000), ("br-lan", 100000, 1000000), ("eth1", 1000000, 100000)):
+            rx, tx = int(elapsed * rx_rate), int(elapsed * tx_rate)
+            lines.append(f"{name:>6}: {rx} {rx // 1000} 0 0 0 0 0 0 {tx} {tx // 1000} 0 0 0 0 0 0")
+        return "\n".join(lines) + "\n"
+
+    def leases(self):
+        lines = []
+        for index in range(0, self.device_count, 2):
+            lines.append(f"1900000000 02:00:00:00:{index // 256:02x}:{index % 256:02x} 192.168.1.{index + 10} device-{index} *")
+        return "\n".join(lines)
+
+    def respond(self, command):
+        """Returns a list of (delay, text) pieces to write to the channel, and the exit status."""
+        sections = SNAPSHOT_SECTION.findall(command)
+        if sections:
+            return [(self.latency, self.snapshot(sections))], 0
+        if "arp -a" in command:
+            output = self.arp_table() + "\n"
+            if LEASES_MARKER in command:
+                output += LEASES_MARKER + "\n" + self.leases() + "\n"
+            return [(self.latency, output)], 0
+        if "ifconfig" in command:
+            return [(self.latency, IFCONFIG)], 0
+        if command.strip() == "uptime":
+            return [(self.latency, UPTIME + "\n")], 0
+        if command == "cat /proc/loadavg":
+            return [(self.latency, LOADAVG + "\n")], 0
+        if command == "cat /proc/meminfo":
+            return [(self.latency, MEMINFO)], 0
+        if command == "cat /proc/net/dev":
+            return [(self.latency, self.net_dev())], 0
+        if command.startswith("ping"):
+            host = command.split()[-1]
+            pieces = [(self.latency, f"PING {host} ({host}): 56 data bytes\n")]
+            for sequence in range(10):
+                pieces.append((0.05, f"64 bytes from {host}: seq={sequence} ttl=57 time=12.3 ms\n"))
+            return pieces, 0
+        providers = RACE_PROVIDER.findall(command)
+        if providers:
+            return [(self.latency, f"{providers[0]} {self.public_ip}\n")], 0
+        if command.startswith(("curl", "wget")):
+            return [(self.latency, self.public_ip + "\n")], 0
+        if command.startswith("ip route"):
+            return [(self.latency, "192.168.0.1\n")], 0
+        return [(self.latency, "")], 127
+
+    def snapshot(self, sections):
+        output = []
+        for section, command in sections:
+            pieces, status = self.respond(command.lstrip("("))
+            output.append(SECTION_START.format(section) + "\n")
+            output.extend(text for _, text in pieces)
+            output.append(f"@@SNAPSHOT_END {section} {status}@@\n")
+        return "".join(output)
+
+    def serve_monitor(self, channel):
+        with self.lock:
+            self.monitors.append(channel)
+        try:
+            while self.running and not channel.closed and not channel.eof_received:
+                time.sleep(0.1)
+        finally:
+            with self.lock:
+                self.monitors.remove(channel)
+            channel.close()
+
+    def serve_command(self, channel, command):
+        with self.lock:
+            self.commands += 1
+        if command.startswith("ip monitor"):
+            self.serve_monitor(channel)
+            return
+        try:
+            pieces, status = self.respond(command)
+            for delay, text in pieces:
+                if delay:
+                    time.sleep(delay)
+                channel.sendall(text.encode())
+            channel.send_exit_status(status)
+        except Exception:
+            pass
+        finally:
+            channel.close()
+
+
+class FakeRouterServer(paramiko.ServerInterface):
+    def __init__(self, router):
+        self.router = router
+
+    def get_allowed_auths(self, username):
+        return "password,publickey"
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        thread = threading.Thread(target=self.router.serve_command, args=(channel, command.decode()), daemon=True)
+        thread.start()
+        return True
@@ -0,0 +1,182 @@
+"""
+Local stand-in for the Telegram Bot API.
+
+Implements just enough of the HTTP API for the bot to start, poll for updates
+and send messages, and records everything that is sent so a benchmark can
+measure delivery.
+"""
+
+import json
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class SentMessage:
+    __slots__ = ("method", "chat_id", "text", "received_at")
+
+    def __init__(self, method, chat_id, text, received_at):
+        self.method = method
+        self.chat_id = chat_id
+        self.text = text
+        self.received_at = received_at
+
+
+class FakeTelegramAPI:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.sent = []
+        self.updates = []
+        self.next_update_id = 1
+        self.next_message_id = 1
+        self.webhook_url = None
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.server.server_address[1]}"
+
+    def start(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                method = self.path.rstrip("/").rsplit("/", 1)[-1]
+                params = api.parse_params(self.headers.get("Content-Type", ""), body)
+                result = api.handle(method, params)
+                if api.latency:
+                    time.sleep(api.latency)
+                payload = json.dumps({"ok": True, "result": result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The bot gave up on the request or is shutting down
+                    pass
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def parse_params(self, content_type, body):
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+            params = {}
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if part.get_filename():
+                    params[name] = part.get_payload(decode=True)
+                else:
+                    params[name] = part.get_content()
+            return params
+        if content_type.startswith("application/json"):
+            return json.loads(body or b"{}")
+        return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+    def message(self, chat_id, text=None):
+        with self.lock:
+            message_id = self.next_message_id
+            self.next_message_id += 1
+        result = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+        }
+        if text is not None:
+            result["text"] = text
+        return result
+
+    def record(self, method, params, text):
+        with self.condition:
+            self.sent.append(SentMessage(method, params.get("chat_id"), text, time.monotonic()))
+            self.condition.notify_all()
+
+    def handle(self, method, params):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        if method == "getUpdates":
+            return self.get_updates(params)
+        if method in ("deleteWebhook", "setMyCommands", "close", "logOut"):
+            if method == "deleteWebhook":
+                self.webhook_url = None
+            return True
+        if method == "setWebhook":
+            self.webhook_url = params.get("url")
+            return True
+        if method == "sendMessage":
+            self.record(method, params, params.get("text", ""))
+            return self.message(params.get("chat_id", 0), params.get("text"))
+        if method == "editMessageText":
+            self.record(method, params, params.get("text", ""))
+            return self.message(params.get("chat_id", 0), params.get("text"))
+        if method == "sendDocument":
+            self.record(method, params, "")
+            return self.message(params.get("chat_id", 0))
+        return True
+
+    def get_updates(self, params):
+        timeout = min(float(params.get("timeout", 0) or 0), 1.0)
+        offset = int(params.get("offset", 0) or 0)
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                updates = [update for update in self.updates if update["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if updates or remaining <= 0:
+                    return updates
+                self.condition.wait(remaining)
+
+    def push_text(self, chat_id, text):
+        """Queue an incoming text message as if a user had sent it."""
+        with self.condition:
+            update_id = self.next_update_id
+            self.next_update_id += 1
+            self.updates.append({
+                "update_id": update_id,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": int(chat_id), "type": "private"},
+                    "from": {"id": int(chat_id), "is_bot": False, "first_name": "Bench"},
+                    "text": text,
+                    "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else [],
+                },
+            })
+            self.condition.notify_all()
+
+    def wait_for(self, predicate, timeout):
+        """Wait until predicate(sent_messages) is true, returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while not predicate(self.sent):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
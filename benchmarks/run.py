@@ -0,0 +1,282 @@
+"""
+End-to-end benchmark for the command pipeline.
+
+Starts a fake SSH router and a fake Telegram Bot API on localhost, wires the
+real Config, Router, TelegramBot and CommandDispatcher to them the same way
+main does, floods the command queue and reports throughput, latency
+percentiles and memory. Results are written as JSON so runs can be compared.
+
+    python -m benchmarks.run --commands 200 --router-latency 0.05
+    python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import queue
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import tomli_w
+
+import config
+import metrics
+import router_utils
+import telegram_bot
+from config.logger import get_logger, stop_logging
+from dispatcher import CommandDispatcher
+
+from .fake_router import FakeRouter
+from .fake_telegram import FakeTelegramAPI
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+CHAT_ID = 1000
+
+# Command and a piece of text that is unique to its reply
+COMMAND_REPLIES = {
+    "/router_ip": "Router IP Info:",
+    "/router_devices": "Connected Devices:",
+    "/help": "Available commands:",
+    "/router_ip_providers": "Public IP providers:",
+}
+
+# Metrics where a higher value is better, everything else is treated as lower-is-better
+HIGHER_IS_BETTER = {"throughput"}
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[index]
+
+
+def write_configs(directory, router, telegram, args):
+    os.makedirs(os.path.join(directory, "configs"), exist_ok=True)
+    router_config = {
+        "ssh_hostname": router.address[0],
+        "ssh_port": router.address[1],
+        "username": "bench",
+        "password": "bench",
+        "ssh_key_path": "",
+        "ip_watcher_enabled": False,
+    }
+    if args.no_cache:
+        router_config.update({"cache_ttl_ip_address": 0, "cache_ttl_devices": 0, "cache_stale_ttl": 0})
+    telegram_config = {
+        "token": "123456:benchmark",
+        "chat_id": str(CHAT_ID),
+        "base_url": telegram.base_url,
+        "duplicate_window": 0,
+        # Measure the pipeline, not Telegram's rate limits, unless asked to
+        "rate_limit_global": args.rate_limit,
+        "rate_limit_per_chat": args.rate_limit,
+        "rate_limit_burst": args.rate_limit,
+    }
+    global_config = {"log_level": "WARNING", "logging_file": "bench.log"}
+    for name, data in (("router", router_config), ("telegram", telegram_config), ("global", global_config)):
+        with open(os.path.join(directory, "configs", f"{name}.toml"), "wb") as f:
+            tomli_w.dump(data, f)
+
+
+def command_mix(count, names):
+    return [names[index % len(names)] for index in range(count)]
+
+
+def run_benchmark(args):
+    fake_router = FakeRouter(latency=args.router_latency, devices=args.devices)
+    fake_router.start()
+    fake_telegram = FakeTelegramAPI(latency=args.telegram_latency)
+    fake_telegram.start()
+
+    workdir = tempfile.mkdtemp(prefix="server_tools_bench_")
+    write_configs(workdir, fake_router, fake_telegram, args)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    tracemalloc.start()
+    try:
+        global_config = config.Config("configs/global.toml", config_type=config.CONFIG_GLOBAL)
+        logger = get_logger(log_file="bench.log", level=global_config.get("log_level", "WARNING"))
+
+        startup_started = time.monotonic()
+        command_queue = queue.Queue()
+        telegram_config = config.Config("configs/telegram.toml", config_type=config.CONFIG_TELEGRAM, logger=logger)
+        bot = telegram_bot.TelegramBot(telegram_config, logger=logger, command_queue=command_queue)
+        bot.start()
+        router_config = config.Config("configs/router.toml", config_type=config.CONFIG_ROUTER, logger=logger)
+        router = router_utils.init_router_connection(router_config, logger=logger)
+        router.set_message_callback(lambda msg: bot.send_message(msg))
+        while bot.loop is None:
+            time.sleep(0.01)
+        startup_time = time.monotonic() - startup_started
+
+        dispatcher = CommandDispatcher(command_queue, router, bot, logger=logger)
+        dispatcher_thread = threading.Thread(target=asyncio.run, args=(dispatcher.run(),), daemon=True)
+        dispatcher_thread.start()
+
+        commands = command_mix(args.commands, args.mix.split(","))
+        expected = {name: commands.count(name) for name in set(commands)}
+        enqueued = {name: [] for name in expected}
+        ssh_commands_before = fake_router.commands
+
+        started = time.monotonic()
+        for command in commands:
+            enqueued_at = time.monotonic()
+            enqueued[command].append(enqueued_at)
+            command_queue.put((command, enqueued_at))
+            if args.interval:
+                time.sleep(args.interval)
+
+        def replies(sent):
+            counts = {name: 0 for name in expected}
+            for message in sent:
+                for name in expected:
+                    counts[name] += message.text.count(COMMAND_REPLIES[name])
+            return counts
+
+        done = fake_telegram.wait_for(lambda sent: replies(sent) == expected, args.timeout)
+        elapsed = time.monotonic() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+
+        # Pair the n-th reply of each command with the n-th time it was queued
+        latencies = []
+        seen = {name: 0 for name in expected}
+        for message in list(fake_telegram.sent):
+            for name in expected:
+                for _ in range(message.text.count(COMMAND_REPLIES[name])):
+                    if seen[name] < len(enqueued[name]):
+                        latencies.append(message.received_at - enqueued[name][seen[name]])
+                        seen[name] += 1
+
+        dispatcher.stop()
+        bot.disconnect()
+        # Let the updater finish its last get_updates before the fake API goes away
+        deadline = time.monotonic() + 5
+        while bot.loop is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        router.disconnect()
+        stop_logging()
+    finally:
+        tracemalloc.stop()
+        os.chdir(cwd)
+        fake_router.stop()
+        fake_telegram.stop()
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "parameters": {
+            "commands": args.commands,
+            "mix": args.mix,
+            "router_latency": args.router_latency,
+            "telegram_latency": args.telegram_latency,
+            "devices": args.devices,
+            "interval": args.interval,
+            "no_cache": args.no_cache,
+            "rate_limit": args.rate_limit,
+        },
+        "completed": done,
+        "replies": sum(seen.values()),
+        "duration": elapsed,
+        "startup": startup_time,
+        "throughput": sum(seen.values()) / elapsed if elapsed else 0.0,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p99": percentile(latencies, 0.99),
+        "latency_mean": statistics.fmean(latencies) if latencies else 0.0,
+        "telegram_requests": len(fake_telegram.sent),
+        "ssh_commands": fake_router.commands - ssh_commands_before,
+        "ssh_connections": fake_router.connections,
+        "peak_memory_bytes": peak_memory,
+        "metrics": metrics.REGISTRY.summary(),
+    }
+
+
+def print_report(result):
+    print(f"completed:          {result['completed']} ({result['replies']} replies)")
+    print(f"duration:           {result['duration']:.3f}s (startup {result['startup']:.3f}s)")
+    print(f"throughput:         {result['throughput']:.1f} commands/s")
+    print(f"latency p50/p99:    {result['latency_p50'] * 1000:.1f}ms / {result['latency_p99'] * 1000:.1f}ms")
+    print(f"telegram requests:  {result['telegram_requests']}")
+    print(f"ssh commands:       {result['ssh_commands']} over {result['ssh_connections']} connection(s)")
+    if not result["ssh_commands"] and not result["parameters"]["no_cache"]:
+        print("                    (answered from the cache seeded at startup, use --no-cache to measure the router path)")
+    print(f"peak memory:        {result['peak_memory_bytes'] / 1024:.0f} KiB")
+
+
+def save_result(result, directory=RESULTS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    name = result["timestamp"].replace(":", "").replace("+0000", "Z")
+    path = os.path.join(directory, f"{name}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def latest_result(directory=RESULTS_DIR, exclude=None):
+    if not os.path.isdir(directory):
+        return None
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.endswith(".json") and os.path.join(directory, name) != exclude
+    )
+    return paths[-1] if paths else None
+
+
+def compare(result, baseline_path, threshold):
+    """Print the change per metric against a stored run, returns True if anything regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\ncompared with {baseline_path}:")
+    regressed = False
+    for key in ("throughput", "latency_p50", "latency_p99", "peak_memory_bytes", "ssh_commands", "telegram_requests"):
+        old, new = baseline.get(key), result.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = change < -threshold if key in HIGHER_IS_BETTER else change > threshold
+        regressed = regressed or worse
+        flag = "  REGRESSION" if worse else ""
+        print(f"  {key:<18} {old:>12.4g} -> {new:<12.4g} ({change:+.1%}){flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the command pipeline against a fake router and Telegram API")
+    parser.add_argument("--commands", type=int, default=200, help="number of commands to send")
+    parser.add_argument("--mix", default="/router_ip,/router_devices,/help", help="comma separated commands to cycle through")
+    parser.add_argument("--router-latency", type=float, default=0.02, help="seconds the fake router takes per command")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="seconds the fake Telegram API takes per request")
+    parser.add_argument("--devices", type=int, default=50, help="devices in the fake arp table")
+    parser.add_argument("--interval", type=float, default=0.0, help="seconds between queued commands, 0 floods")
+    parser.add_argument("--no-cache", action="store_true", help="disable the router read cache, without it the default mix "
+                        "is answered from the cache the startup fetch seeds and runs no ssh commands")
+    parser.add_argument("--rate-limit", type=float, default=1000, help="outbound messages per second")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for all replies")
+    parser.add_argument("--compare", help="result file to compare with, defaults to the latest stored run")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    parser.add_argument("--no-save", action="store_true", help="don't store the result")
+    args = parser.parse_args(argv)
+
+    for name in args.mix.split(","):
+        if name not in COMMAND_REPLIES:
+            parser.error(f"unsupported command in mix: {name}")
+
+    result = run_benchmark(args)
+    print_report(result)
+
+    path = None if args.no_save else save_result(result)
+    if path:
+        print(f"\nsaved to {path}")
+    baseline = args.compare or latest_result(exclude=path)
+    regressed = compare(result, baseline, args.threshold) if baseline else False
+    return 1 if regressed or not result["completed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,49 +2,64 @@
 Telegram command handlers for the server tools program.
 """
 
-import os
+import re
+from datetime import datetime
+
+import metrics
+from scheduler import SCHEDULER
+from config.config import loaded_configs
+from config.consts import default_global_config_path
+from router_utils.devices import format_devices
+from router_utils.fleet import FLEET_ACTIONS, format_fleet_results
+from router_utils.snapshot import SNAPSHOT_SECTIONS
 
 def enable_ip_watcher(router, bot):
-    router.config.config["ip_watcher_enabled"] = True
-    router.config.save()
+    router.config.set("ip_watcher_enabled", True)
+    router.config.save(deferred=True)
     router.start_ip_watcher()
-    bot.send_message("Public IP watcher enabled. Monitoring for public IP changes every 5 minutes.")
+    if router.config.get("ip_watcher_mode", "monitor") == "monitor":
+        bot.send_message("Public IP watcher enabled. Watching the WAN interface for address changes.")
+    else:
+        bot.send_message("Public IP watcher enabled. Polling for public IP changes.")
 
 def disable_ip_watcher(router, bot):
-    router.config.config["ip_watcher_enabled"] = False
-    router.config.save()
+    router.config.set("ip_watcher_enabled", False)
+    router.config.save(deferred=True)
     router.stop_ip_watcher()
     bot.send_message("Public IP watcher disabled.")
 
+def enable_presence_tracker(router, bot):
+    router.config.set("presence_tracker_enabled", True)
+    router.config.save(deferred=True)
+    router.start_presence_tracker()
+    bot.send_message("Presence tracker enabled. You will be notified when devices join or leave the network.")
+
+def disable_presence_tracker(router, bot):
+    router.config.set("presence_tracker_enabled", False)
+    router.config.save(deferred=True)
+    router.stop_presence_tracker()
+    bot.send_message("Presence tracker disabled.")
+
+def format_settings(settings):
+    lines = []
+    for key, value in settings.items():
+        if "password" in key.lower() or "token" in key.lower() or "secret" in key.lower():
+            lines.append(f"  {key} = ***masked***")
+        else:
+            lines.append(f"  {key} = {value!r}")
+    return lines
+
 def show_settings(router, bot):
-    """Show all configuration settings from config files"""
+    """Show all configuration settings from the loaded configs"""
     try:
-        # Send a simple test message first
-        print(f"DEBUG: show_settings called, router type: {type(router)}, config type: {type(router.config)}")
-        bot.send_message("Settings command received!")
-        
-        # Then send the actual settings
+        global_config = loaded_configs.get(default_global_config_path)
         settings = ["🔧 Global Settings:"]
-        
-        if os.path.exists("configs/global.toml"):
-            with open("configs/global.toml", "r") as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith("#"):
-                        settings.append(f"  {line}")
+        if global_config:
+            settings.extend(format_settings(global_config.config))
         
         settings.append("")
         settings.append("🌐 Router Settings:")
-        if os.path.exists("configs/router.toml"):
-            with open("configs/router.toml", "r") as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith("#"):
-                        if "password" in line.lower():
-                            key = line.split("=")[0].strip()
-                            settings.append(f"  {key} = ***masked***")
-                        else:
-                            settings.append(f"  {line}")
+        settings.extend(format_settings(router.config.config))
         
         message = "\n".join(settings)
         bot.send_message(f"Current Settings:\n\n{message}")
@@ -52,13 +67,135 @@ def show_settings(router, bot):
     except Exception as e:
         bot.send_message(f"Error: {str(e)}")
 
+def show_device(router, bot, query):
+    if not query:
+        bot.send_message(f"Usage: {CMD_ROUTER_DEVICE} <ip|mac|hostname>")
+        return
+    device = router.find_device(query)
+    if device is None:
+        bot.send_message(f"No connected device matches {query}")
+    else:
+        bot.send_message(f"Device online:\n{device.format()}")
+
+def router_ping(router, bot, host):
+    if not HOSTNAME_PATTERN.match(host):
+        bot.send_message(f"Usage: {CMD_ROUTER_PING} <host>")
+        return
+    bot.stream_message(router.stream_command(f"ping -c 10 {host}"), f"📡 ping {host}")
+
+def enable_traffic_monitor(router, bot):
+    router.config.set("traffic_enabled", True)
+    router.config.save(deferred=True)
+    router.start_traffic_monitor()
+    bot.send_message(f"Traffic sampler enabled, sampling every {router.config.get('traffic_sample_interval', 5)}s.")
+
+def disable_traffic_monitor(router, bot):
+    router.config.set("traffic_enabled", False)
+    router.config.save(deferred=True)
+    router.stop_traffic_monitor()
+    bot.send_message("Traffic sampler disabled.")
+
+def show_traffic(router, bot, args):
+    monitor = router.traffic_monitor
+    tiers = monitor.tier_names()
+    if args and args not in tiers:
+        bot.send_message(f"Usage: {CMD_TRAFFIC} [{'|'.join(tiers)}]")
+        return
+    summary = monitor.summary(tiers.index(args) if args else 0)
+    if not monitor.is_running():
+        summary += f"\n\nThe traffic sampler is off, turn it on with {CMD_TRAFFIC_ENABLE}"
+    bot.send_message(summary)
+
+def show_status(router, bot, args):
+    sections = args.split()
+    if sections and not set(sections) <= set(SNAPSHOT_SECTIONS):
+        bot.send_message(f"Usage: {CMD_STATUS} [{' '.join(SNAPSHOT_SECTIONS)}]")
+        return
+    bot.send_message(router.snapshot(sections).format())
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+def show_ip_history(router, bot, args):
+    if router.history is None:
+        bot.send_message("History is disabled, set history_enabled in global.toml")
+        return
+    limit = int(args) if args.isdigit() else 10
+    rows = router.history.ip_history(router.history_key, min(limit, 100))
+    if not rows:
+        bot.send_message("No public IP history yet.")
+        return
+    lines = [f"{format_time(seen_at)}  {ip}" for ip, seen_at in rows]
+    bot.send_message("Public IP history:\n" + "\n".join(lines))
+
+def show_last_seen(router, bot, query):
+    if not query:
+        bot.send_message(f"Usage: {CMD_LAST_SEEN} <ip|mac|hostname>")
+        return
+    if router.history is None:
+        bot.send_message("History is disabled, set history_enabled in global.toml")
+        return
+    row = router.history.last_seen(query, router.history_key)
+    if row is None:
+        bot.send_message(f"No device matching {query} was ever seen")
+        return
+    mac, ip, hostname, first_seen, last_seen, online = row
+    state = "online now" if online else f"last seen {format_time(last_seen)}"
+    bot.send_message(f"{hostname or 'unknown'} - {ip} ({mac})\n{state}, connected since {format_time(first_seen)}")
+
+def fleet_command(fleet, bot, args):
+    target, _, action = args.partition(" ")
+    action = action.strip()
+    if not target:
+        bot.send_message(f"Router fleet:\n{fleet.summary()}")
+        return
+    if action not in FLEET_ACTIONS:
+        actions = ", ".join(sorted(FLEET_ACTIONS))
+        bot.send_message(f"Usage: {CMD_FLEET} <router|group|all> <{actions}>")
+        return
+    try:
+        results = fleet.run_action(target, action)
+    except ValueError as e:
+        groups = ", ".join(fleet.groups()) or "none"
+        bot.send_message(f"{e}\nRouters: {', '.join(fleet.members)}\nGroups: {groups}")
+        return
+    bot.send_message(format_fleet_results(action, results))
+
+def show_help(router, bot):
+    commands = sorted(list(COMMAND_HANDLERS.keys()) + list(COMMAND_ARG_HANDLERS.keys()) + list(FLEET_COMMAND_HANDLERS.keys()))
+    bot.send_message("Available commands:\n" + "\n".join(commands))
+
+COMMANDS_TOTAL = metrics.counter("commands_total", "Commands handled by result", ("command", "result"))
+
+# Seconds a router command waits for a router that is still connecting
+ROUTER_CONNECT_WAIT = 20
+
+# Hostnames and IPv4 addresses only, the value ends up in a remote shell command
+HOSTNAME_PATTERN = re.compile(r'^[A-Za-z0-9](?:[A-Za-z0-9.-]{0,252}[A-Za-z0-9])?$')
+
 # Command constants
 CMD_ROUTER_IP = "/router_ip"
 CMD_ROUTER_DEVICES = "/router_devices"
+CMD_ROUTER_DEVICE = "/router_device"
+CMD_ROUTER_PING = "/router_ping"
 CMD_ROUTER_IP_WATCHER = "/router_ip_watcher"
+CMD_STATUS = "/status"
+CMD_TRAFFIC = "/traffic"
+CMD_TRAFFIC_ENABLE = "/traffic_enable"
+CMD_TRAFFIC_DISABLE = "/traffic_disable"
 CMD_PUBLIC_IP_WATCHER_ENABLE = "/public_ip_watcher_enable"
 CMD_PUBLIC_IP_WATCHER_DISABLE = "/public_ip_watcher_disable"
+CMD_PRESENCE_TRACKER_ENABLE = "/presence_tracker_enable"
+CMD_PRESENCE_TRACKER_DISABLE = "/presence_tracker_disable"
+CMD_ROUTER_IP_PROVIDERS = "/router_ip_providers"
+CMD_ROUTER_CACHE = "/router_cache"
 CMD_SETTINGS = "/settings"
+CMD_BOT_STATS = "/bot_stats"
+CMD_METRICS = "/metrics"
+CMD_FLEET = "/fleet"
+CMD_JOBS = "/jobs"
+CMD_IP_HISTORY = "/ip_history"
+CMD_LAST_SEEN = "/last_seen"
 
 CMD_START = "/start"
 CMD_HELP = "/help"
@@ -67,23 +204,106 @@ CMD_HELP = "/help"
 ROUTER_COMMANDS = [
     CMD_ROUTER_IP,
     CMD_ROUTER_DEVICES,
+    CMD_ROUTER_DEVICE,
+    CMD_ROUTER_PING,
+    CMD_STATUS,
+    CMD_TRAFFIC,
+    CMD_TRAFFIC_ENABLE,
+    CMD_TRAFFIC_DISABLE,
     CMD_ROUTER_IP_WATCHER,
     CMD_PUBLIC_IP_WATCHER_ENABLE,
     CMD_PUBLIC_IP_WATCHER_DISABLE,
+    CMD_PRESENCE_TRACKER_ENABLE,
+    CMD_PRESENCE_TRACKER_DISABLE,
+    CMD_ROUTER_IP_PROVIDERS,
+    CMD_ROUTER_CACHE,
+    CMD_IP_HISTORY,
+    CMD_LAST_SEEN,
 ]
 
 # Command handlers - functions that take (router, bot) and handle the command
 COMMAND_HANDLERS = {
     CMD_ROUTER_IP: lambda router, bot: bot.send_message(f"Router IP Info:\n{router.get_ip_address()}"),
-    CMD_ROUTER_DEVICES: lambda router, bot: bot.send_message(f"Connected Devices:\n{router.get_connected_devices()}"),
+    CMD_ROUTER_DEVICES: lambda router, bot: bot.send_message(f"Connected Devices:\n{format_devices(router.get_connected_devices())}"),
     #CMD_ROUTER_IP_WATCHER:,
+    CMD_ROUTER_IP_PROVIDERS: lambda router, bot: bot.send_message(f"Public IP providers:\n{router.ip_resolver.summary()}"),
+    CMD_ROUTER_CACHE: lambda router, bot: bot.send_message(f"Router cache:\n{router.cache.summary()}"),
     CMD_PUBLIC_IP_WATCHER_ENABLE: lambda router, bot: enable_ip_watcher(router, bot),
     CMD_PUBLIC_IP_WATCHER_DISABLE: lambda router, bot: disable_ip_watcher(router, bot),
+    CMD_PRESENCE_TRACKER_ENABLE: lambda router, bot: enable_presence_tracker(router, bot),
+    CMD_PRESENCE_TRACKER_DISABLE: lambda router, bot: disable_presence_tracker(router, bot),
+    CMD_TRAFFIC_ENABLE: lambda router, bot: enable_traffic_monitor(router, bot),
+    CMD_TRAFFIC_DISABLE: lambda router, bot: disable_traffic_monitor(router, bot),
     CMD_SETTINGS: lambda router, bot: show_settings(router, bot),
-    CMD_HELP: lambda router, bot: bot.send_message("Available commands:\n" + "\n".join(sorted(COMMAND_HANDLERS.keys()))),
+    CMD_BOT_STATS: lambda router, bot: bot.send_message(f"Outbound messages:\n{bot.delivery_summary()}"),
+    CMD_JOBS: lambda router, bot: bot.send_message(f"Scheduled jobs:\n{SCHEDULER.summary()}"),
+    CMD_HELP: lambda router, bot: show_help(router, bot),
+}
+
+# Command handlers that take arguments - functions that take (router, bot, args)
+COMMAND_ARG_HANDLERS = {
+    CMD_ROUTER_DEVICE: lambda router, bot, args: show_device(router, bot, args),
+    CMD_ROUTER_PING: lambda router, bot, args: router_ping(router, bot, args),
+    CMD_STATUS: lambda router, bot, args: show_status(router, bot, args),
+    CMD_TRAFFIC: lambda router, bot, args: show_traffic(router, bot, args),
+    CMD_IP_HISTORY: lambda router, bot, args: show_ip_history(router, bot, args),
+    CMD_LAST_SEEN: lambda router, bot, args: show_last_seen(router, bot, args),
+    CMD_METRICS: lambda router, bot, args: bot.send_message(f"Metrics:\n{metrics.REGISTRY.summary(args or None)}"),
+}
+
+# Command handlers for the router fleet - functions that take (fleet, bot, args)
+FLEET_COMMAND_HANDLERS = {
+    CMD_FLEET: lambda fleet, bot, args: fleet_command(fleet, bot, args),
 }
 
-def handle_command(command, router, bot):
+# Max number of concurrent runs per command, commands not listed use the dispatcher default.
+# Concurrent router reads share one in-flight fetch, so they don't need to queue behind each other
+COMMAND_CONCURRENCY = {
+    CMD_ROUTER_IP: 4,
+    CMD_ROUTER_DEVICES: 4,
+    CMD_ROUTER_DEVICE: 4,
+    CMD_ROUTER_PING: 2,
+    CMD_STATUS: 2,
+    CMD_FLEET: 2,
+    CMD_PUBLIC_IP_WATCHER_ENABLE: 1,
+    CMD_PUBLIC_IP_WATCHER_DISABLE: 1,
+    CMD_PRESENCE_TRACKER_ENABLE: 1,
+    CMD_PRESENCE_TRACKER_DISABLE: 1,
+    CMD_TRAFFIC_ENABLE: 1,
+    CMD_TRAFFIC_DISABLE: 1,
+}
+
+# Per-command timeouts in seconds, commands not listed use the dispatcher default
+COMMAND_TIMEOUTS = {
+    CMD_ROUTER_IP: 30,
+    CMD_ROUTER_DEVICES: 30,
+    CMD_ROUTER_PING: 60,
+    CMD_STATUS: 60,
+    CMD_FLEET: 90,
+    CMD_SETTINGS: 10,
+    CMD_HELP: 10,
+}
+
+def parse_command(text):
+    """
+    Split a message into the command name and its arguments.
+
+    Returns:
+        tuple: (command, args) where args is the remaining text
+    """
+    text = text.strip()
+    command, _, args = text.partition(" ")
+    # Strip the bot username from commands like /help@my_bot
+    command = command.split("@", 1)[0]
+    return command, args.strip()
+
+def command_label(command):
+    """Metric label for a command name, anything that is not a known command shares one label."""
+    if command in COMMAND_HANDLERS or command in COMMAND_ARG_HANDLERS or command in FLEET_COMMAND_HANDLERS:
+        return command
+    return "unknown"
+
+def handle_command(command, router, bot, fleet=None):
     """
     Handle a Telegram command.
     
@@ -91,15 +311,35 @@ def handle_command(command, router, bot):
         command (str): The command received
         router: Router instance
         bot: TelegramBot instance
+        fleet: RouterFleet instance, None when no fleet is configured
     
     Returns:
         bool: True if command was handled, False otherwise
     """
-    if command in COMMAND_HANDLERS:
-        try:
-            COMMAND_HANDLERS[command](router, bot)
+    command, args = parse_command(command)
+    if command in ROUTER_COMMANDS and router is not None and not router.wait_ready(0):
+        bot.send_message("⏳ Router connecting…, your command runs as soon as it is up")
+        if not router.wait_ready(ROUTER_CONNECT_WAIT):
+            COMMANDS_TOTAL.inc(command=command, result="error")
+            bot.send_message(f"Router is not available yet, try {command} again later")
             return True
-        except Exception as e:
-            bot.send_message(f"Error executing {command}: {e}")
+    if command in COMMAND_HANDLERS:
+        handler = lambda: COMMAND_HANDLERS[command](router, bot)
+    elif command in COMMAND_ARG_HANDLERS:
+        handler = lambda: COMMAND_ARG_HANDLERS[command](router, bot, args)
+    elif command in FLEET_COMMAND_HANDLERS:
+        if fleet is None:
+            bot.send_message("No router fleet configured, set fleet_config in global.toml")
+            COMMANDS_TOTAL.inc(command=command, result="error")
             return True
-    return False
\ No newline at end of file
+        handler = lambda: FLEET_COMMAND_HANDLERS[command](fleet, bot, args)
+    else:
+        COMMANDS_TOTAL.inc(command="unknown", result="unknown")
+        return False
+    try:
+        handler()
+        COMMANDS_TOTAL.inc(command=command, result="ok")
+    except Exception as e:
+        COMMANDS_TOTAL.inc(command=command, result="error")
+        bot.send_message(f"Error executing {command}: {e}")
+    return True
\ No newline at end of file
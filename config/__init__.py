@@ -1,8 +1,11 @@
-from .config import Config
+from .config import Config, loaded_configs
+from .watcher import ConfigWatcher
 from .consts import CONFIG_GLOBAL, CONFIG_ROUTER, CONFIG_TELEGRAM
 
 __all__ = [
     "Config",
+    "ConfigWatcher",
+    "loaded_configs",
     "CONFIG_GLOBAL",
     "CONFIG_TELEGRAM",
     "CONFIG_ROUTER",
@@ -2,24 +2,48 @@ import tomllib
 import tomli_w
 import os
 import logging
+import tempfile
+import threading
 
 from config import consts
+from scheduler import SCHEDULER
+
+# Every Config created in this process by file path, so settings can be shown from memory
+loaded_configs = {}
 
 class Config:
-    def __init__(self, config_file_path: str, config_type: int = 0, logger: logging.Logger = None):
+    def __init__(self, config_file_path: str, config_type: int = 0, logger: logging.Logger = None,
+                 write_behind_delay: float = 0):
         self.config_file_path = config_file_path
+        self.config_type = config_type
         self.config = {}
         self.logger = logger
+        self.subscribers = []
+        self.file_signature = None
+        self.write_behind_delay = write_behind_delay
+        self.saved_data = None
+        self.save_job = None
+        self.save_lock = threading.Lock()
     
         try:
             self.load()
-            self.validate()
         except Exception as e:
             if self.logger:
-                self.logger.error(f"Error loading config: {e}")
+                self.logger.error("Error loading config: %s", e)
             else:
-                logging.error(f"Error loading config: {e}")
+                logging.error("Error loading config: %s", e)
             self.init_default(config_type)
+        
+        # Only warn here, resetting would throw away the user's file over one bad value
+        try:
+            self.validate()
+        except ValueError as e:
+            if self.logger:
+                self.logger.warning("Config %s has invalid values: %s", config_file_path, e)
+            else:
+                logging.warning("Config %s has invalid values: %s", config_file_path, e)
+        
+        loaded_configs[config_file_path] = self
     
     def init_default(self, config_type: int):
         if config_type == consts.CONFIG_GLOBAL:
@@ -31,7 +55,7 @@ class Config:
         else:
             raise ValueError("Invalid config type")
     
-    def load(self):
+    def read_file(self) -> dict:
         if self.config_file_path is None:
             raise ValueError("Config file path cannot be None")
         
@@ -40,39 +64,184 @@ class Config:
         
         try:
             with open(self.config_file_path, "rb") as f:
-                self.config = tomllib.load(f)
+                config = tomllib.load(f)
         except Exception as e:
             if self.logger:
-                self.logger.error(f"Failed to load config file: {e}")
+                self.logger.error("Failed to load config file: %s", e)
             else:
-                logging.error(f"Failed to load config file: {e}")
+                logging.error("Failed to load config file: %s", e)
             raise ValueError(f"Failed to load config file: {e}")
         
-        if not isinstance(self.config, dict):
+        if not isinstance(config, dict):
             raise ValueError("Config file is not a valid TOML dictionary")
         
-        if self.config is None:
+        if config is None:
             raise ValueError("Config file is empty or invalid")
         
-        if self.config == {}:
+        if config == {}:
             raise ValueError("Config file is empty")
+        
+        return config
+    
+    def load(self):
+        self.file_signature = self.get_file_signature()
+        self.config = self.read_file()
+        self.saved_data = tomli_w.dumps(self.config)
+    
+    def get_file_signature(self):
+        try:
+            stat = os.stat(self.config_file_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def has_changed_on_disk(self) -> bool:
+        return self.get_file_signature() != self.file_signature
+    
+    def subscribe(self, callback):
+        """Register callback(config, changed_keys) to run after every reload that changed something."""
+        self.subscribers.append(callback)
+    
+    def reload(self) -> set:
+        """
+        Re-read the config file and apply it if it is valid.
+        
+        Returns:
+            set: Keys that were added, removed or changed
+        """
+        signature = self.get_file_signature()
+        new_config = self.read_file()
+        self.validate(new_config)
+        
+        with self.save_lock:
+            old_config = self.config
+            file_data = tomli_w.dumps(new_config)
+            # Values set but not written yet would be lost with the old dict, they win over the file
+            # and stay dirty, so the pending or next save writes them out
+            unsaved = self.unsaved_changes()
+            if unsaved:
+                new_config = {**new_config, **unsaved}
+                if self.logger:
+                    self.logger.warning("Keeping unsaved changes to %s over the reloaded file: %s",
+                                        self.config_file_path, ", ".join(sorted(unsaved)))
+            changed = {key for key in old_config.keys() | new_config.keys() if old_config.get(key) != new_config.get(key)}
+            # Swap the whole dict so readers see either the old or the new config, never a mix
+            self.config = new_config
+            self.saved_data = file_data
+            self.file_signature = signature
+        
+        if changed:
+            for callback in list(self.subscribers):
+                try:
+                    callback(self, changed)
+                except Exception as e:
+                    if self.logger:
+                        self.logger.error("Config subscriber failed: %s", e)
+                    else:
+                        logging.error("Config subscriber failed: %s", e)
+        return changed
     
     def create_default(self, default_config: dict):
-        self.config = default_config
+        self.config = dict(default_config)
         self.save()
     
     def get(self, key: str, default=None):
         return self.config.get(key, default)
     
+    def set(self, key: str, value):
+        self.config[key] = value
+    
+    def is_dirty(self) -> bool:
+        return tomli_w.dumps(self.config) != self.saved_data
+    
+    def unsaved_changes(self) -> dict:
+        """Keys set in memory since the last load or save, with their new values."""
+        if self.saved_data is None:
+            return {}
+        saved = tomllib.loads(self.saved_data)
+        return {key: value for key, value in self.config.items() if key not in saved or saved[key] != value}
+    
     def print_config(self):
         for key, value in self.config.items():
             print(f"{key}: {value}")
 
-    def save(self):
-        tomli_w.dump(self.config, open(self.config_file_path, "wb"))
+    def save(self, deferred: bool = False):
+        """
+        Write the config to disk if it changed since the last load or save.
+
+        With deferred=True and a write_behind_delay set, the write happens in a
+        scheduler job instead so a burst of changes becomes a single write.
+        """
+        if deferred and self.write_behind_delay > 0:
+            with self.save_lock:
+                # Re-adding the job under the same name pushes the pending write back
+                self.save_job = SCHEDULER.add(f"config_save:{self.config_file_path}", self.write_behind,
+                                              delay=self.write_behind_delay)
+            return
+        self.write()
     
-    def validate(self):
-        pass
+    def write_behind(self):
+        try:
+            self.write()
+        except Exception as e:
+            if self.logger:
+                self.logger.error("Failed to save config file: %s", e)
+            else:
+                logging.error("Failed to save config file: %s", e)
+    
+    def write(self) -> bool:
+        with self.save_lock:
+            self.save_job = None
+            data = tomli_w.dumps(self.config)
+            if data == self.saved_data:
+                return False
+            
+            # Write to a temp file next to the config and rename it over, so a crash never leaves a truncated file
+            directory = os.path.dirname(os.path.abspath(self.config_file_path))
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(self.config_file_path)}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data.encode())
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.config_file_path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self.saved_data = data
+            # Remember our own write so the watcher does not reload it
+            self.file_signature = self.get_file_signature()
+            return True
+    
+    def flush(self):
+        """Write out any pending deferred save right away."""
+        with self.save_lock:
+            if self.save_job:
+                self.save_job.cancel()
+                self.save_job = None
+        self.write()
+    
+    def validate(self, config: dict = None):
+        """Check that known keys have the same type as their default value."""
+        config = self.config if config is None else config
+        defaults = consts.default_configs.get(self.config_type, {})
+        for key, default in defaults.items():
+            if key not in config:
+                continue
+            value = config[key]
+            if isinstance(default, bool):
+                valid = isinstance(value, bool)
+            elif isinstance(default, (int, float)):
+                valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+            elif isinstance(default, (list, dict)):
+                valid = isinstance(value, type(default))
+            else:
+                # Ids like chat_id are often written as bare numbers
+                valid = isinstance(value, (str, int, float)) and not isinstance(value, bool)
+            if not valid:
+                raise ValueError(f"Invalid value for {key}: expected {type(default).__name__}, got {type(value).__name__}")
     
     def update(self, **kwargs):
         pass
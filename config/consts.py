@@ -6,24 +6,99 @@ default_config_global = {
     "log_level": "DEBUG",
     "logging_format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     "logging_file": "app.log",
+    "logging_rotation": "size",
+    "logging_max_bytes": 10485760,
+    "logging_backup_count": 5,
+    "logging_when": "midnight",
+    "logging_json": False,
+    "config_write_behind_delay": 1.0,
+    "config_reload_interval": 2,
+    "metrics_host": "127.0.0.1",
+    "metrics_port": 9101,
+    "fleet_config": "",
+    "fleet_max_workers": 8,
+    "fleet_timeout": 20,
+    "scheduler_max_workers": 4,
+    "scheduler_router_workers": 4,
+    "router_connect_retry_interval": 30,
+    "history_enabled": True,
+    "history_path": "history.db",
+    "history_batch_size": 100,
+    "history_flush_interval": 2,
+    "history_touch_interval": 300,
+    "history_retention_days": 90,
+    "history_retention_interval": 3600,
 }
 
 default_config_telegram = {
     "bot_name": "",
     "bot_username": "",
     "token": "",
-    "chat_id": ""
+    "chat_id": "",
+    "rate_limit_global": 30,
+    "rate_limit_per_chat": 1,
+    "rate_limit_burst": 3,
+    "coalesce_window": 0.3,
+    "document_threshold": 12288,
+    "duplicate_window": 60,
+    "mode": "polling",
+    "base_url": "",
+    "webhook_url": "",
+    "webhook_path": "/telegram",
+    "webhook_listen": "127.0.0.1",
+    "webhook_port": 8443,
+    "webhook_secret": "",
+    "stream_edit_interval": 1.5,
+    "outbound_queue_size": 500,
+    "command_queue_size": 100,
+    "command_rate_per_chat": 1,
+    "command_burst": 5,
+    "allowed_chat_ids": [],
 }
 
 default_config_router = {
+    "transport": "paramiko",
     "ssh_hostname": "192.168.1.1",
     "ssh_key_path": "",
     "username": "",
     "password": "",
     "ssh_port": 22,
+    "ssh_keepalive_interval": 30,
+    "ssh_max_channels": 4,
+    "ssh_command_timeout": 30,
+    "ssh_connect_timeout": 10,
+    "ssh_reconnect_retries": 5,
+    "ssh_reconnect_max_backoff": 60,
     "ip_watcher_enabled": False,
+    "ip_watcher_mode": "monitor",
+    "wan_interface": "",
+    "ip_poll_min_interval": 60,
+    "ip_poll_max_interval": 900,
+    "ip_monitor_settle": 2,
+    "ip_poll_jitter": 5,
+    "external_ip_mode": "race",
+    "external_ip_timeout": 15,
+    "external_ip_hedge_delay": 0,
+    "cache_ttl_ip_address": 30,
+    "cache_ttl_devices": 15,
+    "cache_stale_ttl": 60,
+    "dhcp_leases_path": "/tmp/dhcp.leases",
+    "presence_tracker_enabled": False,
+    "presence_interval": 60,
+    "presence_debounce": 2,
+    "traffic_enabled": False,
+    "traffic_sample_interval": 5,
+    "traffic_interfaces": [],
+    "stream_timeout": 120,
+    "stream_max_bytes": 1048576,
 }
 
 CONFIG_GLOBAL = 0
 CONFIG_TELEGRAM = 1
-CONFIG_ROUTER = 2
\ No newline at end of file
+CONFIG_ROUTER = 2
+
+default_configs = {
+    CONFIG_GLOBAL: default_config_global,
+    CONFIG_TELEGRAM: default_config_telegram,
+    CONFIG_ROUTER: default_config_router,
+}
\ No newline at end of file
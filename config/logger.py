@@ -1,7 +1,59 @@
+import json
 import logging
+import logging.handlers
 import os
+import queue
 
-def get_logger(log_file='app.log', level=logging.INFO, log_format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'):
+ROTATION_SIZE = "size"
+ROTATION_TIME = "time"
+ROTATION_NONE = "none"
+
+# Background writer shared by every logger set up through get_logger
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves formatting to the writer thread.
+
+    Only the message arguments are merged on the calling thread so they can't
+    change before the record is written, the format string, timestamps and
+    tracebacks are rendered by the listener.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def create_file_handler(log_file, rotation=ROTATION_SIZE, max_bytes=10 * 1024 * 1024, backup_count=5, when="midnight"):
+    if rotation == ROTATION_SIZE:
+        return logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+    if rotation == ROTATION_TIME:
+        return logging.handlers.TimedRotatingFileHandler(log_file, when=when, backupCount=backup_count, delay=True)
+    return logging.FileHandler(log_file, delay=True)
+
+
+def get_logger(log_file='app.log', level=logging.INFO, log_format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+               rotation=ROTATION_SIZE, max_bytes=10 * 1024 * 1024, backup_count=5, when="midnight", json_format=False):
+    global _listener
     logger = logging.getLogger('server_tools')
 
     if not logger.handlers:
@@ -12,12 +64,25 @@ def get_logger(log_file='app.log', level=logging.INFO, log_format='%(asctime)s -
         if log_dir and not os.path.exists(log_dir):
             os.makedirs(log_dir)
 
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(level)
-
-        formatter = logging.Formatter(log_format)
+        file_handler = create_file_handler(log_file, rotation, max_bytes, backup_count, when)
+        formatter = JsonFormatter() if json_format else logging.Formatter(log_format)
         file_handler.setFormatter(formatter)
 
-        logger.addHandler(file_handler)
+        # Callers only put records on the queue, the listener thread does the disk I/O
+        log_queue = queue.SimpleQueue()
+        queue_handler = LazyQueueHandler(log_queue)
+        queue_handler.setLevel(level)
+        logger.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, file_handler)
+        _listener.start()
+
+    return logger
+
 
-    return logger
\ No newline at end of file
+def stop_logging():
+    """Flush the queued records to disk and stop the writer thread."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
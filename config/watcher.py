@@ -0,0 +1,45 @@
+import logging
+
+from scheduler import SCHEDULER
+
+
+class ConfigWatcher:
+    """
+    Reloads config files when they change on disk.
+
+    Files are checked by mtime and size, only changed files are re-parsed and
+    each Config notifies its own subscribers about the keys that changed. An
+    invalid file is logged and the previous config stays in place.
+    """
+
+    def __init__(self, configs, interval=2, logger=None, scheduler=None):
+        self.configs = list(configs)
+        self.interval = interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.scheduler = scheduler or SCHEDULER
+        self.job = None
+
+    def start(self):
+        if self.job and not self.job.cancelled:
+            return
+        self.job = self.scheduler.add("config_watcher", self.check, interval=self.interval)
+        self.logger.info("Config watcher started")
+
+    def stop(self):
+        if self.job:
+            self.job.cancel()
+            self.job = None
+
+    def check(self):
+        for config in self.configs:
+            if not config.has_changed_on_disk():
+                continue
+            try:
+                changed = config.reload()
+            except Exception as e:
+                self.logger.error("Not applying %s: %s", config.config_file_path, e)
+                # Don't retry the same broken file on every tick
+                config.file_signature = config.get_file_signature()
+                continue
+            if changed:
+                self.logger.info("Reloaded %s, changed: %s", config.config_file_path, ', '.join(sorted(changed)))
@@ -0,0 +1,156 @@
+"""
+Concurrent command dispatcher for the server tools program.
+
+Commands are pulled off the shared command queue and run on a worker pool so a
+slow router call only holds up commands of its own type.
+"""
+
+import asyncio
+import logging
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from commands import handle_command, parse_command, command_label, COMMAND_CONCURRENCY, COMMAND_TIMEOUTS
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_CONCURRENCY = 2
+DEFAULT_TIMEOUT = 60
+
+COMMAND_QUEUE_DEPTH = metrics.gauge("command_queue_depth", "Commands waiting to be dispatched")
+COMMAND_WAIT_SECONDS = metrics.histogram("command_queue_wait_seconds", "Time commands spent queued", ("command",))
+COMMAND_SECONDS = metrics.histogram("command_duration_seconds", "Time spent running command handlers", ("command",))
+COMMAND_TIMEOUTS_TOTAL = metrics.counter("command_timeouts_total", "Commands that ran past their timeout", ("command",))
+
+
+class CommandStats:
+    def __init__(self):
+        self.count = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.total_exec = 0.0
+        self.max_wait = 0.0
+        self.max_exec = 0.0
+
+    def record(self, wait, exec_time):
+        self.count += 1
+        self.total_wait += wait
+        self.total_exec += exec_time
+        self.max_wait = max(self.max_wait, wait)
+        self.max_exec = max(self.max_exec, exec_time)
+
+    def summary(self):
+        if self.count == 0:
+            return "no runs"
+        return (
+            f"runs={self.count} timeouts={self.timeouts} "
+            f"wait avg={self.total_wait / self.count:.3f}s max={self.max_wait:.3f}s "
+            f"exec avg={self.total_exec / self.count:.3f}s max={self.max_exec:.3f}s"
+        )
+
+
+class CommandDispatcher:
+    def __init__(self, command_queue, router, bot, logger=None, max_workers=DEFAULT_MAX_WORKERS,
+                 default_concurrency=DEFAULT_CONCURRENCY, default_timeout=DEFAULT_TIMEOUT, fleet=None, history=None):
+        self.command_queue = command_queue
+        self.router = router
+        self.bot = bot
+        self.fleet = fleet
+        self.history = history
+        self.logger = logger or logging.getLogger(__name__)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="command")
+        self.default_concurrency = default_concurrency
+        self.default_timeout = default_timeout
+        self.semaphores = {}
+        self.stats = {}
+        self.tasks = set()
+        self.running = False
+        COMMAND_QUEUE_DEPTH.set_function(command_queue.qsize)
+
+    def get_semaphore(self, name):
+        if name not in self.semaphores:
+            limit = COMMAND_CONCURRENCY.get(name, self.default_concurrency)
+            self.semaphores[name] = asyncio.Semaphore(limit)
+        return self.semaphores[name]
+
+    def get_stats(self, name):
+        if name not in self.stats:
+            self.stats[name] = CommandStats()
+        return self.stats[name]
+
+    def next_command(self):
+        """Blocking read from the command queue, run on a worker thread."""
+        try:
+            item = self.command_queue.get(timeout=1)
+        except queue.Empty:
+            return None
+        if isinstance(item, tuple):
+            return item
+        return item, time.monotonic()
+
+    async def run(self):
+        self.running = True
+        loop = asyncio.get_running_loop()
+        self.logger.info("Command dispatcher started")
+        try:
+            while self.running:
+                item = await loop.run_in_executor(None, self.next_command)
+                if item is None:
+                    continue
+                command, enqueued_at = item
+                task = loop.create_task(self.dispatch(command, enqueued_at))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        finally:
+            for task in list(self.tasks):
+                task.cancel()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.logger.info("Command dispatcher stopped")
+
+    async def dispatch(self, command, enqueued_at):
+        name, args = parse_command(command)
+        timeout = COMMAND_TIMEOUTS.get(name, self.default_timeout)
+        stats = self.get_stats(name)
+        loop = asyncio.get_running_loop()
+
+        async with self.get_semaphore(name):
+            started_at = time.monotonic()
+            wait = started_at - enqueued_at
+            future = loop.run_in_executor(self.executor, handle_command, command, self.router, self.bot, self.fleet)
+            result = "ok"
+            try:
+                if not await asyncio.wait_for(asyncio.shield(future), timeout):
+                    result = "unknown"
+            except asyncio.TimeoutError:
+                result = "timeout"
+                stats.timeouts += 1
+                COMMAND_TIMEOUTS_TOTAL.inc(command=command_label(name))
+                self.logger.error("Command %s timed out after %ss", name, timeout)
+                self.bot.send_message(f"Command {name} timed out after {timeout}s")
+                # Keep the slot until the stuck call returns so the per-command cap holds
+                try:
+                    await future
+                except Exception:
+                    pass
+            except Exception as e:
+                result = "error"
+                self.logger.error("Error dispatching %s: %s", name, e)
+            exec_time = time.monotonic() - started_at
+
+        if self.history:
+            self.history.record_command(name, args, result, wait, exec_time)
+
+        stats.record(wait, exec_time)
+        COMMAND_WAIT_SECONDS.observe(wait, command=command_label(name))
+        COMMAND_SECONDS.observe(exec_time, command=command_label(name))
+        self.logger.info("Command %s waited %.3fs, ran %.3fs", name, wait, exec_time)
+
+    def stop(self):
+        self.running = False
+
+    def summary(self):
+        lines = []
+        for name in sorted(self.stats):
+            lines.append(f"{name}: {self.stats[name].summary()}")
+        return "\n".join(lines) if lines else "No commands dispatched yet."
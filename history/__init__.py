@@ -0,0 +1,6 @@
+from .store import HistoryStore, DEFAULT_ROUTER
+
+__all__ = [
+    "HistoryStore",
+    "DEFAULT_ROUTER",
+]
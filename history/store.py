@@ -0,0 +1,233 @@
+import logging
+import sqlite3
+import threading
+import time
+
+import metrics
+from scheduler import SCHEDULER
+
+DEFAULT_ROUTER = "default"
+
+HISTORY_ROWS = metrics.counter("history_rows_written_total", "Rows written to the history store", ("table",))
+HISTORY_FLUSH_SECONDS = metrics.histogram("history_flush_seconds", "Time spent writing a batch to the history store")
+HISTORY_PENDING = metrics.gauge("history_pending_writes", "Writes waiting for the next history flush")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ip_history (
+    id INTEGER PRIMARY KEY,
+    router TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ip_history_router_time ON ip_history (router, seen_at);
+
+CREATE TABLE IF NOT EXISTS device_sightings (
+    id INTEGER PRIMARY KEY,
+    router TEXT NOT NULL,
+    mac TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    hostname TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    online INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS device_sightings_mac ON device_sightings (router, mac, last_seen);
+CREATE INDEX IF NOT EXISTS device_sightings_ip ON device_sightings (router, ip, last_seen);
+CREATE INDEX IF NOT EXISTS device_sightings_online ON device_sightings (router, online);
+CREATE INDEX IF NOT EXISTS device_sightings_time ON device_sightings (last_seen);
+
+CREATE TABLE IF NOT EXISTS command_audit (
+    id INTEGER PRIMARY KEY,
+    command TEXT NOT NULL,
+    args TEXT,
+    result TEXT NOT NULL,
+    wait REAL,
+    duration REAL,
+    executed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS command_audit_time ON command_audit (executed_at);
+CREATE INDEX IF NOT EXISTS command_audit_command ON command_audit (command, executed_at);
+"""
+
+INSERT_IP = "INSERT INTO ip_history (router, ip, seen_at) VALUES (?, ?, ?)"
+INSERT_SIGHTING = "INSERT INTO device_sightings (router, mac, ip, hostname, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?)"
+UPDATE_SIGHTING = "UPDATE device_sightings SET ip = ?, hostname = ?, last_seen = ? WHERE router = ? AND mac = ? AND online = 1"
+CLOSE_SIGHTING = "UPDATE device_sightings SET last_seen = ?, online = 0 WHERE router = ? AND mac = ? AND online = 1"
+TOUCH_SIGHTINGS = "UPDATE device_sightings SET last_seen = ? WHERE router = ? AND online = 1"
+CLOSE_ALL_SIGHTINGS = "UPDATE device_sightings SET online = 0 WHERE router = ? AND online = 1"
+INSERT_AUDIT = "INSERT INTO command_audit (command, args, result, wait, duration, executed_at) VALUES (?, ?, ?, ?, ?, ?)"
+
+# Table each buffered statement writes to, for the row counter
+STATEMENT_TABLES = {
+    INSERT_IP: "ip_history",
+    INSERT_SIGHTING: "device_sightings",
+    UPDATE_SIGHTING: "device_sightings",
+    CLOSE_SIGHTING: "device_sightings",
+    TOUCH_SIGHTINGS: "device_sightings",
+    CLOSE_ALL_SIGHTINGS: "device_sightings",
+    INSERT_AUDIT: "command_audit",
+}
+
+
+class HistoryStore:
+    """
+    SQLite history of public IPs, device sightings and executed commands.
+
+    The database runs in WAL mode so reads never wait for the writer. Writes
+    are buffered and flushed in one transaction by a scheduler job, or right
+    away once batch_size writes are waiting. A device sighting is one row per
+    visit, last seen of the devices still online is only moved forward when
+    the inventory changed or every touch_interval seconds, so a quiet network
+    costs no writes.
+    """
+
+    def __init__(self, path, logger=None, batch_size=100, flush_interval=2, scheduler=None, touch_interval=300):
+        self.path = path
+        self.logger = logger or logging.getLogger(__name__)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.touch_interval = touch_interval
+        self.last_touch = {}
+        self.scheduler = scheduler or SCHEDULER
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.flush_job = None
+        self.retention_job = None
+        HISTORY_PENDING.set_function(lambda: len(self.pending))
+
+    def start(self, retention_interval=3600, retention_days=90):
+        self.flush_job = self.scheduler.add("history_flush", self.flush, interval=self.flush_interval)
+        self.retention_job = self.scheduler.add("history_retention", lambda: self.apply_retention(retention_days),
+                                                interval=retention_interval, jitter=60)
+
+    def close(self):
+        for job in (self.flush_job, self.retention_job):
+            if job:
+                job.cancel()
+        self.flush()
+        with self.lock:
+            self.connection.close()
+
+    def queue(self, statement, params):
+        with self.pending_lock:
+            self.pending.append((statement, params))
+            full = len(self.pending) >= self.batch_size
+        if full and self.flush_job:
+            self.flush_job.trigger()
+
+    def flush(self):
+        with self.pending_lock:
+            batch, self.pending = self.pending, []
+        if not batch:
+            return 0
+        with self.lock, HISTORY_FLUSH_SECONDS.time():
+            self.connection.execute("BEGIN")
+            try:
+                for statement, params in batch:
+                    self.connection.execute(statement, params)
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+        for statement, _ in batch:
+            HISTORY_ROWS.inc(table=STATEMENT_TABLES.get(statement, "unknown"))
+        return len(batch)
+
+    def query(self, sql, params=()):
+        # Pending writes go out first so a query always sees what was recorded before it
+        self.flush()
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def record_ip(self, ip, router=DEFAULT_ROUTER, seen_at=None):
+        self.queue(INSERT_IP, (router, ip, seen_at or time.time()))
+
+    def record_devices(self, changes, router=DEFAULT_ROUTER, seen_at=None):
+        """Record one inventory refresh, changes are the InventoryChanges it returned."""
+        now = seen_at or time.time()
+        for device in changes.added:
+            self.queue(INSERT_SIGHTING, (router, device.mac, device.ip, device.hostname, now, now))
+        for device in changes.changed:
+            self.queue(UPDATE_SIGHTING, (device.ip, device.hostname, now, router, device.mac))
+        for device in changes.removed:
+            self.queue(CLOSE_SIGHTING, (now, router, device.mac))
+        if changes or now - self.last_touch.get(router, 0) >= self.touch_interval:
+            self.queue(TOUCH_SIGHTINGS, (now, router))
+            self.last_touch[router] = now
+
+    def reset_devices(self, router=DEFAULT_ROUTER):
+        """Close the visits left open by an earlier run, the inventory starts out empty again."""
+        self.queue(CLOSE_ALL_SIGHTINGS, (router,))
+        self.last_touch.pop(router, None)
+
+    def record_command(self, command, args, result, wait=None, duration=None):
+        self.queue(INSERT_AUDIT, (command, args, result, wait, duration, time.time()))
+
+    def last_ip(self, router=DEFAULT_ROUTER):
+        rows = self.query("SELECT ip FROM ip_history WHERE router = ? ORDER BY seen_at DESC LIMIT 1", (router,))
+        return rows[0][0] if rows else None
+
+    def ip_history(self, router=DEFAULT_ROUTER, limit=10):
+        """Latest IPs of a router as (ip, seen_at) pairs, newest first."""
+        return self.query("SELECT ip, seen_at FROM ip_history WHERE router = ? ORDER BY seen_at DESC LIMIT ?",
+                          (router, limit))
+
+    def last_seen(self, query, router=DEFAULT_ROUTER):
+        """
+        Latest visit of a device by MAC, IP or hostname.
+
+        Returns:
+            tuple: (mac, ip, hostname, first_seen, last_seen, online) or None
+        """
+        query = query.strip()
+        for column in ("mac", "ip"):
+            rows = self.query(
+                f"SELECT mac, ip, hostname, first_seen, last_seen, online FROM device_sightings "
+                f"WHERE router = ? AND {column} = ? ORDER BY last_seen DESC LIMIT 1",
+                (router, query.lower() if column == "mac" else query),
+            )
+            if rows:
+                return rows[0]
+        rows = self.query(
+            "SELECT mac, ip, hostname, first_seen, last_seen, online FROM device_sightings "
+            "WHERE router = ? AND hostname = ? COLLATE NOCASE ORDER BY last_seen DESC LIMIT 1",
+            (router, query),
+        )
+        return rows[0] if rows else None
+
+    def command_counts(self, since):
+        return self.query("SELECT command, result, COUNT(*) FROM command_audit WHERE executed_at >= ? "
+                          "GROUP BY command, result ORDER BY command", (since,))
+
+    def apply_retention(self, retention_days):
+        """Delete closed visits and audit rows older than retention_days and compact the database."""
+        cutoff = time.time() - retention_days * 86400
+        self.flush()
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                sightings = self.connection.execute(
+                    "DELETE FROM device_sightings WHERE online = 0 AND last_seen < ?", (cutoff,)).rowcount
+                audit = self.connection.execute("DELETE FROM command_audit WHERE executed_at < ?", (cutoff,)).rowcount
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.connection.execute("PRAGMA optimize")
+        if sightings or audit:
+            self.logger.info("History retention removed %s sightings and %s audit rows", sightings, audit)
+        return sightings, audit
+
+    def summary(self):
+        lines = []
+        for table in ("ip_history", "device_sightings", "command_audit"):
+            count = self.query(f"SELECT COUNT(*) FROM {table}")[0][0]
+            lines.append(f"{table}: {count} rows")
+        lines.append(f"pending writes: {len(self.pending)}")
+        return "\n".join(lines)
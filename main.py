@@ -1,44 +1,48 @@
+import sys
+import startup
+
+# Has to hook the import system before the rest of the program is imported
+if startup.PROFILE_FLAG in sys.argv:
+    startup.PROFILER.enable()
+
 import asyncio
 import logging
-import sys
 import queue
 
 import router_utils
 import config
+import metrics
 import telegram_bot
-from config.logger import get_logger
-from commands import handle_command
-
-async def handle_commands_loop(command_queue, router, bot, logger):
-    while True:
-        try:
-            # Non-blocking get with timeout
-            while not command_queue.empty():
-                command = command_queue.get_nowait()
-                logger.info(f"Received message from Telegram: {command}")
-                # Handle commands synchronously
-                handle_command(command, router, bot)
-            await asyncio.sleep(0.1)  # Small delay to prevent busy loop
-        except Exception as e:
-            logger.error(f"Error in command handling loop: {e}")
-            await asyncio.sleep(1)
+from scheduler import SCHEDULER
+from history import HistoryStore
+from config.logger import get_logger, stop_logging
+from dispatcher import CommandDispatcher
+from startup import PROFILER
 
 def disconnect_all(router: router_utils.Router, telegram_bot: telegram_bot.TelegramBot, logger: logging.Logger) -> None:
+    try:
+        router.config.flush()
+    except Exception as e:
+        logger.error("Error saving router configuration: %s", e)
+    
     try:
         router.disconnect()
         logger.info("Router disconnected successfully")
     except Exception as e:
-        logger.error(f"Error disconnecting router: {e}")
+        logger.error("Error disconnecting router: %s", e)
     
     try:
         telegram_bot.disconnect()
         logger.info("Telegram bot disconnected successfully")
     except Exception as e:
-        logger.error(f"Error disconnecting Telegram bot: {e}")
+        logger.error("Error disconnecting Telegram bot: %s", e)
 
 def main() -> None:
+    profile_startup = startup.PROFILE_FLAG in sys.argv
+    
     try:
-        global_config = config.Config("configs/global.toml", config_type=config.CONFIG_GLOBAL)
+        with PROFILER.phase("global config"):
+            global_config = config.Config("configs/global.toml", config_type=config.CONFIG_GLOBAL)
     except Exception as e:
         print(f"[red]Error loading global configuration: {e}[/red]")
         sys.exit(1)
@@ -47,42 +51,152 @@ def main() -> None:
     log_level = getattr(logging, log_level_str.upper(), logging.DEBUG)
     log_file = global_config.get("logging_file", "app.log")
     log_format = global_config.get("logging_format", "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    logger = get_logger(log_file=log_file, level=log_level, log_format=log_format)
+    logger = get_logger(
+        log_file=log_file,
+        level=log_level,
+        log_format=log_format,
+        rotation=global_config.get("logging_rotation", "size"),
+        max_bytes=global_config.get("logging_max_bytes", 10 * 1024 * 1024),
+        backup_count=global_config.get("logging_backup_count", 5),
+        when=global_config.get("logging_when", "midnight"),
+        json_format=global_config.get("logging_json", False),
+    )
     logger.info("Logger initialized")
     
+    def on_global_config_change(changed_config, changed):
+        if "log_level" in changed:
+            level = getattr(logging, changed_config.get("log_level", "DEBUG").upper(), logging.DEBUG)
+            logger.setLevel(level)
+            for handler in logger.handlers:
+                handler.setLevel(level)
+            logger.info("Log level changed to %s", logging.getLevelName(level))
+    
+    global_config.logger = logger
+    global_config.subscribe(on_global_config_change)
+    
+    # Periodic router tasks, the config watcher and cache refreshes all run on this one scheduler,
+    # router I/O on a pool of its own so a hanging router can't hold up the other jobs
+    SCHEDULER.logger = logger
+    SCHEDULER.max_workers = global_config.get("scheduler_max_workers", 4)
+    SCHEDULER.router_workers = global_config.get("scheduler_router_workers", 4)
+    
+    history = None
+    if global_config.get("history_enabled", True):
+        try:
+            with PROFILER.phase("history store"):
+                history = HistoryStore(
+                    global_config.get("history_path", "history.db"),
+                    logger=logger,
+                    batch_size=global_config.get("history_batch_size", 100),
+                    flush_interval=global_config.get("history_flush_interval", 2),
+                    touch_interval=global_config.get("history_touch_interval", 300),
+                )
+                history.start(
+                    retention_interval=global_config.get("history_retention_interval", 3600),
+                    retention_days=global_config.get("history_retention_days", 90),
+                )
+        except Exception as e:
+            logger.error("Error opening history store: %s", e)
+            history = None
+    
+    # The bot and the router start in parallel, the bot can answer while SSH is still connecting
     try:
-        telegram_config = config.Config("configs/telegram.toml", config_type=config.CONFIG_TELEGRAM, logger=logger)
-        command_queue = queue.Queue()
-        bot = telegram_bot.TelegramBot(telegram_config, logger=logger, command_queue=command_queue)
-        bot.start()
+        with PROFILER.phase("telegram bot start"):
+            telegram_config = config.Config("configs/telegram.toml", config_type=config.CONFIG_TELEGRAM, logger=logger)
+            # Bounded, the bot turns commands away once the dispatcher falls this far behind
+            command_queue = queue.Queue(telegram_config.get("command_queue_size", 100))
+            bot = telegram_bot.TelegramBot(telegram_config, logger=logger, command_queue=command_queue)
+            bot.start()
         
     except Exception as e:
-        logger.error(f"Error initializing Telegram bot: {e}")
+        logger.error("Error initializing Telegram bot: %s", e)
         sys.exit(1)
 
     try:
-        router_config = config.Config("configs/router.toml", config_type=config.CONFIG_ROUTER, logger=logger)
-        router = router_utils.init_router_connection(router_config, logger=logger)
-        router.set_message_callback(lambda msg: bot.send_message(msg))
+        with PROFILER.phase("router start"):
+            write_behind_delay = global_config.get("config_write_behind_delay", 1.0)
+            router_config = config.Config("configs/router.toml", config_type=config.CONFIG_ROUTER, logger=logger,
+                                          write_behind_delay=write_behind_delay)
+            router = router_utils.LazyRouter(router_config, logger=logger, history=history,
+                                             retry_interval=global_config.get("router_connect_retry_interval", 30))
+            router.set_message_callback(lambda msg: bot.send_message(msg, telegram_bot.PRIORITY_ALERT))
+            router.start()
         
     except Exception as e:
-        logger.error(f"Error loading router configuration: {e}")
+        logger.error("Error loading router configuration: %s", e)
         sys.exit(1)
 
 
+    fleet = None
+    fleet_config = global_config.get("fleet_config", "")
+    if fleet_config:
+        try:
+            with PROFILER.phase("router fleet"):
+                fleet = router_utils.load_fleet(
+                    fleet_config,
+                    logger=logger,
+                    routers={router_config.config_file_path: router},
+                    max_workers=global_config.get("fleet_max_workers", 8),
+                    timeout=global_config.get("fleet_timeout", 20),
+                    write_behind_delay=write_behind_delay,
+                    history=history,
+                )
+            fleet.set_message_callback(lambda msg: bot.send_message(msg, telegram_bot.PRIORITY_ALERT))
+        except Exception as e:
+            logger.error("Error loading router fleet: %s", e)
+            fleet = None
+
+    watched_configs = [global_config, telegram_config, router_config]
+    if fleet:
+        watched_configs.extend(c for c in fleet.configs() if c is not router_config)
+    config_watcher = config.ConfigWatcher(
+        watched_configs,
+        interval=global_config.get("config_reload_interval", 2),
+        logger=logger,
+    )
+    config_watcher.start()
+
+    metrics_server = None
+    metrics_port = global_config.get("metrics_port", 9101)
+    if metrics_port:
+        try:
+            metrics_server = metrics.MetricsServer(global_config.get("metrics_host", "127.0.0.1"), metrics_port, logger=logger)
+            metrics_server.start()
+        except Exception as e:
+            logger.error("Error starting metrics exporter: %s", e)
+            metrics_server = None
+
+    dispatcher = CommandDispatcher(command_queue, router, bot, logger=logger, fleet=fleet, history=history)
+    
+    def shutdown():
+        dispatcher.stop()
+        config_watcher.stop()
+        SCHEDULER.stop()
+        if metrics_server:
+            metrics_server.stop()
+        logger.info("Dispatcher stats:\n%s", dispatcher.summary())
+        if fleet:
+            fleet.flush()
+            fleet.disconnect()
+        disconnect_all(router, bot, logger)
+        if history:
+            history.close()
+        stop_logging()
+    
+    if profile_startup:
+        PROFILER.wait_for("telegram bot", lambda: bot.loop is not None)
+        PROFILER.wait_for("router", lambda: router.wait_ready(0.01))
+        print(PROFILER.report())
+        shutdown()
+        return
+    logger.info("Startup took %.3fs, router connects in the background", PROFILER.elapsed())
+
     # Main loop
     try:
-        while True:
-            try:
-                command = command_queue.get(timeout=1) 
-                print(f"Received message from Telegram: {command}")
-                # Handle commands
-                handle_command(command, router, bot)
-            except queue.Empty:
-                pass
+        asyncio.run(dispatcher.run())
     except KeyboardInterrupt:
         print("Shutting down...")
-        disconnect_all(router, bot, logger)
+        shutdown()
     
 
 if __name__ == "__main__":
@@ -93,5 +207,5 @@ if __name__ == "__main__":
 # TODO: use global ip not local for router watcher. ✅ DONE
 # TODO: Better command for enabling and disabling watcher ip ✅ DONE
 # TODO: When sending help command group the different commands to be abel to read it more easily.
-# TODO: When sending router devices command format the output to a more readable state and check if it is posable to get device names as well as the mac and ip
+# TODO: When sending router devices command format the output to a more readable state and check if it is posable to get device names as well as the mac and ip ✅ DONE
 
@@ -0,0 +1,14 @@
+from .registry import REGISTRY, Registry, Counter, Gauge, Histogram, counter, gauge, histogram
+from .exporter import MetricsServer
+
+__all__ = [
+    "REGISTRY",
+    "Registry",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsServer",
+    "counter",
+    "gauge",
+    "histogram",
+]
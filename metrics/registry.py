@@ -0,0 +1,268 @@
+import math
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation="", labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def label_values(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation="", labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(self.label_values(labels), 0)
+
+    def total(self):
+        with self.lock:
+            return sum(self.values.values())
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+    def summary(self):
+        with self.lock:
+            if not self.values:
+                return []
+            if not self.labelnames:
+                return [f"{self.name}: {format_value(self.values.get((), 0))}"]
+            return [f"{self.name}{format_labels(self.labelnames, key)}: {format_value(value)}"
+                    for key, value in sorted(self.values.items())]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation="", labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+        self.function = None
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.label_values(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """Read the value from `function` whenever the gauge is collected, e.g. a queue size."""
+        self.function = function
+
+    def collect(self):
+        if self.function is not None:
+            try:
+                return {(): self.function()}
+            except Exception:
+                return {}
+        with self.lock:
+            return dict(self.values)
+
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+    def summary(self):
+        return [f"{self.name}{format_labels(self.labelnames, key)}: {format_value(value)}"
+                for key, value in sorted(self.collect().items())]
+
+
+class HistogramValues:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation="", labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            values = self.values.get(key)
+            if values is None:
+                values = self.values[key] = HistogramValues(len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values.counts[index] += 1
+                    break
+            values.sum += value
+            values.count += 1
+
+    def time(self, **labels):
+        return Timer(self, labels)
+
+    def quantile(self, values, q):
+        """Estimate a quantile from the bucket counts by linear interpolation."""
+        if values.count == 0:
+            return 0.0
+        rank = q * values.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, values.counts):
+            if seen + count >= rank and count:
+                if bound == math.inf:
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            if bound != math.inf:
+                lower = bound
+        return lower
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            for key, values in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, values.counts):
+                    cumulative += count
+                    labels = format_labels(self.labelnames + ("le",), key + (format_value(bound),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {format_value(values.sum)}")
+                lines.append(f"{self.name}_count{labels} {values.count}")
+        return lines
+
+    def summary(self):
+        lines = []
+        with self.lock:
+            for key, values in sorted(self.values.items()):
+                average = values.sum / values.count if values.count else 0.0
+                lines.append(
+                    f"{self.name}{format_labels(self.labelnames, key)}: n={values.count} "
+                    f"avg={average:.3f}s p50={self.quantile(values, 0.5):.3f}s p99={self.quantile(values, 0.99):.3f}s"
+                )
+        return lines
+
+
+class Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.started_at = None
+
+    def __enter__(self):
+        self.started_at = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.histogram.observe(time.monotonic() - self.started_at, **self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, cls, name, documentation, labelnames, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation="", labelnames=()):
+        return self.register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation="", labelnames=()):
+        return self.register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation="", labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def collect(self):
+        with self.lock:
+            return [self.metrics[name] for name in sorted(self.metrics)]
+
+    def render_prometheus(self):
+        lines = []
+        for metric in self.collect():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self, prefix=None):
+        lines = []
+        for metric in self.collect():
+            if prefix and not metric.name.startswith(prefix):
+                continue
+            lines.extend(metric.summary())
+        return "\n".join(lines) if lines else "No metrics recorded yet."
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation="", labelnames=()):
+    return REGISTRY.counter(name, documentation, labelnames)
+
+
+def gauge(name, documentation="", labelnames=()):
+    return REGISTRY.gauge(name, documentation, labelnames)
+
+
+def histogram(name, documentation="", labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.histogram(name, documentation, labelnames, buckets)
@@ -2,8 +2,30 @@ from .router import (
     Router,
     init_router_connection,
 )
+from .transport import (
+    Transport,
+    create_transport,
+)
+from .lazy_router import (
+    LazyRouter,
+    RouterNotReady,
+)
+from .fleet import (
+    RouterFleet,
+    FLEET_ACTIONS,
+    format_fleet_results,
+    load_fleet,
+)
 
 __all__ = [
     "Router",
     "init_router_connection",
+    "Transport",
+    "create_transport",
+    "LazyRouter",
+    "RouterNotReady",
+    "RouterFleet",
+    "FLEET_ACTIONS",
+    "format_fleet_results",
+    "load_fleet",
 ]
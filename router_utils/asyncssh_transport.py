@@ -0,0 +1,189 @@
+import asyncio
+import os
+import threading
+
+from .transport import (
+    Transport,
+    TRANSPORT_ASYNCSSH,
+    SSH_COMMAND_SECONDS,
+    SSH_CONNECTION_ERRORS,
+    command_label,
+    split_lines,
+)
+
+
+def import_asyncssh():
+    try:
+        import asyncssh
+    except ImportError:
+        raise ImportError('transport = "asyncssh" needs the asyncssh package, install server-tools[asyncssh]') from None
+    return asyncssh
+
+
+class AsyncSSHProcess:
+    """Handle passed to iter_lines' on_open, close() ends the remote command from any thread."""
+
+    def __init__(self, transport, process):
+        self.transport = transport
+        self.process = process
+
+    def close(self):
+        self.transport.loop.call_soon_threadsafe(self.process.close)
+
+
+class AsyncSSHTransport(Transport):
+    """
+    SSH over asyncssh, with every command multiplexed on one event loop.
+
+    The connection lives on an event loop of its own in a background thread.
+    Coroutines await run_async() from any loop without a worker thread per
+    command, blocking callers get the same through run(). Channels are capped
+    at ssh_max_channels and a dropped connection is re-established like the
+    paramiko session does.
+    """
+
+    name = TRANSPORT_ASYNCSSH
+
+    def __init__(self, config, logger=None):
+        super().__init__(config, logger=logger)
+        self.asyncssh = import_asyncssh()
+        self.connection = None
+        self.channels = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="asyncssh", daemon=True)
+        self.thread.start()
+
+    def call(self, coroutine, timeout=None):
+        """Run a coroutine on the transport loop and wait for it from this thread."""
+        if not self.loop.is_running():
+            coroutine.close()
+            raise ConnectionError("asyncssh transport is closed")
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    async def open_connection(self):
+        hostname = self.config.get("ssh_hostname")
+        port = self.config.get("ssh_port", 22)
+        options = {
+            "port": port,
+            "username": self.config.get("username"),
+            # Same trust as the paramiko session, which accepts any host key
+            "known_hosts": None,
+            "keepalive_interval": self.config.get("ssh_keepalive_interval", 30) or 0,
+            "connect_timeout": self.config.get("ssh_connect_timeout", 10),
+        }
+        key_filename = self.config.get("ssh_key_path")
+        if key_filename and os.path.exists(key_filename):
+            options["client_keys"] = [key_filename]
+        else:
+            options["password"] = self.config.get("password")
+        self.connection = await self.asyncssh.connect(hostname, **options)
+        self.channels = asyncio.Semaphore(self.config.get("ssh_max_channels", 4))
+        self.logger.info("SSH session established to %s:%s (asyncssh)", hostname, port)
+
+    def connect(self):
+        self.call(self.open_connection())
+
+    def is_active(self):
+        connection = self.connection
+        return connection is not None and not connection.is_closed()
+
+    def drop(self):
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            self.loop.call_soon_threadsafe(connection.close)
+
+    def drop_connection(self, connection):
+        """Drop the connection a failed command ran on, unless it was already replaced."""
+        with self.lock:
+            if self.connection is connection:
+                self.drop()
+
+    def connection_errors(self):
+        return (self.asyncssh.Error, EOFError, ConnectionError, OSError)
+
+    async def ensure_connected_async(self):
+        if not self.is_active():
+            await asyncio.to_thread(self.ensure_connected)
+
+    async def run_on_loop(self, command, timeout, retry):
+        attempts = 2 if retry else 1
+        for attempt in range(1, attempts + 1):
+            await self.ensure_connected_async()
+            # Held for the whole command, a reconnect in the meantime swaps self.connection
+            connection = self.connection
+            try:
+                if connection is None:
+                    raise EOFError("SSH session was dropped by another caller")
+                async with self.channels:
+                    with SSH_COMMAND_SECONDS.time(command=command_label(command)):
+                        result = await asyncio.wait_for(
+                            connection.run(command, check=False, encoding="utf-8", errors="replace"), timeout)
+                return result.stdout or "", result.stderr or "", result.exit_status
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{command_label(command)} timed out after {timeout}s") from None
+            except self.connection_errors() as e:
+                SSH_CONNECTION_ERRORS.inc()
+                if attempt == attempts:
+                    raise
+                self.logger.warning("SSH connection lost while running '%s': %s, reconnecting", command, e)
+                if connection is not None:
+                    self.drop_connection(connection)
+
+    def run(self, command, timeout=None, retry=True):
+        # Unlike paramiko the timeout covers the whole command
+        if timeout is None:
+            timeout = self.config.get("ssh_command_timeout", 30)
+        return self.call(self.run_on_loop(command, timeout, retry))
+
+    async def run_async(self, command, timeout=None, retry=True):
+        if timeout is None:
+            timeout = self.config.get("ssh_command_timeout", 30)
+        coroutine = self.run_on_loop(command, timeout, retry)
+        if asyncio.get_running_loop() is self.loop:
+            return await coroutine
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self.loop))
+
+    async def open_process(self, command, get_pty):
+        await self.ensure_connected_async()
+        await self.channels.acquire()
+        try:
+            options = {"term_type": "xterm"} if get_pty else {}
+            connection = self.connection
+            if connection is None:
+                raise EOFError("SSH session was dropped by another caller")
+            return await connection.create_process(command, encoding=None, **options)
+        except BaseException:
+            self.channels.release()
+            raise
+
+    async def read_chunk(self, process, timeout):
+        try:
+            return await asyncio.wait_for(process.stdout.read(4096), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No output for {timeout}s") from None
+
+    async def close_process(self, process):
+        process.close()
+        self.channels.release()
+
+    def iter_lines(self, command, timeout=None, get_pty=False, max_bytes=None, on_open=None):
+        if timeout is None:
+            timeout = self.config.get("ssh_command_timeout", 30)
+        process = self.call(self.open_process(command, get_pty))
+        try:
+            if on_open:
+                on_open(AsyncSSHProcess(self, process))
+            chunks = iter(lambda: self.call(self.read_chunk(process, timeout)), b"")
+            yield from split_lines(chunks, max_bytes)
+        finally:
+            self.call(self.close_process(process))
+
+    def execute(self, command):
+        process = self.call(self.open_process(command, False))
+        # The command keeps running, only the channel slot is given back
+        self.loop.call_soon_threadsafe(self.channels.release)
+        return AsyncSSHProcess(self, process)
+
+    def close(self):
+        super().close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
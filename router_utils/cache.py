@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+
+import metrics
+from scheduler import SCHEDULER, POOL_ROUTER
+
+CACHE_REQUESTS = metrics.counter("router_cache_requests_total", "Router cache lookups by result", ("key", "result"))
+
+
+class CacheEntry:
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value, fetched_at):
+        self.value = value
+        self.fetched_at = fetched_at
+
+
+class TTLCache:
+    """
+    Small cache for router reads with stale-while-revalidate.
+
+    A fresh entry is returned as is. An entry older than its ttl but still
+    inside the stale window is returned right away while a background job
+    fetches a new value. Anything older is fetched synchronously.
+    """
+
+    def __init__(self, logger=None, scheduler=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.scheduler = scheduler or SCHEDULER
+        self.entries = {}
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key, loader, ttl, stale_ttl=0):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            age = now - entry.fetched_at if entry else None
+            if entry and age < ttl:
+                self.hits += 1
+                CACHE_REQUESTS.inc(key=key, result="hit")
+                return entry.value
+            if entry and age < ttl + stale_ttl:
+                self.stale_hits += 1
+                CACHE_REQUESTS.inc(key=key, result="stale")
+                if key not in self.refreshing:
+                    self.refreshing.add(key)
+                    self.scheduler.submit(f"cache_refresh:{key}", lambda: self.refresh(key, loader),
+                                          pool=POOL_ROUTER)
+                return entry.value
+            self.misses += 1
+            CACHE_REQUESTS.inc(key=key, result="miss")
+
+        return self.load(key, loader)
+
+    def load(self, key, loader):
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def refresh(self, key, loader):
+        try:
+            self.load(key, loader)
+        except Exception as e:
+            self.logger.error("Background refresh of %s failed: %s", key, e)
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = CacheEntry(value, time.monotonic())
+
+    def peek(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry.value if entry else default
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+            }
+
+    def summary(self):
+        stats = self.stats()
+        return "\n".join(f"{key}: {value}" for key, value in stats.items())
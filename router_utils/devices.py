@@ -0,0 +1,180 @@
+import re
+import threading
+
+# "? (192.168.1.37) at aa:bb:cc:dd:ee:ff [ether]  on br-lan" from busybox and net-tools arp
+ARP_LINE = re.compile(r'^(\S+) \((\d{1,3}(?:\.\d{1,3}){3})\) at (\S+)(?: \[(\w+)\])?(?:\s+\S+)*?\s+on (\S+)')
+MAC_ADDRESS = re.compile(r'^[0-9a-f]{2}(?::[0-9a-f]{2}){5}$')
+
+LEASES_MARKER = "@@DHCP_LEASES@@"
+
+
+class Device:
+    __slots__ = ("mac", "ip", "hostname", "interface")
+
+    def __init__(self, mac, ip, hostname=None, interface=None):
+        self.mac = mac
+        self.ip = ip
+        self.hostname = hostname
+        self.interface = interface
+
+    def __repr__(self):
+        return f"Device({self.mac}, {self.ip}, {self.hostname}, {self.interface})"
+
+    def format(self):
+        name = self.hostname or "unknown"
+        interface = f" on {self.interface}" if self.interface else ""
+        return f"{name} - {self.ip} ({self.mac}){interface}"
+
+
+def parse_arp_line(line):
+    """
+    Parse one line of `arp -a` output.
+
+    Returns:
+        tuple: (mac, ip, hostname, interface) or None for incomplete or unknown lines
+    """
+    match = ARP_LINE.match(line.strip())
+    if not match:
+        return None
+    hostname, ip, mac, _, interface = match.groups()
+    mac = mac.lower()
+    if not MAC_ADDRESS.match(mac):
+        return None
+    if hostname == "?":
+        hostname = None
+    return mac, ip, hostname, interface
+
+
+def parse_leases(lines):
+    """
+    Parse an OpenWrt/dnsmasq lease file into a {mac: hostname} mapping.
+
+    Lines look like "1700000000 aa:bb:cc:dd:ee:ff 192.168.1.37 phone 01:aa:bb:cc:dd:ee:ff".
+    """
+    hostnames = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 4:
+            continue
+        mac, hostname = parts[1].lower(), parts[3]
+        if hostname != "*":
+            hostnames[mac] = hostname
+    return hostnames
+
+
+def split_leases(output):
+    """Split combined `arp -a` and lease file output on the leases marker."""
+    arp, _, leases = output.partition(LEASES_MARKER)
+    return arp.splitlines(), leases.splitlines()
+
+
+class InventoryChanges:
+    __slots__ = ("added", "removed", "changed")
+
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.changed = []
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+class DeviceInventory:
+    """
+    In-memory device inventory indexed by MAC and IP.
+
+    Each refresh compares the source entry per MAC against the previous one and
+    only rebuilds records that actually changed.
+    """
+
+    def __init__(self):
+        self.by_mac = {}
+        self.by_ip = {}
+        self.sources = {}
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def add_listener(self, callback):
+        """Register a callback that gets the InventoryChanges of every refresh that changed something."""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def update(self, arp_lines, lease_lines=()):
+        hostnames = parse_leases(lease_lines)
+        current = {}
+        for line in arp_lines:
+            parsed = parse_arp_line(line)
+            if parsed is None:
+                continue
+            mac, ip, hostname, interface = parsed
+            current[mac] = (ip, hostnames.get(mac) or hostname, interface)
+
+        changes = InventoryChanges()
+        with self.lock:
+            for mac, source in current.items():
+                if self.sources.get(mac) == source:
+                    continue
+                ip, hostname, interface = source
+                old = self.by_mac.get(mac)
+                if old is not None and self.by_ip.get(old.ip) is old:
+                    del self.by_ip[old.ip]
+                device = Device(mac, ip, hostname, interface)
+                self.by_mac[mac] = device
+                self.by_ip[ip] = device
+                self.sources[mac] = source
+                if old is None:
+                    changes.added.append(device)
+                else:
+                    changes.changed.append(device)
+
+            for mac in self.sources.keys() - current.keys():
+                device = self.by_mac.pop(mac)
+                del self.sources[mac]
+                if self.by_ip.get(device.ip) is device:
+                    del self.by_ip[device.ip]
+                changes.removed.append(device)
+
+        if changes:
+            for listener in list(self.listeners):
+                listener(changes)
+        return changes
+
+    def devices(self):
+        with self.lock:
+            return sorted(self.by_mac.values(), key=lambda device: tuple(int(part) for part in device.ip.split(".")))
+
+    def find_by_ip(self, ip):
+        with self.lock:
+            return self.by_ip.get(ip)
+
+    def find_by_mac(self, mac):
+        with self.lock:
+            return self.by_mac.get(mac.lower())
+
+    def find(self, query):
+        """Look up a device by IP, MAC or hostname."""
+        query = query.strip()
+        device = self.find_by_ip(query) or self.find_by_mac(query)
+        if device:
+            return device
+        with self.lock:
+            for device in self.by_mac.values():
+                if device.hostname and device.hostname.lower() == query.lower():
+                    return device
+        return None
+
+    def is_online(self, mac):
+        return self.find_by_mac(mac) is not None
+
+    def __len__(self):
+        return len(self.by_mac)
+
+
+def format_devices(devices):
+    if not devices:
+        return "No devices found."
+    return "\n".join(device.format() for device in devices)
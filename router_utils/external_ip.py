@@ -0,0 +1,167 @@
+import logging
+import re
+import threading
+import time
+
+import metrics
+
+# (name, command) pairs run on the router to learn the public IP
+IP_PROVIDERS = [
+    ("curl-ipify", "curl -s --connect-timeout 10 https://api.ipify.org"),
+    ("wget-ipify", "wget -q --timeout=10 -O- https://api.ipify.org"),
+    ("curl-icanhazip", "curl -s --connect-timeout 10 https://icanhazip.com"),
+    ("wget-icanhazip", "wget -q --timeout=10 -O- https://icanhazip.com"),
+]
+
+MODE_RACE = "race"
+MODE_SEQUENTIAL = "sequential"
+
+PROVIDER_RESULTS = metrics.counter("router_external_ip_provider_results_total", "Answers per IP provider", ("provider", "result"))
+PROVIDER_SECONDS = metrics.histogram("router_external_ip_provider_seconds", "Time until an IP provider answered", ("provider",))
+
+# Weight of the newest sample in the moving latency average
+LATENCY_SMOOTHING = 0.3
+
+
+def is_valid_ip(ip):
+    # Simple IP validation
+    pattern = r'^(\d{1,3}\.){3}\d{1,3}$'
+    if re.match(pattern, ip):
+        parts = ip.split('.')
+        return all(0 <= int(part) <= 255 for part in parts)
+    return False
+
+
+class ProviderStats:
+    def __init__(self, name):
+        self.name = name
+        self.successes = 0
+        self.failures = 0
+        self.latency = None
+
+    def record_success(self, latency):
+        self.successes += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+    def record_failure(self):
+        self.failures += 1
+
+    def success_rate(self):
+        # Laplace smoothing so untried providers are neither trusted nor ignored
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    def sort_key(self):
+        latency = self.latency if self.latency is not None else float("inf")
+        return (-round(self.success_rate(), 1), latency)
+
+    def summary(self):
+        latency = f"{self.latency:.2f}s" if self.latency is not None else "n/a"
+        total = self.successes + self.failures
+        return f"{self.name}: {self.successes}/{total} ok, avg latency {latency}"
+
+
+class ExternalIPResolver:
+    """
+    Looks up the router's public IP through several external providers.
+
+    In race mode all providers run concurrently in a single remote shell and
+    the first valid answer wins, in sequential mode they are tried one by one.
+    Either way providers are ordered by success rate and latency.
+    """
+
+    def __init__(self, session, config, logger=None):
+        self.session = session
+        self.config = config
+        self.logger = logger or logging.getLogger(__name__)
+        self.providers = dict(IP_PROVIDERS)
+        self.stats = {name: ProviderStats(name) for name, _ in IP_PROVIDERS}
+        self.lock = threading.Lock()
+
+    def ranked(self):
+        with self.lock:
+            return sorted(self.stats, key=lambda name: self.stats[name].sort_key())
+
+    def resolve(self):
+        mode = self.config.get("external_ip_mode", MODE_RACE)
+        if mode == MODE_SEQUENTIAL:
+            return self.resolve_sequential()
+        return self.resolve_race()
+
+    def resolve_sequential(self):
+        for name in self.ranked():
+            started_at = time.monotonic()
+            try:
+                output, _, _ = self.session.run(self.providers[name])
+            except Exception as e:
+                self.logger.warning("IP provider %s failed: %s", name, e)
+                self.record(name, None)
+                continue
+            ip = output.strip()
+            self.record(name, ip, time.monotonic() - started_at)
+            if is_valid_ip(ip):
+                return ip
+        return None
+
+    def build_race_script(self, order):
+        hedge_delay = int(self.config.get("external_ip_hedge_delay", 0))
+        jobs = []
+        for rank, name in enumerate(order):
+            delay = f"sleep {rank * hedge_delay}; " if hedge_delay and rank else ""
+            jobs.append(f'( {delay}echo "{name} $({self.providers[name]} 2>/dev/null | head -n 1)" ) &')
+        jobs.append("wait")
+        return " ".join(jobs)
+
+    def build_chain_script(self):
+        """One command that tries the providers in rank order and prints the first answer."""
+        chain = " || ".join(self.providers[name] for name in self.ranked())
+        return f"({chain}) 2>/dev/null | head -n 1"
+
+    def resolve_race(self):
+        order = self.ranked()
+        pending = set(order)
+        timeout = self.config.get("external_ip_timeout", 15)
+        started_at = time.monotonic()
+        # A pty makes the router hang up the remaining providers once we close the channel
+        lines = self.session.iter_lines(self.build_race_script(order), timeout=timeout, get_pty=True)
+        try:
+            for line in lines:
+                name, _, ip = line.strip().partition(" ")
+                if name not in pending:
+                    continue
+                pending.discard(name)
+                ip = ip.strip()
+                self.record(name, ip, time.monotonic() - started_at)
+                if is_valid_ip(ip):
+                    return ip
+        except Exception as e:
+            self.logger.warning("External IP race failed: %s", e)
+        finally:
+            lines.close()
+            self.record_unanswered(order, pending, time.monotonic() - started_at)
+        return None
+
+    def record_unanswered(self, order, pending, elapsed):
+        """Count providers that had started but not answered when the race ended as failed."""
+        hedge_delay = int(self.config.get("external_ip_hedge_delay", 0))
+        for rank, name in enumerate(order):
+            # Hedged providers that were still waiting for their turn are not held against them
+            if name in pending and rank * hedge_delay < elapsed:
+                self.record(name, None)
+
+    def record(self, name, ip, latency=None):
+        valid = bool(ip) and is_valid_ip(ip)
+        PROVIDER_RESULTS.inc(provider=name, result="ok" if valid else "failed")
+        if latency is not None:
+            PROVIDER_SECONDS.observe(latency, provider=name)
+        with self.lock:
+            if valid:
+                self.stats[name].record_success(latency)
+            else:
+                self.stats[name].record_failure()
+
+    def summary(self):
+        with self.lock:
+            return "\n".join(self.stats[name].summary() for name in sorted(self.stats))
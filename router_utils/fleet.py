@@ -0,0 +1,260 @@
+import logging
+import os
+import threading
+import time
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from config import Config, CONFIG_ROUTER
+
+from .router import Router
+from .devices import format_devices
+
+TARGET_ALL = "all"
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_TIMEOUT = 20
+
+FLEET_REQUESTS = metrics.counter("router_fleet_requests_total", "Fleet fan-out calls per router by result", ("router", "result"))
+FLEET_SECONDS = metrics.histogram("router_fleet_request_seconds", "Time a router took to answer a fleet call", ("router",))
+
+# Fleet actions - functions that take a router and return the text for the reply
+FLEET_ACTIONS = {
+    "ip": lambda router: router.get_ip_address(),
+    "external_ip": lambda router: router.get_external_ip() or "unknown",
+    "devices": lambda router: format_devices(router.get_connected_devices()),
+    "status": lambda router: router.get_status(),
+    "snapshot": lambda router: router.snapshot().format(),
+    "cache": lambda router: router.cache.summary(),
+}
+
+
+class FleetMember:
+    def __init__(self, name, config, groups=(), timeout=None):
+        self.name = name
+        self.config = config
+        self.groups = set(groups)
+        self.timeout = timeout
+        self.router = None
+        # False for routers passed in from outside, those keep their own callback and connection
+        self.owned = True
+        self.error = None
+        self.lock = threading.Lock()
+
+
+class FleetResult:
+    def __init__(self, name, ok, output, duration):
+        self.name = name
+        self.ok = ok
+        self.output = output
+        self.duration = duration
+
+
+class RouterFleet:
+    """
+    Keeps one Router per site and runs actions on several of them at once.
+
+    Calls fan out over a bounded worker pool and every router gets its own
+    timeout, a router that doesn't answer in time is reported as such while
+    the answers of the others are returned as soon as they are in.
+    """
+
+    def __init__(self, logger=None, max_workers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT, history=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.history = history
+        self.members = {}
+        self.timeout = timeout
+        self.message_callback = None
+        self.closed = False
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fleet")
+
+    def add(self, name, config, groups=(), timeout=None, router=None):
+        if name in self.members or name == TARGET_ALL:
+            raise ValueError(f"Invalid or duplicate router name: {name}")
+        member = FleetMember(name, config, groups, timeout)
+        member.router = router
+        member.owned = router is None
+        self.members[name] = member
+        return member
+
+    def connect(self):
+        """
+        Connect every router in parallel in the background.
+
+        Returns right away like LazyRouter.start, a router that is still
+        connecting is waited for on first use and one that failed is retried then.
+        """
+        for member in self.members.values():
+            if member.router is None:
+                self.executor.submit(self.connect_member, member)
+
+    def connect_member(self, member):
+        try:
+            self.get_router(member)
+        except Exception:
+            # Already logged by get_router
+            return
+        self.logger.info("Fleet router %s connected", member.name)
+
+    def get_router(self, member):
+        with member.lock:
+            if member.router is None:
+                if self.closed:
+                    raise ConnectionError("router fleet is closed")
+                try:
+                    member.router = Router(member.config, logger=self.logger, name=member.name, history=self.history)
+                    member.error = None
+                    if self.message_callback:
+                        self.attach_callback(member)
+                except Exception as e:
+                    member.error = str(e)
+                    self.logger.error("Failed to connect fleet router %s: %s", member.name, e)
+                    raise e
+            return member.router
+
+    def set_message_callback(self, callback):
+        """Forward alerts of the routers this fleet connected, prefixed with the router name."""
+        self.message_callback = callback
+        for member in self.members.values():
+            if member.router and member.owned:
+                self.attach_callback(member)
+
+    def attach_callback(self, member):
+        member.router.set_message_callback(lambda msg: self.message_callback(f"[{member.name}] {msg}"))
+
+    def routers(self):
+        return [member.router for member in self.members.values() if member.router]
+
+    def configs(self):
+        return [member.config for member in self.members.values()]
+
+    def groups(self):
+        groups = set()
+        for member in self.members.values():
+            groups |= member.groups
+        return sorted(groups)
+
+    def resolve(self, target):
+        """Router names for a router name, a group name or "all"."""
+        if target == TARGET_ALL:
+            return list(self.members)
+        if target in self.members:
+            return [target]
+        names = [name for name, member in self.members.items() if target in member.groups]
+        if not names:
+            raise ValueError(f"Unknown router or group: {target}")
+        return names
+
+    def call(self, member, func):
+        started_at = time.monotonic()
+        try:
+            output = func(self.get_router(member))
+            ok = True
+        except Exception as e:
+            output = f"Error: {e}"
+            ok = False
+        duration = time.monotonic() - started_at
+        FLEET_REQUESTS.inc(router=member.name, result="ok" if ok else "error")
+        FLEET_SECONDS.observe(duration, router=member.name)
+        return FleetResult(member.name, ok, output, duration)
+
+    def run(self, target, func):
+        """
+        Run func(router) on every router matched by target.
+
+        Returns:
+            list: FleetResult per router, in fleet order
+        """
+        names = self.resolve(target)
+        started_at = time.monotonic()
+        futures = {name: self.executor.submit(self.call, self.members[name], func) for name in names}
+        results = []
+        for name in names:
+            member = self.members[name]
+            timeout = member.timeout if member.timeout is not None else self.timeout
+            remaining = max(0.0, started_at + timeout - time.monotonic())
+            try:
+                results.append(futures[name].result(timeout=remaining))
+            except Exception:
+                # Leave the call running on its worker, its answer is simply not waited for
+                FLEET_REQUESTS.inc(router=name, result="timeout")
+                self.logger.warning("Fleet router %s timed out after %ss", name, timeout)
+                results.append(FleetResult(name, False, f"timed out after {timeout}s", timeout))
+        return results
+
+    def run_action(self, target, action):
+        if action not in FLEET_ACTIONS:
+            raise ValueError(f"Unknown action: {action}")
+        return self.run(target, FLEET_ACTIONS[action])
+
+    def summary(self):
+        lines = []
+        for name, member in self.members.items():
+            groups = ", ".join(sorted(member.groups)) or "-"
+            if member.router:
+                state = "connected"
+            else:
+                state = f"not connected ({member.error})" if member.error else "not connected"
+            lines.append(f"{name} [{groups}]: {state}")
+        return "\n".join(lines) if lines else "No routers in the fleet."
+
+    def flush(self):
+        for config in (member.config for member in self.members.values() if member.owned):
+            try:
+                config.flush()
+            except Exception as e:
+                self.logger.error("Error saving router configuration %s: %s", config.config_file_path, e)
+
+    def disconnect(self):
+        self.closed = True
+        for member in self.members.values():
+            if member.router and member.owned:
+                try:
+                    member.router.disconnect()
+                except Exception as e:
+                    self.logger.error("Error disconnecting fleet router %s: %s", member.name, e)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def format_fleet_results(action, results):
+    ok = sum(1 for result in results if result.ok)
+    lines = [f"🌐 Fleet {action}: {ok}/{len(results)} ok"]
+    for result in results:
+        icon = "✅" if result.ok else "❌"
+        lines.append("")
+        lines.append(f"{icon} {result.name} ({result.duration:.1f}s)")
+        lines.append(str(result.output).strip())
+    return "\n".join(lines)
+
+
+def load_fleet(path, logger=None, routers=None, max_workers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT,
+               write_behind_delay=0, history=None):
+    """
+    Build a RouterFleet from a fleet file.
+
+    The file holds one [[routers]] table per router with its name, the path
+    of its router config and optionally groups and a timeout. Routers already
+    running in this process can be passed in by config path to be reused.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Fleet file not found: {path}")
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+
+    routers = routers or {}
+    fleet = RouterFleet(logger=logger, max_workers=max_workers, timeout=timeout, history=history)
+    for entry in data.get("routers", []):
+        name = entry.get("name")
+        config_path = entry.get("config")
+        if not name or not config_path:
+            raise ValueError(f"Fleet entries need a name and a config: {entry}")
+        existing = routers.get(config_path)
+        if existing:
+            router_config = existing.config
+        else:
+            router_config = Config(config_path, config_type=CONFIG_ROUTER, logger=logger,
+                                   write_behind_delay=write_behind_delay)
+        fleet.add(name, router_config, entry.get("groups", []), entry.get("timeout"), router=existing)
+    fleet.connect()
+    return fleet
@@ -0,0 +1,81 @@
+import logging
+import threading
+
+from scheduler import SCHEDULER, POOL_ROUTER
+
+from .router import Router
+
+
+class RouterNotReady(Exception):
+    pass
+
+
+class LazyRouter:
+    """
+    Router that connects in the background.
+
+    The SSH connect and the first ifconfig and arp reads run as a job on the
+    scheduler's router pool so the rest of the program, the bot included, starts without waiting
+    for them. A failed connect is retried every retry_interval seconds. Until
+    the router is up its config can be used, anything else raises
+    RouterNotReady.
+    """
+
+    def __init__(self, config, logger=None, history=None, retry_interval=30, scheduler=None):
+        self.config = config
+        self.logger = logger or logging.getLogger(__name__)
+        self.history = history
+        self.retry_interval = retry_interval
+        self.scheduler = scheduler or SCHEDULER
+        self.router = None
+        self.error = None
+        self.message_callback = None
+        self.closed = False
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.scheduler.submit("router_connect", self.connect, pool=POOL_ROUTER)
+
+    def connect(self):
+        if self.closed:
+            return
+        try:
+            router = Router(self.config, self.logger, history=self.history)
+        except Exception as e:
+            self.error = str(e)
+            self.logger.error("Router connection failed, retrying in %ss: %s", self.retry_interval, e)
+            self.scheduler.add("router_connect", self.connect, delay=self.retry_interval, pool=POOL_ROUTER)
+            return
+        with self.lock:
+            if self.message_callback:
+                router.set_message_callback(self.message_callback)
+            self.router = router
+            self.error = None
+        if self.closed:
+            router.disconnect()
+            return
+        self.ready.set()
+        self.logger.info("Router connected")
+
+    def wait_ready(self, timeout=None):
+        return self.ready.wait(timeout)
+
+    def set_message_callback(self, callback):
+        with self.lock:
+            self.message_callback = callback
+            if self.router:
+                self.router.set_message_callback(callback)
+
+    def disconnect(self):
+        self.closed = True
+        if self.router:
+            self.router.disconnect()
+
+    def __getattr__(self, name):
+        # Only called for attributes LazyRouter doesn't have itself
+        router = self.__dict__.get("router")
+        if router is None:
+            error = self.__dict__.get("error")
+            raise RouterNotReady(f"router connecting… (last error: {error})" if error else "router connecting…")
+        return getattr(router, name)
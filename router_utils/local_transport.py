@@ -0,0 +1,107 @@
+import asyncio
+import os
+import select
+import signal
+import subprocess
+
+from .transport import Transport, TRANSPORT_LOCAL, SSH_COMMAND_SECONDS, command_label, split_lines
+
+
+class LocalProcess:
+    """Handle passed to iter_lines' on_open, close() ends the command."""
+
+    def __init__(self, process):
+        self.process = process
+
+    def close(self):
+        if self.process.returncode is not None:
+            return
+        # The shell runs in its own process group, this also ends its background jobs
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class LocalTransport(Transport):
+    """
+    Runs the commands on this machine with /bin/sh instead of on a router.
+
+    Meant for tests and development, point a router config at it with
+    transport = "local" and the command handlers run against the local host.
+    There is no connection to lose, run_async uses asyncio subprocesses.
+    """
+
+    name = TRANSPORT_LOCAL
+
+    def connect(self):
+        self.logger.info("Local transport ready, commands run on this machine")
+
+    def drop(self):
+        pass
+
+    def is_active(self):
+        return not self.closed
+
+    def run(self, command, timeout=None, retry=True):
+        if timeout is None:
+            timeout = self.config.get("ssh_command_timeout", 30)
+        self.ensure_connected()
+        with SSH_COMMAND_SECONDS.time(command=command_label(command)):
+            process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       start_new_session=True)
+            try:
+                out, err = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                LocalProcess(process).close()
+                process.communicate()
+                raise TimeoutError(f"{command_label(command)} timed out after {timeout}s")
+        return out.decode(errors="replace"), err.decode(errors="replace"), process.returncode
+
+    async def run_async(self, command, timeout=None, retry=True):
+        if timeout is None:
+            timeout = self.config.get("ssh_command_timeout", 30)
+        self.ensure_connected()
+        with SSH_COMMAND_SECONDS.time(command=command_label(command)):
+            process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE,
+                                                            stderr=asyncio.subprocess.PIPE, start_new_session=True)
+            try:
+                out, err = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                LocalProcess(process).close()
+                await process.wait()
+                raise TimeoutError(f"{command_label(command)} timed out after {timeout}s") from None
+        return out.decode(errors="replace"), err.decode(errors="replace"), process.returncode
+
+    def iter_lines(self, command, timeout=None, get_pty=False, max_bytes=None, on_open=None):
+        # get_pty is not needed here, closing kills the whole process group anyway
+        if timeout is None:
+            timeout = self.config.get("ssh_command_timeout", 30)
+        self.ensure_connected()
+        process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                   start_new_session=True)
+        handle = LocalProcess(process)
+        try:
+            if on_open:
+                on_open(handle)
+            yield from split_lines(self.read_chunks(process.stdout, timeout), max_bytes)
+        finally:
+            handle.close()
+            process.stdout.close()
+            process.wait()
+
+    def read_chunks(self, stream, timeout):
+        # Like a paramiko channel timeout, a command quiet for `timeout` seconds raises socket.timeout
+        while True:
+            ready, _, _ = select.select([stream], [], [], timeout)
+            if not ready:
+                raise TimeoutError(f"No output for {timeout}s")
+            data = os.read(stream.fileno(), 4096)
+            if not data:
+                return
+            yield data
+
+    def execute(self, command):
+        self.ensure_connected()
+        return LocalProcess(subprocess.Popen(command, shell=True, stdout=subprocess.DEVNULL,
+                                             stderr=subprocess.DEVNULL, start_new_session=True))
@@ -0,0 +1,86 @@
+import logging
+import threading
+
+from scheduler import SCHEDULER, POOL_ROUTER
+
+
+class PresenceTracker:
+    """
+    Watches the device inventory and reports devices joining or leaving.
+
+    Only the changes reported by the inventory are looked at, so a poll costs
+    O(changes) no matter how many clients are connected. A change has to hold
+    for `presence_debounce` consecutive polls before it is announced, so a
+    device flapping in and out of the arp table stays quiet.
+    """
+
+    def __init__(self, router, logger=None, scheduler=None):
+        self.router = router
+        self.logger = logger or logging.getLogger(__name__)
+        self.scheduler = scheduler or SCHEDULER
+        self.online = set()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.job = None
+
+    def start(self):
+        if self.job and not self.job.cancelled:
+            return
+        with self.lock:
+            self.online = {device.mac for device in self.router.inventory.devices()}
+            self.pending.clear()
+        self.router.inventory.add_listener(self.on_changes)
+        name = f"presence:{self.router.name}" if self.router.name else "presence"
+        self.job = self.scheduler.add(name, self.poll, interval=lambda: self.router.config.get("presence_interval", 60),
+                                      delay=0, pool=POOL_ROUTER)
+        self.logger.info("Presence tracker started")
+
+    def stop(self):
+        if self.job:
+            self.job.cancel()
+            self.job = None
+        self.router.inventory.remove_listener(self.on_changes)
+        self.logger.info("Presence tracker stopped")
+
+    def on_changes(self, changes):
+        with self.lock:
+            for device in changes.added:
+                self.mark(device, True)
+            for device in changes.removed:
+                self.mark(device, False)
+            for device in changes.changed:
+                if device.mac in self.pending:
+                    self.pending[device.mac][2] = device
+
+    def mark(self, device, online):
+        if (device.mac in self.online) == online:
+            # Back to the announced state before the debounce ran out
+            self.pending.pop(device.mac, None)
+        else:
+            self.pending[device.mac] = [online, 0, device]
+
+    def poll(self):
+        self.router.get_connected_devices(use_cache=False)
+        events = self.settle()
+        if events and self.router.message_callback:
+            self.router.message_callback("\n".join(events))
+
+    def settle(self):
+        debounce = self.router.config.get("presence_debounce", 2)
+        events = []
+        with self.lock:
+            for mac, entry in list(self.pending.items()):
+                entry[1] += 1
+                if entry[1] < debounce:
+                    continue
+                online, _, device = entry
+                del self.pending[mac]
+                if online:
+                    self.online.add(mac)
+                    events.append(f"📶 Device joined: {device.format()}")
+                else:
+                    self.online.discard(mac)
+                    events.append(f"📴 Device left: {device.format()}")
+        for event in events:
+            self.logger.info(event)
+        return events
@@ -3,226 +3,447 @@ import logging
 import tomllib
 import tomli_w
 import threading
-from rich import print
-import paramiko
+import time
+
+import metrics
+from history import DEFAULT_ROUTER
+
+from .transport import create_transport
+from .external_ip import ExternalIPResolver, is_valid_ip
+from .cache import TTLCache
+from .devices import DeviceInventory, LEASES_MARKER, split_leases
+from .presence import PresenceTracker
+from .wan_monitor import WanMonitor
+from .traffic import TrafficMonitor
+from .singleflight import SingleFlight
+from .snapshot import (
+    RouterSnapshot,
+    SNAPSHOT_SECTIONS,
+    SECTION_UPTIME,
+    SECTION_INTERFACES,
+    SECTION_DEVICES,
+    SECTION_LOAD,
+    SECTION_MEMORY,
+    SECTION_EXTERNAL_IP,
+    build_snapshot_script,
+    split_sections,
+    parse_uptime,
+    parse_loadavg,
+    parse_meminfo,
+    parse_interfaces,
+)
+
+# Changing any of these means the SSH session has to be re-established
+SSH_CONFIG_KEYS = {"ssh_hostname", "ssh_port", "username", "password", "ssh_key_path"}
+
+# Changing any of these restarts a running IP watcher
+IP_WATCHER_CONFIG_KEYS = {"ip_watcher_mode", "wan_interface"}
+
+EXTERNAL_IP_LOOKUPS = metrics.counter("router_external_ip_lookups_total", "External IP lookups by outcome", ("outcome",))
+SNAPSHOT_SECONDS = metrics.histogram("router_snapshot_seconds", "Time taken by a router snapshot round trip")
+
+CACHE_IP_ADDRESS = "ifconfig"
+CACHE_DEVICES = "arp"
+EXTERNAL_IP = "external_ip"
 
 class Router:
-    def __init__(self, config, logger=None):
+    def __init__(self, config, logger=None, name=None, history=None):
         self.logger = logger or logging.getLogger(__name__)
         self.config = config
+        self.name = name
+        self.history = history
+        self.history_key = name or DEFAULT_ROUTER
         self.lock = threading.Lock()
-        self.ssh_client = None
+        # paramiko by default, see create_transport for the asyncssh and local backends
+        self.session = create_transport(config, logger=self.logger)
+        self.ip_resolver = ExternalIPResolver(self.session, config, logger=self.logger)
+        self.cache = TTLCache(logger=self.logger)
+        self.inflight = SingleFlight()
+        self.inventory = DeviceInventory()
+        self.presence_tracker = PresenceTracker(self, logger=self.logger)
+        self.wan_monitor = WanMonitor(self, logger=self.logger)
+        self.traffic_monitor = TrafficMonitor(self, logger=self.logger)
         self.ip = None
         self.devices = []
         self.message_callback = None
-        self.last_ip_file = "last_ip.txt"
-        self.watcher_thread = None
+        # Routers in a fleet each keep their own last known IP
+        self.last_ip_file = f"last_ip_{name}.txt" if name else "last_ip.txt"
         
+        # A failed start closes the session, LazyRouter and the fleet retry with a new Router
         try:
             self.ssh_connect()
         except Exception as e:
-            self.logger.error(f"Failed to connect to router: {e}")
+            self.logger.error("Failed to connect to router: %s", e)
+            self.session.close()
             raise e
         
         try:
             self.ip = self.get_ip_address()
         except Exception as e:
-            self.logger.error(f"Failed to get router IP address: {e}")
+            self.logger.error("Failed to get router IP address: %s", e)
+            self.session.close()
             raise e
         
+        if self.history:
+            self.history.reset_devices(self.history_key)
+        
         try:
             self.devices = self.get_connected_devices()
         except Exception as e:
-            self.logger.error(f"Failed to get connected devices: {e}")
+            self.logger.error("Failed to get connected devices: %s", e)
+            self.session.close()
             raise e
         
         # Load last known IP
         self.load_last_ip()
         
+        self.config.subscribe(self.on_config_change)
+        
         # Start IP watcher if enabled
         if self.config.get("ip_watcher_enabled", False):
             self.start_ip_watcher()
+        
+        # Start presence tracker if enabled
+        if self.config.get("presence_tracker_enabled", False):
+            self.start_presence_tracker()
+        
+        if self.config.get("traffic_enabled", False):
+            self.start_traffic_monitor()
+    
+    def on_config_change(self, config, changed):
+        if "transport" in changed:
+            self.logger.warning("The router transport changed, it is switched on the next restart")
+        
+        if changed & SSH_CONFIG_KEYS:
+            self.logger.info("SSH settings changed, reconnecting to router")
+            self.session.reconnect()
+            self.cache.invalidate()
+        
+        if "ip_watcher_enabled" in changed:
+            if config.get("ip_watcher_enabled", False):
+                self.start_ip_watcher()
+            else:
+                self.stop_ip_watcher()
+        elif changed & IP_WATCHER_CONFIG_KEYS and self.wan_monitor.is_running():
+            self.logger.info("IP watcher settings changed, restarting it")
+            self.wan_monitor.restart()
+        
+        if "presence_tracker_enabled" in changed:
+            if config.get("presence_tracker_enabled", False):
+                self.start_presence_tracker()
+            else:
+                self.stop_presence_tracker()
+        
+        if "traffic_enabled" in changed:
+            if config.get("traffic_enabled", False):
+                self.start_traffic_monitor()
+            else:
+                self.stop_traffic_monitor()
     
     def print_config(self):
+        from rich import print
         print("Router config:")
         for key, value in self.config.config.items():
             print(f"[cyan]{key}[/cyan]: {value}")
 
     def ssh_connect(self):
-        self.ssh_client = paramiko.SSHClient()
-        self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        hostname = self.config.get("ssh_hostname")
-        port = self.config.get("ssh_port", 22)
-        username = self.config.get("username")
-        password = self.config.get("password")
-        key_filename=self.config.get("ssh_key_path")
-
-        if self.config.get("ssh_key_path") is not None and os.path.exists(self.config.get("ssh_key_path")):
-            self.ssh_client.connect(
-                hostname=hostname,
-                port=port,
-                username=username,
-                key_filename=key_filename,
-            )
-        else:
-            self.ssh_client.connect(
-                hostname=hostname,
-                port=port,
-                username=username,
-                password=password,
-            )
+        self.session.connect()
         
     def get_status(self):
         try:
-            stdin, stdout, stderr = self.ssh_client.exec_command("uptime")
-            status = stdout.read().decode()
+            status, _, _ = self.session.run("uptime")
             return status
         except Exception as e:
-            self.logger.error(f"Failed to get router status: {e}")
+            self.logger.error("Failed to get router status: %s", e)
             raise e
+
+    async def run_async(self, command, timeout=None):
+        """
+        Run a command from a coroutine.
+
+        With the asyncssh transport any number of these share one event loop
+        and one connection, the other transports run them on worker threads.
+
+        Returns:
+            tuple: (stdout, stderr, exit_status)
+        """
+        return await self.session.run_async(command, timeout=timeout)
+
+    async def get_status_async(self):
+        status, _, _ = await self.run_async("uptime")
+        return status
     
     def restart(self):
         try:
-            stdin, stdout, stderr = self.ssh_client.exec_command("reboot")
+            self.session.execute("reboot")
+            self.cache.invalidate()
             self.logger.info("Router is restarting")
         except Exception as e:
-            self.logger.error(f"Failed to restart router: {e}")
+            self.logger.error("Failed to restart router: %s", e)
             raise e
 
     def disconnect(self):
-        if self.ssh_client:
-            self.ssh_client.close()
-            self.logger.info("SSH connection closed")
+        self.session.close()
+        self.logger.info("SSH connection closed")
     
-    def get_ip_address(self):
+    def cached(self, key, loader, ttl_key, default_ttl, use_cache=True):
+        # Callers asking while the same fetch is running share its result instead of running it again
+        shared_loader = lambda: self.inflight.do(key, loader)
+        if not use_cache:
+            value = shared_loader()
+            self.cache.set(key, value)
+            return value
+        ttl = self.config.get(ttl_key, default_ttl)
+        stale_ttl = self.config.get("cache_stale_ttl", 60)
+        return self.cache.get(key, shared_loader, ttl, stale_ttl)
+
+    def get_ip_address(self, use_cache=True):
         try:
-            stdin, stdout, stderr = self.ssh_client.exec_command("ifconfig")
-            return stdout.read().decode()
+            self.ip = self.cached(CACHE_IP_ADDRESS, self.fetch_ip_address, "cache_ttl_ip_address", 30, use_cache)
+            return self.ip
         except Exception as e:
-            self.logger.error(f"Failed to get IP address: {e}")
+            self.logger.error("Failed to get IP address: %s", e)
             raise e 
 
-    def get_connected_devices(self):
+    def fetch_ip_address(self):
+        output, _, _ = self.session.run("ifconfig")
+        return output
+
+    def get_connected_devices(self, use_cache=True):
         try:
-            stdin, stdout, stderr = self.ssh_client.exec_command("arp -a")
-            if stderr.read():
-                raise Exception(stderr.read().decode())
-            devices = []
-            for line in stdout:
-                devices.append(line.strip())
-            return devices
+            self.devices = self.cached(CACHE_DEVICES, self.fetch_connected_devices, "cache_ttl_devices", 15, use_cache)
+            return self.devices
         except Exception as e:
-            self.logger.error(f"Failed to get connected devices: {e}")
+            self.logger.error("Failed to get connected devices: %s", e)
             raise e    
 
+    def devices_command(self):
+        leases_path = self.config.get("dhcp_leases_path", "/tmp/dhcp.leases")
+        return f"arp -a; echo '{LEASES_MARKER}'; cat {leases_path} 2>/dev/null"
+
+    def fetch_connected_devices(self):
+        output, error, _ = self.session.run(self.devices_command())
+        return self.update_devices(output, error)
+
+    def update_devices(self, output, error=""):
+        """Refresh the device inventory from combined arp and lease file output."""
+        arp_lines, lease_lines = split_leases(output)
+        if error and not any(line.strip() for line in arp_lines):
+            raise Exception(error.strip())
+        changes = self.inventory.update(arp_lines, lease_lines)
+        if self.history:
+            self.history.record_devices(changes, self.history_key)
+        if changes:
+            self.logger.debug("Device inventory: %s added, %s changed, %s removed", len(changes.added), len(changes.changed), len(changes.removed))
+        return self.inventory.devices()
+
+    def snapshot(self, sections=None):
+        """
+        Collect uptime, load, memory, interfaces, devices and the public IP in one round trip.
+
+        Args:
+            sections (list): Only collect these sections, all of SNAPSHOT_SECTIONS by default
+
+        Returns:
+            RouterSnapshot: Parsed sections, the interface and device sections also refresh the cache
+        """
+        sections, script, timeout = self.snapshot_script(sections)
+        started_at = time.monotonic()
+        output, _, _ = self.session.run(script, timeout=timeout)
+        return self.parse_snapshot(sections, output, time.monotonic() - started_at)
+
+    async def snapshot_async(self, sections=None):
+        """snapshot() as a coroutine, it doesn't hold a thread while the router answers."""
+        sections, script, timeout = self.snapshot_script(sections)
+        started_at = time.monotonic()
+        output, _, _ = await self.session.run_async(script, timeout=timeout)
+        return self.parse_snapshot(sections, output, time.monotonic() - started_at)
+
+    def snapshot_script(self, sections):
+        if sections:
+            unknown = set(sections) - set(SNAPSHOT_SECTIONS)
+            if unknown:
+                raise ValueError(f"Unknown snapshot sections: {', '.join(sorted(unknown))}")
+            sections = [section for section in SNAPSHOT_SECTIONS if section in sections]
+        else:
+            sections = list(SNAPSHOT_SECTIONS)
+        commands = {
+            SECTION_UPTIME: "uptime",
+            SECTION_LOAD: "cat /proc/loadavg",
+            SECTION_MEMORY: "cat /proc/meminfo",
+            SECTION_INTERFACES: "ifconfig",
+            SECTION_DEVICES: self.devices_command(),
+            SECTION_EXTERNAL_IP: self.ip_resolver.build_chain_script(),
+        }
+        timeout = self.config.get("ssh_command_timeout", 30)
+        if SECTION_EXTERNAL_IP in sections:
+            timeout += self.config.get("external_ip_timeout", 15)
+        return sections, build_snapshot_script([(section, commands[section]) for section in sections]), timeout
+
+    def parse_snapshot(self, sections, output, duration):
+        snapshot = RouterSnapshot(sections)
+        snapshot.duration = duration
+        SNAPSHOT_SECONDS.observe(duration)
+
+        parsed = split_sections(output)
+        for section in sections:
+            status, text = parsed.get(section, (None, ""))
+            if status is None:
+                snapshot.errors[section] = "no output"
+                continue
+            if status != 0 and not text.strip():
+                snapshot.errors[section] = f"exit status {status}"
+                continue
+            try:
+                self.apply_snapshot_section(snapshot, section, text)
+            except Exception as e:
+                snapshot.errors[section] = str(e)
+        return snapshot
+
+    def apply_snapshot_section(self, snapshot, section, text):
+        if section == SECTION_UPTIME:
+            snapshot.uptime = parse_uptime(text)
+        elif section == SECTION_LOAD:
+            snapshot.load = parse_loadavg(text)
+        elif section == SECTION_MEMORY:
+            snapshot.memory = parse_meminfo(text)
+        elif section == SECTION_INTERFACES:
+            snapshot.interfaces_text = text
+            snapshot.interfaces = parse_interfaces(text)
+            self.ip = text
+            self.cache.set(CACHE_IP_ADDRESS, text)
+        elif section == SECTION_DEVICES:
+            snapshot.devices = self.update_devices(text)
+            self.devices = snapshot.devices
+            self.cache.set(CACHE_DEVICES, snapshot.devices)
+        elif section == SECTION_EXTERNAL_IP:
+            ip = text.strip()
+            snapshot.external_ip = ip if is_valid_ip(ip) else ""
+
+    def stream_command(self, command, timeout=None, max_bytes=None):
+        """
+        Run a command on the router and yield its output lines as they arrive.
+
+        Output beyond max_bytes (stream_max_bytes by default) is dropped.
+        """
+        if timeout is None:
+            timeout = self.config.get("stream_timeout", 120)
+        if max_bytes is None:
+            max_bytes = self.config.get("stream_max_bytes", 1024 * 1024)
+        return self.session.iter_lines(command, timeout=timeout, max_bytes=max_bytes)
+
+    def find_device(self, query):
+        """Find a connected device by IP, MAC or hostname."""
+        self.get_connected_devices()
+        return self.inventory.find(query)
+
     def set_message_callback(self, callback):
         self.message_callback = callback
 
+    def wait_ready(self, timeout=None):
+        # Connected in __init__, see LazyRouter for a router that connects in the background
+        return True
+
     def load_last_ip(self):
+        if self.history:
+            try:
+                self.last_ip = self.history.last_ip(self.history_key)
+                if self.last_ip:
+                    self.logger.info("Loaded last IP from history: %s", self.last_ip)
+                    return
+            except Exception as e:
+                self.logger.error("Failed to load last IP from history: %s", e)
         try:
             if os.path.exists(self.last_ip_file):
                 with open(self.last_ip_file, 'r') as f:
                     self.last_ip = f.read().strip()
-                self.logger.info(f"Loaded last IP: {self.last_ip}")
+                self.logger.info("Loaded last IP: %s", self.last_ip)
             else:
                 self.last_ip = None
         except Exception as e:
-            self.logger.error(f"Failed to load last IP: {e}")
+            self.logger.error("Failed to load last IP: %s", e)
             self.last_ip = None
 
     def save_last_ip(self, ip):
         try:
             with open(self.last_ip_file, 'w') as f:
                 f.write(ip)
-            self.logger.info(f"Saved last IP: {ip}")
+            self.logger.info("Saved last IP: %s", ip)
         except Exception as e:
-            self.logger.error(f"Failed to save last IP: {e}")
+            self.logger.error("Failed to save last IP: %s", e)
 
     def start_ip_watcher(self):
-        if self.watcher_thread and self.watcher_thread.is_alive():
-            return
-        self.watcher_thread = threading.Thread(target=self.ip_watcher_loop, daemon=True)
-        self.watcher_thread.start()
-        self.logger.info("IP watcher started")
+        self.wan_monitor.start()
 
     def stop_ip_watcher(self):
-        if self.watcher_thread:
-            # Note: Since it's daemon, it will stop with the process
-            self.logger.info("IP watcher stopped")
-
-    def ip_watcher_loop(self):
-        import time
-        while True:
-            if not self.config.get("ip_watcher_enabled", False):
-                break
-            try:
-                current_ip = self.get_external_ip()
-                if self.last_ip and current_ip != self.last_ip:
-                    message = f"🚨 Public IP changed!\nOld: {self.last_ip}\nNew: {current_ip}"
-                    if self.message_callback:
-                        self.message_callback(message)
-                    self.logger.warning(f"Public IP changed: {self.last_ip} -> {current_ip}")
-                if current_ip:
-                    self.save_last_ip(current_ip)
-                    self.last_ip = current_ip
-            except Exception as e:
-                self.logger.error(f"IP watcher error: {e}")
-            time.sleep(300)  # Check every 5 minutes
+        self.wan_monitor.stop()
+
+    def start_presence_tracker(self):
+        self.presence_tracker.start()
+
+    def stop_presence_tracker(self):
+        self.presence_tracker.stop()
+
+    def start_traffic_monitor(self):
+        self.traffic_monitor.start()
+
+    def stop_traffic_monitor(self):
+        self.traffic_monitor.stop()
+
+    def check_external_ip(self):
+        """
+        Look up the public IP and report it if it changed.
+
+        Returns:
+            bool: True if the IP changed since the last check
+        """
+        current_ip = self.get_external_ip()
+        if not current_ip:
+            return False
+        if current_ip == self.last_ip:
+            return False
+        changed = bool(self.last_ip)
+        if changed:
+            message = f"🚨 Public IP changed!\nOld: {self.last_ip}\nNew: {current_ip}"
+            if self.message_callback:
+                self.message_callback(message)
+            self.logger.warning("Public IP changed: %s -> %s", self.last_ip, current_ip)
+        # Only written when the IP differs, an unchanged IP costs no disk write
+        self.save_last_ip(current_ip)
+        if self.history:
+            self.history.record_ip(current_ip, self.history_key)
+        self.last_ip = current_ip
+        return changed
 
     def get_external_ip(self):
         # Get the public IP by querying an external service from the router
         try:
-            # Try curl first
-            stdin, stdout, stderr = self.ssh_client.exec_command("curl -s --connect-timeout 10 https://api.ipify.org")
-            ip = stdout.read().decode().strip()
-            if ip and self._is_valid_ip(ip):
-                return ip
-            
-            # Try wget if curl fails
-            stdin, stdout, stderr = self.ssh_client.exec_command("wget -q --timeout=10 -O- https://api.ipify.org")
-            ip = stdout.read().decode().strip()
-            if ip and self._is_valid_ip(ip):
-                return ip
-                
-            # Try another service with curl
-            stdin, stdout, stderr = self.ssh_client.exec_command("curl -s --connect-timeout 10 https://icanhazip.com")
-            ip = stdout.read().decode().strip()
-            if ip and self._is_valid_ip(ip):
+            ip = self.inflight.do(EXTERNAL_IP, self.ip_resolver.resolve)
+            if ip:
+                EXTERNAL_IP_LOOKUPS.inc(outcome="ok")
                 return ip
-                
-            # Try another service with wget
-            stdin, stdout, stderr = self.ssh_client.exec_command("wget -q --timeout=10 -O- https://icanhazip.com")
-            ip = stdout.read().decode().strip()
-            if ip and self._is_valid_ip(ip):
-                return ip
-                
         except Exception as e:
-            self.logger.error(f"Failed to get external IP: {e}")
+            self.logger.error("Failed to get external IP: %s", e)
+        
+        EXTERNAL_IP_LOOKUPS.inc(outcome="fallback")
         
         # Fallback: try to get it from router's WAN interface
         try:
             # This is router-specific, but try some common commands
-            stdin, stdout, stderr = self.ssh_client.exec_command("ip route show default | awk '{print $3}'")
-            gateway_ip = stdout.read().decode().strip()
+            output, _, _ = self.session.run("ip route show default | awk '{print $3}'")
+            gateway_ip = output.strip()
             if gateway_ip and self._is_valid_ip(gateway_ip):
                 # This is not the public IP, but we can log it
-                self.logger.warning(f"Could not get public IP, gateway IP: {gateway_ip}")
+                self.logger.warning("Could not get public IP, gateway IP: %s", gateway_ip)
         except Exception as e:
-            self.logger.error(f"Failed to get gateway IP: {e}")
+            self.logger.error("Failed to get gateway IP: %s", e)
         
         return None
     
     def _is_valid_ip(self, ip):
-        # Simple IP validation
-        import re
-        pattern = r'^(\d{1,3}\.){3}\d{1,3}$'
-        if re.match(pattern, ip):
-            parts = ip.split('.')
-            return all(0 <= int(part) <= 255 for part in parts)
-        return False
-
-def init_router_connection(config, logger=None):
-    router = Router(config, logger)
+        return is_valid_ip(ip)
+
+def init_router_connection(config, logger=None, history=None):
+    router = Router(config, logger, history=history)
     return router
     
\ No newline at end of file
@@ -0,0 +1,61 @@
+import threading
+
+import metrics
+
+SINGLEFLIGHT_CALLS = metrics.counter("router_singleflight_calls_total", "Router fetches by whether they ran or joined one in flight", ("key", "role"))
+
+
+class Call:
+    __slots__ = ("done", "result", "error", "shared")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.shared = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function, callers arriving while it is
+    still running wait for it and get the same result or exception. Once it
+    finishes the key is free again, nothing is cached beyond the call itself.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, func):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+            else:
+                call.shared += 1
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.inc(key=key, role="shared")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        SINGLEFLIGHT_CALLS.inc(key=key, role="leader")
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self.lock:
+            return {key: call.shared for key, call in self.calls.items()}
@@ -0,0 +1,187 @@
+import re
+import time
+
+SECTION_UPTIME = "uptime"
+SECTION_INTERFACES = "interfaces"
+SECTION_DEVICES = "devices"
+SECTION_LOAD = "load"
+SECTION_MEMORY = "memory"
+SECTION_EXTERNAL_IP = "external_ip"
+
+# In script order, the external IP lookup waits on the network so it goes last
+SNAPSHOT_SECTIONS = (
+    SECTION_UPTIME,
+    SECTION_LOAD,
+    SECTION_MEMORY,
+    SECTION_INTERFACES,
+    SECTION_DEVICES,
+    SECTION_EXTERNAL_IP,
+)
+
+SECTION_START = "@@SNAPSHOT {}@@"
+SECTION_END = re.compile(r'^@@SNAPSHOT_END (\w+) (\d+)@@$')
+SECTION_START_LINE = re.compile(r'^@@SNAPSHOT (\w+)@@$')
+
+# " 12:00:00 up 12 days,  3:04,  2 users,  load average: 0.08, 0.03, 0.01"
+UPTIME_SINCE = re.compile(r'up\s+(.*?),\s+(?:\d+\s+users?,\s+)?load average')
+INET_ADDRESS = re.compile(r'inet (?:addr:)?(\d{1,3}(?:\.\d{1,3}){3})')
+
+
+def build_snapshot_script(commands):
+    """
+    Build one shell script that runs every section and delimits its output.
+
+    Args:
+        commands (list): (section, command) pairs in the order they should run
+
+    Each section is wrapped in start and end markers, the end marker carries
+    the exit status so a failed section can be told apart from an empty one.
+    """
+    parts = []
+    for section, command in commands:
+        parts.append(f"echo '{SECTION_START.format(section)}'; {{ {command}; }} 2>/dev/null; "
+                     f"echo \"@@SNAPSHOT_END {section} $?@@\"")
+    return "; ".join(parts)
+
+
+def split_sections(output):
+    """
+    Split the output of a snapshot script into its sections.
+
+    Returns:
+        dict: {section: (exit_status, text)}, exit_status is None for a section that was cut off
+    """
+    sections = {}
+    current = None
+    lines = []
+    for line in output.splitlines():
+        start = SECTION_START_LINE.match(line)
+        if start:
+            if current:
+                sections[current] = (None, "\n".join(lines))
+            current, lines = start.group(1), []
+            continue
+        end = SECTION_END.match(line)
+        if end and end.group(1) == current:
+            sections[current] = (int(end.group(2)), "\n".join(lines))
+            current, lines = None, []
+            continue
+        if current:
+            lines.append(line)
+    if current:
+        sections[current] = (None, "\n".join(lines))
+    return sections
+
+
+def parse_uptime(text):
+    match = UPTIME_SINCE.search(text)
+    if not match:
+        return text.strip()
+    return " ".join(match.group(1).split())
+
+
+def parse_loadavg(text):
+    """Parse /proc/loadavg into the 1, 5 and 15 minute load averages."""
+    parts = text.split()
+    if len(parts) < 3:
+        return None
+    try:
+        return tuple(float(part) for part in parts[:3])
+    except ValueError:
+        return None
+
+
+def parse_meminfo(text):
+    """Parse /proc/meminfo into a {field: kB} mapping."""
+    memory = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        parts = value.split()
+        if parts and parts[0].isdigit():
+            memory[key.strip()] = int(parts[0])
+    return memory
+
+
+def parse_interfaces(text):
+    """
+    Interface names and IPv4 addresses from ifconfig output.
+
+    Handles both the busybox/net-tools layout ("br-lan    Link encap...",
+    "inet addr:...") and the newer one ("eth0: flags=...", "inet ...").
+
+    Returns:
+        list: (name, ip) tuples, ip is None for interfaces without an address
+    """
+    interfaces = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        if not line[0].isspace():
+            interfaces.append([line.split()[0].rstrip(":"), None])
+            continue
+        match = INET_ADDRESS.search(line)
+        if match and interfaces and interfaces[-1][1] is None:
+            interfaces[-1][1] = match.group(1)
+    return [tuple(interface) for interface in interfaces]
+
+
+def memory_used(memory):
+    """
+    Used and total memory in kB from parsed /proc/meminfo.
+
+    Returns:
+        tuple: (used, total), or None without a MemTotal
+    """
+    if not memory or not memory.get("MemTotal"):
+        return None
+    total = memory["MemTotal"]
+    available = memory.get("MemAvailable")
+    if available is None:
+        # Kernels before 3.14 have no MemAvailable
+        available = sum(memory.get(key, 0) for key in ("MemFree", "Buffers", "Cached"))
+    return total - available, total
+
+
+class RouterSnapshot:
+    """
+    Router state collected in a single remote invocation.
+
+    Sections that were not asked for stay None, sections that failed are
+    listed in errors with the reason.
+    """
+
+    __slots__ = ("sections", "taken_at", "duration", "uptime", "load", "memory", "interfaces",
+                 "interfaces_text", "devices", "external_ip", "errors")
+
+    def __init__(self, sections):
+        self.sections = tuple(sections)
+        self.taken_at = time.time()
+        self.duration = 0.0
+        self.uptime = None
+        self.load = None
+        self.memory = None
+        self.interfaces = None
+        self.interfaces_text = None
+        self.devices = None
+        self.external_ip = None
+        self.errors = {}
+
+    def format(self):
+        lines = [f"📊 Router status ({self.duration:.1f}s)"]
+        if self.uptime is not None:
+            lines.append(f"⏱ Up {self.uptime}")
+        if self.load is not None:
+            lines.append("📈 Load: " + " ".join(f"{value:.2f}" for value in self.load))
+        used = memory_used(self.memory)
+        if used:
+            lines.append(f"🧠 Memory: {used[0] // 1024}/{used[1] // 1024} MiB used ({100 * used[0] / used[1]:.0f}%)")
+        if self.external_ip is not None:
+            lines.append(f"🌐 Public IP: {self.external_ip or 'unknown'}")
+        if self.interfaces is not None:
+            addresses = [f"{name} {ip}" for name, ip in self.interfaces if ip and name != "lo"]
+            lines.append("🔌 Interfaces: " + (", ".join(addresses) or "none with an address"))
+        if self.devices is not None:
+            lines.append(f"📱 Devices: {len(self.devices)} connected")
+        for section, error in self.errors.items():
+            lines.append(f"⚠️ {section}: {error}")
+        return "\n".join(lines)
@@ -0,0 +1,180 @@
+import os
+import socket
+import threading
+
+from .transport import (
+    Transport,
+    TRANSPORT_PARAMIKO,
+    SSH_COMMAND_SECONDS,
+    SSH_CONNECTION_ERRORS,
+    command_label,
+    split_lines,
+)
+
+
+def connection_errors():
+    """Errors that mean the transport is gone and a reconnect is worth trying."""
+    # paramiko is imported on first use, it is one of the slowest imports at startup
+    import paramiko
+    return (paramiko.SSHException, EOFError, ConnectionError, OSError)
+
+
+class SSHSession(Transport):
+    """
+    Managed paramiko SSH session, the default transport.
+
+    One kept-alive transport is reused for all commands, each command gets its
+    own channel, the number of open channels is capped and a dropped connection
+    is re-established with exponential backoff. Calls block the calling thread.
+    """
+
+    name = TRANSPORT_PARAMIKO
+
+    def __init__(self, config, logger=None):
+        super().__init__(config, logger=logger)
+        self.client = None
+        self.channels = threading.BoundedSemaphore(config.get("ssh_max_channels", 4))
+
+    def connect(self):
+        import paramiko
+
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        hostname = self.config.get("ssh_hostname")
+        port = self.config.get("ssh_port", 22)
+        username = self.config.get("username")
+        password = self.config.get("password")
+        key_filename = self.config.get("ssh_key_path")
+        # Bounds the TCP connect, the banner and the login, without it an unreachable router blocks for minutes
+        timeout = self.config.get("ssh_connect_timeout", 10)
+
+        try:
+            if key_filename and os.path.exists(key_filename):
+                client.connect(
+                    hostname=hostname,
+                    port=port,
+                    username=username,
+                    key_filename=key_filename,
+                    timeout=timeout,
+                    banner_timeout=timeout,
+                    auth_timeout=timeout,
+                )
+            else:
+                client.connect(
+                    hostname=hostname,
+                    port=port,
+                    username=username,
+                    password=password,
+                    timeout=timeout,
+                    banner_timeout=timeout,
+                    auth_timeout=timeout,
+                )
+        except Exception:
+            # A failed handshake or login can leave the transport thread running
+            client.close()
+            raise
+
+        transport = client.get_transport()
+        keepalive = self.config.get("ssh_keepalive_interval", 30)
+        if keepalive:
+            transport.set_keepalive(keepalive)
+
+        self.client = client
+        self.logger.info("SSH session established to %s:%s", hostname, port)
+
+    def is_active(self):
+        client = self.client
+        if client is None:
+            return False
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def drop(self):
+        if self.client:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+            self.client = None
+
+    def current_client(self):
+        """
+        The connected client for one command.
+
+        Callers keep this reference for the whole command, self.client may be
+        swapped by a reconnect in another thread meanwhile.
+        """
+        self.ensure_connected()
+        client = self.client
+        if client is None:
+            raise EOFError("SSH session was dropped by another thread")
+        return client
+
+    def drop_client(self, client):
+        """Drop the connection a failed command ran on, unless another thread already replaced it."""
+        with self.lock:
+            if self.client is client:
+                self.drop()
+
+    def open_channel(self, client):
+        try:
+            return client.get_transport().open_session()
+        except Exception as e:
+            if isinstance(e, connection_errors()):
+                SSH_CONNECTION_ERRORS.inc()
+                self.drop_client(client)
+            raise
+
+    def run(self, command, timeout=None, retry=True):
+        # The timeout applies to every read on the channel, not the whole command
+        if timeout is None:
+            timeout = self.config.get("ssh_command_timeout", 30)
+        attempts = 2 if retry else 1
+        for attempt in range(1, attempts + 1):
+            self.ensure_connected()
+            client = self.client
+            try:
+                if client is None:
+                    raise EOFError("SSH session was dropped by another thread")
+                with self.channels, SSH_COMMAND_SECONDS.time(command=command_label(command)):
+                    stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+                    out = stdout.read()
+                    err = stderr.read()
+                    status = stdout.channel.recv_exit_status()
+                return out.decode(errors="replace"), err.decode(errors="replace"), status
+            except socket.timeout:
+                raise
+            except Exception as e:
+                if not isinstance(e, connection_errors()):
+                    raise
+                SSH_CONNECTION_ERRORS.inc()
+                if attempt == attempts:
+                    raise
+                self.logger.warning("SSH connection lost while running '%s': %s, reconnecting", command, e)
+                if client is not None:
+                    self.drop_client(client)
+
+    def iter_lines(self, command, timeout=None, get_pty=False, max_bytes=None, on_open=None):
+        if timeout is None:
+            timeout = self.config.get("ssh_command_timeout", 30)
+        client = self.current_client()
+        with self.channels:
+            channel = self.open_channel(client)
+            try:
+                channel.settimeout(timeout)
+                if get_pty:
+                    channel.get_pty()
+                channel.exec_command(command)
+                if on_open:
+                    on_open(channel)
+                yield from split_lines(iter(lambda: channel.recv(4096), b""), max_bytes)
+            finally:
+                channel.close()
+
+    def execute(self, command):
+        client = self.current_client()
+        with self.channels:
+            channel = self.open_channel(client)
+            channel.exec_command(command)
+        return channel
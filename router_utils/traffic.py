@@ -0,0 +1,297 @@
+import logging
+import math
+import threading
+import time
+from array import array
+
+import metrics
+from scheduler import SCHEDULER, POOL_ROUTER
+
+from .snapshot import build_snapshot_script, split_sections, parse_loadavg, parse_meminfo, memory_used
+
+# (interval, points) per tier, the first tier holds raw samples at traffic_sample_interval.
+# Higher tiers average the raw samples that fall in each interval, so a series
+# takes the same memory after an hour as after a year
+TIERS = (
+    (None, 360),
+    (60, 1440),
+    (3600, 720),
+)
+
+SECTION_NET = "net"
+SECTION_LOAD = "load"
+SECTION_MEMORY = "memory"
+
+SERIES_LOAD = "load"
+SERIES_MEMORY = "memory"
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+SPARK_WIDTH = 30
+
+INTERFACE_RATE = metrics.gauge("router_interface_bytes_per_second", "Interface throughput from /proc/net/dev",
+                               ("router", "interface", "direction"))
+LOAD_AVERAGE = metrics.gauge("router_load_average", "Router 1 minute load average", ("router",))
+
+
+def parse_net_dev(text):
+    """
+    Parse /proc/net/dev into byte counters per interface.
+
+    Returns:
+        dict: {interface: (rx_bytes, tx_bytes)}
+    """
+    counters = {}
+    for line in text.splitlines():
+        name, separator, data = line.partition(":")
+        fields = data.split()
+        if not separator or len(fields) < 9 or not fields[0].isdigit():
+            continue
+        counters[name.strip()] = (int(fields[0]), int(fields[8]))
+    return counters
+
+
+def format_interval(seconds):
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600:g}h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60:g}m"
+    return f"{seconds:g}s"
+
+
+def format_rate(bytes_per_second):
+    bits = bytes_per_second * 8
+    for unit, size in (("Gbit/s", 1e9), ("Mbit/s", 1e6), ("kbit/s", 1e3)):
+        if bits >= size:
+            return f"{bits / size:.1f} {unit}"
+    return f"{bits:.0f} bit/s"
+
+
+def sparkline(values, width=SPARK_WIDTH):
+    """One block character per value from zero up to the largest one, gaps show as spaces."""
+    values = values[-width:]
+    known = [value for value in values if not math.isnan(value)]
+    if not known:
+        return "no points yet"
+    high = max(max(known), 0.0)
+    chars = []
+    for value in values:
+        if math.isnan(value):
+            chars.append(" ")
+        elif high == 0:
+            chars.append(SPARK_CHARS[0])
+        else:
+            chars.append(SPARK_CHARS[round(max(value, 0.0) / high * (len(SPARK_CHARS) - 1))])
+    return "".join(chars)
+
+
+class RingBuffer:
+    """Fixed number of floats in a preallocated array, the oldest value is overwritten first."""
+
+    __slots__ = ("data", "start", "count")
+
+    def __init__(self, capacity):
+        self.data = array("f", bytes(4 * capacity))
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        capacity = len(self.data)
+        if self.count < capacity:
+            self.data[(self.start + self.count) % capacity] = value
+            self.count += 1
+        else:
+            self.data[self.start] = value
+            self.start = (self.start + 1) % capacity
+
+    def values(self, last=None):
+        """Values oldest first, only the newest `last` ones if given."""
+        count = self.count if last is None else min(last, self.count)
+        capacity = len(self.data)
+        first = self.start + self.count - count
+        return [self.data[(first + index) % capacity] for index in range(count)]
+
+    def latest(self):
+        if not self.count:
+            return None
+        return self.data[(self.start + self.count - 1) % len(self.data)]
+
+
+class TieredSeries:
+    """
+    One metric kept at several resolutions.
+
+    Every sample goes into the raw tier, each higher tier averages the
+    samples of its interval and stores one point once the interval is over.
+    An interval with only gaps, or without samples at all, is stored as a
+    gap so the coarser graphs keep it too.
+    """
+
+    __slots__ = ("rings", "intervals", "buckets", "sums", "counts")
+
+    def __init__(self, tiers):
+        self.rings = [RingBuffer(points) for _, points in tiers]
+        self.intervals = [interval for interval, _ in tiers]
+        self.buckets = [None] * len(tiers)
+        self.sums = [0.0] * len(tiers)
+        self.counts = [0] * len(tiers)
+
+    def add(self, timestamp, value):
+        self.rings[0].append(value)
+        for tier in range(1, len(self.rings)):
+            bucket = int(timestamp // self.intervals[tier])
+            previous = self.buckets[tier]
+            if bucket != previous:
+                if previous is not None:
+                    ring = self.rings[tier]
+                    ring.append(self.sums[tier] / self.counts[tier] if self.counts[tier] else math.nan)
+                    # Intervals without any sample, no more than the ring holds
+                    for _ in range(min(bucket - previous - 1, len(ring.data))):
+                        ring.append(math.nan)
+                self.buckets[tier] = bucket
+                self.sums[tier] = 0.0
+                self.counts[tier] = 0
+            if not math.isnan(value):
+                self.sums[tier] += value
+                self.counts[tier] += 1
+
+    def values(self, tier=0, last=None):
+        return self.rings[tier].values(last)
+
+    def latest(self):
+        return self.rings[0].latest()
+
+    def current(self):
+        """Newest raw value, 0 while there is none or the newest sample was a gap."""
+        value = self.rings[0].latest()
+        return 0.0 if value is None or math.isnan(value) else value
+
+
+class TrafficMonitor:
+    """
+    Samples interface counters, load and memory on the router.
+
+    One SSH command per sample reads /proc/net/dev, /proc/loadavg and
+    /proc/meminfo. Counter deltas become per interface rates, which are kept
+    with the load and memory use in tiered ring buffers, so memory use is
+    fixed by TIERS and the number of interfaces.
+    """
+
+    def __init__(self, router, logger=None, scheduler=None):
+        self.router = router
+        self.logger = logger or logging.getLogger(__name__)
+        self.scheduler = scheduler or SCHEDULER
+        self.series = {}
+        self.counters = {}
+        self.last_sample = None
+        self.lock = threading.Lock()
+        self.job = None
+
+    @property
+    def job_name(self):
+        return f"traffic:{self.router.name}" if self.router.name else "traffic"
+
+    @property
+    def tiers(self):
+        return ((self.sample_interval(), TIERS[0][1]),) + TIERS[1:]
+
+    def sample_interval(self):
+        return self.router.config.get("traffic_sample_interval", 5)
+
+    def is_running(self):
+        return self.job is not None and not self.job.cancelled
+
+    def start(self):
+        if self.is_running():
+            return
+        with self.lock:
+            self.counters.clear()
+            self.last_sample = None
+        self.job = self.scheduler.add(self.job_name, self.sample, interval=self.sample_interval, delay=0,
+                                      pool=POOL_ROUTER)
+        self.logger.info("Traffic sampler started")
+
+    def stop(self):
+        if self.job:
+            self.job.cancel()
+            self.job = None
+        self.logger.info("Traffic sampler stopped")
+
+    def wanted(self, interface):
+        interfaces = self.router.config.get("traffic_interfaces", [])
+        return interface in interfaces if interfaces else interface != "lo"
+
+    def sample(self):
+        script = build_snapshot_script([
+            (SECTION_NET, "cat /proc/net/dev"),
+            (SECTION_LOAD, "cat /proc/loadavg"),
+            (SECTION_MEMORY, "cat /proc/meminfo"),
+        ])
+        output, _, _ = self.router.session.run(script)
+        sampled_at = time.monotonic()
+        sections = split_sections(output)
+        self.record(
+            time.time(),
+            sampled_at,
+            parse_net_dev(sections.get(SECTION_NET, (None, ""))[1]),
+            parse_loadavg(sections.get(SECTION_LOAD, (None, ""))[1]),
+            parse_meminfo(sections.get(SECTION_MEMORY, (None, ""))[1]),
+        )
+
+    def record(self, timestamp, sampled_at, counters, load, memory):
+        labels = {"router": self.router.name or ""}
+        with self.lock:
+            elapsed = sampled_at - self.last_sample if self.last_sample is not None else None
+            for interface, (rx, tx) in counters.items():
+                if not self.wanted(interface):
+                    continue
+                previous = self.counters.get(interface)
+                self.counters[interface] = (rx, tx)
+                if previous is None or not elapsed:
+                    continue
+                for direction, current, before in (("rx", rx, previous[0]), ("tx", tx, previous[1])):
+                    # A counter that went backwards wrapped or was reset, that sample is a gap
+                    rate = (current - before) / elapsed if current >= before else math.nan
+                    self.get_series(f"{direction}:{interface}").add(timestamp, rate)
+                    if not math.isnan(rate):
+                        INTERFACE_RATE.set(rate, interface=interface, direction=direction, **labels)
+            self.last_sample = sampled_at
+            if load:
+                self.get_series(SERIES_LOAD).add(timestamp, load[0])
+                LOAD_AVERAGE.set(load[0], **labels)
+            used = memory_used(memory)
+            if used:
+                self.get_series(SERIES_MEMORY).add(timestamp, 100 * used[0] / used[1])
+
+    def get_series(self, key):
+        if key not in self.series:
+            self.series[key] = TieredSeries(self.tiers)
+        return self.series[key]
+
+    def tier_names(self):
+        return [format_interval(interval) for interval, _ in self.tiers]
+
+    def summary(self, tier=0, width=SPARK_WIDTH):
+        interval, _ = self.tiers[tier]
+        span = format_interval(interval * width)
+        lines = [f"📶 Router traffic, {format_interval(interval)} points over the last {span}"]
+        with self.lock:
+            interfaces = sorted({key.split(":", 1)[1] for key in self.series if key.startswith("rx:")})
+            for interface in interfaces:
+                rx, tx = self.series[f"rx:{interface}"], self.series[f"tx:{interface}"]
+                lines.append("")
+                lines.append(f"{interface}  ↓ {format_rate(rx.current())}  ↑ {format_rate(tx.current())}")
+                lines.append(f"↓ {sparkline(rx.values(tier, width))}")
+                lines.append(f"↑ {sparkline(tx.values(tier, width))}")
+            load, memory = self.series.get(SERIES_LOAD), self.series.get(SERIES_MEMORY)
+            if load or memory:
+                lines.append("")
+            if load:
+                lines.append(f"Load {load.current():.2f}  {sparkline(load.values(tier, width))}")
+            if memory:
+                lines.append(f"Memory {memory.current():.0f}%  {sparkline(memory.values(tier, width))}")
+        if len(lines) == 1:
+            lines.append("No samples yet, rates show up after the second sample.")
+        return "\n".join(lines)
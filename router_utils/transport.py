@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import re
+import threading
+
+import metrics
+
+TRANSPORT_PARAMIKO = "paramiko"
+TRANSPORT_ASYNCSSH = "asyncssh"
+TRANSPORT_LOCAL = "local"
+
+SSH_COMMAND_SECONDS = metrics.histogram("router_ssh_command_seconds", "Time spent running commands on the router", ("command",))
+SSH_CONNECTION_ERRORS = metrics.counter("router_ssh_connection_errors_total", "Commands interrupted by a dropped SSH connection")
+SSH_RECONNECTS = metrics.counter("router_ssh_reconnects_total", "SSH reconnect attempts", ("result",))
+
+
+def command_label(command):
+    """Metric label for a command, the program name keeps the label set small."""
+    program = command.split(None, 1)[0] if command.strip() else ""
+    return program if re.match(r'^[\w./-]+$', program) else "script"
+
+
+class Transport:
+    """
+    How a Router runs shell commands.
+
+    Every backend offers the same calls: run() waits for a command and returns
+    its output, iter_lines() streams it, execute() starts a command without
+    waiting and run_async() is run() for coroutines. Backends are shared by
+    every thread that talks to the router and reconnect on their own.
+    """
+
+    name = None
+
+    def __init__(self, config, logger=None):
+        self.config = config
+        self.logger = logger or logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        # Notified after every reconnect attempt, one thread reconnects while the others wait on it
+        self.reconnected = threading.Condition(self.lock)
+        self.reconnecting = False
+        self.reconnect_error = None
+        self.closed = False
+
+    def connect(self):
+        raise NotImplementedError
+
+    def drop(self):
+        """Forget the current connection without marking the transport closed."""
+        raise NotImplementedError
+
+    def is_active(self):
+        raise NotImplementedError
+
+    def reconnect(self):
+        """
+        Re-establish the connection, e.g. after its settings changed.
+
+        Waits for a reconnect already running in another thread to finish
+        before starting its own.
+        """
+        with self.lock:
+            while self.reconnecting:
+                self.reconnected.wait()
+            self.reconnecting = True
+        self.run_reconnect()
+
+    def run_reconnect(self):
+        """Connect with exponential backoff, the caller has set self.reconnecting."""
+        retries = self.config.get("ssh_reconnect_retries", 5)
+        max_backoff = self.config.get("ssh_reconnect_max_backoff", 60)
+        delay = 1
+        try:
+            for attempt in range(1, retries + 1):
+                with self.lock:
+                    if self.closed:
+                        raise ConnectionError(f"{self.name} transport is closed")
+                    self.drop()
+                # Not under the lock, connecting can take as long as the handshake timeout
+                try:
+                    self.connect()
+                except Exception as e:
+                    SSH_RECONNECTS.inc(result="failed")
+                    self.logger.warning("Reconnect attempt %s/%s failed: %s", attempt, retries, e)
+                    with self.lock:
+                        self.reconnect_error = e
+                        self.reconnected.notify_all()
+                    if attempt == retries:
+                        raise
+                    # Waits without holding the lock, close() cuts the backoff short
+                    with self.lock:
+                        self.reconnected.wait_for(lambda: self.closed, delay)
+                    delay = min(delay * 2, max_backoff)
+                    continue
+                with self.lock:
+                    if self.closed:
+                        # close() ran while we were connecting, it stays closed
+                        self.drop()
+                        raise ConnectionError(f"{self.name} transport is closed")
+                    self.reconnect_error = None
+                SSH_RECONNECTS.inc(result="ok")
+                return
+        finally:
+            with self.lock:
+                self.reconnecting = False
+                self.reconnected.notify_all()
+
+    def ensure_connected(self):
+        if self.is_active():
+            return
+        with self.lock:
+            if self.closed:
+                raise ConnectionError(f"{self.name} transport is closed")
+            if self.reconnecting:
+                # Wait for the attempt in progress only, not for the whole backoff schedule
+                self.reconnected.wait()
+                if self.is_active():
+                    return
+                if self.closed:
+                    raise ConnectionError(f"{self.name} transport is closed")
+                raise ConnectionError(f"{self.name} transport is reconnecting, last attempt failed: {self.reconnect_error}")
+            # Another thread may have reconnected while we waited for the lock
+            if self.is_active():
+                return
+            self.reconnecting = True
+        self.run_reconnect()
+
+    def run(self, command, timeout=None, retry=True):
+        """
+        Run a command and wait for it to finish.
+
+        Args:
+            command (str): Shell command to run
+            timeout (float): Seconds to wait for output, defaults to ssh_command_timeout
+            retry (bool): Reconnect and run the command again if the connection dropped
+
+        Returns:
+            tuple: (stdout, stderr, exit_status)
+        """
+        raise NotImplementedError
+
+    async def run_async(self, command, timeout=None, retry=True):
+        """run() as a coroutine, backends without native async run it on a worker thread."""
+        return await asyncio.to_thread(self.run, command, timeout, retry)
+
+    def iter_lines(self, command, timeout=None, get_pty=False, max_bytes=None, on_open=None):
+        """
+        Run a command and yield its output line by line as it arrives.
+
+        Closing the generator ends the command. With get_pty=True the remote
+        side gets a hangup on close, which also stops any background jobs.
+        Once max_bytes of output have been read the command is ended and a
+        final truncation notice is yielded instead of the rest. on_open is
+        called with an object whose close() ends the command from another thread.
+        """
+        raise NotImplementedError
+
+    def execute(self, command):
+        """Start a command without waiting for its output, e.g. reboot."""
+        raise NotImplementedError
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.drop()
+            self.reconnected.notify_all()
+
+
+def split_lines(chunks, max_bytes=None):
+    """
+    Turn a stream of byte chunks into decoded lines, stopping after max_bytes.
+
+    Shared by the backends' iter_lines, the chunk iterator is left for the caller to close.
+    """
+    buffer = b""
+    received = 0
+    for data in chunks:
+        received += len(data)
+        if max_bytes and received > max_bytes:
+            data = data[:len(data) - (received - max_bytes)]
+        buffer += data
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            yield line.rstrip(b"\r").decode(errors="replace")
+        if max_bytes and received > max_bytes:
+            if buffer:
+                yield buffer.rstrip(b"\r").decode(errors="replace")
+            yield f"... output truncated at {max_bytes} bytes"
+            return
+    if buffer:
+        yield buffer.rstrip(b"\r").decode(errors="replace")
+
+
+def create_transport(config, logger=None):
+    """
+    The transport named by the router config's `transport` key.
+
+    paramiko is the default, asyncssh needs the optional asyncssh package and
+    local runs the commands on this machine, which is meant for testing.
+    """
+    name = config.get("transport", TRANSPORT_PARAMIKO)
+    if name == TRANSPORT_PARAMIKO:
+        from .ssh_session import SSHSession
+        return SSHSession(config, logger=logger)
+    if name == TRANSPORT_ASYNCSSH:
+        from .asyncssh_transport import AsyncSSHTransport
+        return AsyncSSHTransport(config, logger=logger)
+    if name == TRANSPORT_LOCAL:
+        from .local_transport import LocalTransport
+        return LocalTransport(config, logger=logger)
+    raise ValueError(f"Unknown transport: {name}")
@@ -0,0 +1,153 @@
+import logging
+import socket
+import threading
+import time
+
+import metrics
+from scheduler import SCHEDULER, POOL_ROUTER
+
+MODE_MONITOR = "monitor"
+MODE_POLL = "poll"
+
+# Output lines of `ip monitor address` that mean an address was added or removed
+ADDRESS_EVENT_MARKERS = ("inet ", "inet6 ")
+
+# A monitor channel that ends sooner than this without any output is taken as unsupported
+MONITOR_MIN_LIFETIME = 5
+
+WAN_EVENTS = metrics.counter("router_wan_events_total", "Address change events seen on the router", ("source",))
+
+
+class WanMonitor:
+    """
+    Watches the router's public IP.
+
+    In monitor mode a long-lived SSH channel runs `ip monitor address` on the
+    WAN interface and every address event triggers an external IP lookup
+    right away, with a slow poll as a safety net. The lookups run as a
+    scheduler job, only the blocking channel read has a thread of its own. Routers without `ip monitor`
+    fall back to polling, which starts at ip_poll_min_interval and backs off
+    to ip_poll_max_interval while the IP stays the same.
+    """
+
+    def __init__(self, router, logger=None, scheduler=None):
+        self.router = router
+        self.logger = logger or logging.getLogger(__name__)
+        self.scheduler = scheduler or SCHEDULER
+        self.stop_event = threading.Event()
+        self.monitoring = False
+        self.interval = router.config.get("ip_poll_min_interval", 60)
+        self.channel = None
+        self.job = None
+        self.monitor_thread = None
+
+    @property
+    def job_name(self):
+        return f"ip_watcher:{self.router.name}" if self.router.name else "ip_watcher"
+
+    def start(self):
+        if self.is_running():
+            return
+        self.stop_event.clear()
+        self.monitoring = self.router.config.get("ip_watcher_mode", MODE_MONITOR) == MODE_MONITOR
+        self.interval = self.router.config.get("ip_poll_min_interval", 60)
+        self.job = self.scheduler.add(self.job_name, self.check, interval=lambda: self.interval, delay=0,
+                                      jitter=self.router.config.get("ip_poll_jitter", 5), pool=POOL_ROUTER)
+        if self.monitoring:
+            self.monitor_thread = threading.Thread(target=self.monitor_loop, daemon=True)
+            self.monitor_thread.start()
+        self.logger.info("IP watcher started (%s mode)", MODE_MONITOR if self.monitoring else MODE_POLL)
+
+    def stop(self):
+        self.stop_event.set()
+        self.monitoring = False
+        if self.job:
+            self.job.cancel()
+            self.job = None
+        channel = self.channel
+        if channel is not None:
+            # Ends the blocking read in the monitor thread
+            channel.close()
+        self.logger.info("IP watcher stopped")
+
+    def restart(self):
+        self.stop()
+        if self.monitor_thread and self.monitor_thread is not threading.current_thread():
+            self.monitor_thread.join(timeout=5)
+        self.start()
+
+    def is_running(self):
+        return self.job is not None and not self.job.cancelled
+
+    def monitor_command(self):
+        interface = self.router.config.get("wan_interface", "")
+        return f"ip monitor address dev {interface}" if interface else "ip monitor address"
+
+    def monitor_loop(self):
+        retry_delay = self.router.config.get("ip_poll_min_interval", 60)
+        while not self.stop_event.is_set():
+            started_at = time.monotonic()
+            try:
+                events = self.read_events()
+            except socket.timeout:
+                # Quiet channel, reopen it so a half-dead connection is noticed
+                continue
+            except Exception as e:
+                self.logger.warning("WAN monitor channel failed: %s", e)
+                self.stop_event.wait(retry_delay)
+                continue
+            finally:
+                self.channel = None
+            if self.stop_event.is_set():
+                break
+            if not events and time.monotonic() - started_at < MONITOR_MIN_LIFETIME:
+                self.logger.warning("'ip monitor' is not available on the router, falling back to polling")
+                self.monitoring = False
+                self.wake()
+                return
+            # The monitor exited on its own, catch up on anything missed before reopening it
+            self.wake()
+            self.stop_event.wait(retry_delay)
+
+    def read_events(self):
+        timeout = self.router.config.get("ip_poll_max_interval", 900)
+        lines = self.router.session.iter_lines(self.monitor_command(), timeout=timeout, on_open=self.set_channel)
+        events = 0
+        for line in lines:
+            if self.stop_event.is_set():
+                break
+            if not line.strip():
+                continue
+            events += 1
+            if any(marker in line for marker in ADDRESS_EVENT_MARKERS):
+                self.logger.info("WAN address event: %s", line.strip())
+                WAN_EVENTS.inc(source="monitor")
+                self.wake()
+        return events
+
+    def set_channel(self, channel):
+        self.channel = channel
+
+    def wake(self):
+        # The settle time lets a burst of address events cost a single lookup
+        job = self.job
+        if job:
+            job.trigger(self.router.config.get("ip_monitor_settle", 2))
+
+    def check(self):
+        try:
+            changed = self.router.check_external_ip()
+        except Exception as e:
+            self.logger.error("IP watcher error: %s", e)
+            changed = False
+        self.interval = self.next_interval(self.interval, changed)
+
+    def next_interval(self, interval, changed):
+        min_interval = self.router.config.get("ip_poll_min_interval", 60)
+        max_interval = self.router.config.get("ip_poll_max_interval", 900)
+        if self.monitoring:
+            # Events drive the lookups, polling only catches what the monitor missed
+            return max_interval
+        if changed:
+            return min_interval
+        return min(max_interval, interval * 2)
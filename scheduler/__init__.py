@@ -0,0 +1,14 @@
+from .scheduler import Scheduler, Job, MISFIRE_RUN, MISFIRE_SKIP, POOL_DEFAULT, POOL_ROUTER
+
+# Shared by every component in the process, started when the first job is added
+SCHEDULER = Scheduler()
+
+__all__ = [
+    "SCHEDULER",
+    "Scheduler",
+    "Job",
+    "MISFIRE_RUN",
+    "MISFIRE_SKIP",
+    "POOL_DEFAULT",
+    "POOL_ROUTER",
+]
@@ -0,0 +1,267 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+DEFAULT_MAX_WORKERS = 4
+
+# Worker pools, router I/O can block for a long time on an unreachable router so it gets
+# its own pool and can't starve config reloads and history flushes
+POOL_DEFAULT = "default"
+POOL_ROUTER = "router"
+
+# What to do with a run that starts later than its misfire grace time
+MISFIRE_RUN = "run"
+MISFIRE_SKIP = "skip"
+
+JOB_RUNS = metrics.counter("scheduler_job_runs_total", "Scheduled job runs by result", ("job", "result"))
+JOB_SECONDS = metrics.histogram("scheduler_job_seconds", "Time spent running scheduled jobs", ("job",))
+JOB_LATENESS_SECONDS = metrics.histogram("scheduler_job_lateness_seconds", "How late scheduled jobs started", ("job",))
+
+
+class Job:
+    """
+    A function run by the Scheduler, once or every `interval` seconds.
+
+    interval may be a callable so a job can change its own pace, it is
+    evaluated after every run. The next run is planned when the previous one
+    finishes, so a job never overlaps itself.
+    """
+
+    def __init__(self, scheduler, name, func, interval=None, jitter=0, misfire=MISFIRE_RUN, misfire_grace=30,
+                 pool=POOL_DEFAULT):
+        self.scheduler = scheduler
+        self.name = name
+        self.func = func
+        self.pool = pool
+        self.interval = interval
+        self.jitter = jitter
+        self.misfire = misfire
+        self.misfire_grace = misfire_grace
+        self.next_run = None
+        self.seq = None
+        self.running = False
+        self.pending = False
+        self.cancelled = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_duration = None
+        self.last_error = None
+
+    def get_interval(self):
+        return self.interval() if callable(self.interval) else self.interval
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def trigger(self, delay=0):
+        """Run the job within `delay` seconds, earlier if it was due sooner anyway."""
+        self.scheduler.trigger(self, delay)
+
+    def summary(self, now):
+        interval = self.get_interval()
+        every = f"every {interval:g}s" if interval else "once"
+        if self.running:
+            state = "running"
+        elif self.next_run is not None:
+            state = f"next in {max(0.0, self.next_run - now):.0f}s"
+        else:
+            state = "idle"
+        last = f"{self.last_duration:.2f}s" if self.last_duration is not None else "n/a"
+        line = f"{self.name}: {every}, {state}, last run {last}, runs={self.runs} failures={self.failures}"
+        if self.skipped:
+            line += f" skipped={self.skipped}"
+        return line
+
+
+class Scheduler:
+    """
+    Runs periodic and one-off jobs from a single timer thread.
+
+    Due times live in a heap, the timer thread sleeps until the earliest one
+    and hands the job to the bounded worker pool the job was added to, so the
+    number of threads stays the same no matter how many jobs are registered.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, logger=None, router_workers=DEFAULT_MAX_WORKERS):
+        self.logger = logger or logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.router_workers = router_workers
+        self.jobs = {}
+        self.heap = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.executors = {}
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+            self.executors = {
+                POOL_DEFAULT: ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job"),
+                POOL_ROUTER: ThreadPoolExecutor(max_workers=self.router_workers, thread_name_prefix="router-job"),
+            }
+            self.thread = threading.Thread(target=self.loop, name="scheduler", daemon=True)
+            self.thread.start()
+        self.logger.info("Scheduler started with %s workers and %s router workers", self.max_workers, self.router_workers)
+
+    def stop(self):
+        with self.condition:
+            if not self.running:
+                return
+            self.running = False
+            self.condition.notify_all()
+            executors = list(self.executors.values())
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.logger.info("Scheduler stopped")
+
+    def add(self, name, func, interval=None, delay=None, jitter=0, misfire=MISFIRE_RUN, misfire_grace=30,
+            pool=POOL_DEFAULT):
+        """
+        Register a job, replacing any job with the same name.
+
+        Args:
+            name (str): Unique job name, shown by /jobs
+            func: Callable run on a worker thread
+            interval: Seconds between the end of a run and the next one, or a callable returning them.
+                None runs the job once
+            delay (float): Seconds until the first run, defaults to the interval
+            jitter (float): Up to this many seconds are added to every wait, spreads out jobs with the same interval
+            misfire (str): MISFIRE_RUN runs a late job anyway, MISFIRE_SKIP drops a run that is more than
+                misfire_grace seconds late and waits for the next one
+            pool (str): POOL_ROUTER for jobs that talk to a router, POOL_DEFAULT for everything else
+
+        Returns:
+            Job: Handle to trigger or cancel the job
+        """
+        job = Job(self, name, func, interval, jitter, misfire, misfire_grace, pool)
+        if delay is None:
+            delay = job.get_interval() or 0
+        self.start()
+        with self.condition:
+            old = self.jobs.get(name)
+            if old:
+                old.cancelled = True
+            self.jobs[name] = job
+            self.push(job, time.monotonic() + delay + self.jitter(job))
+        return job
+
+    def submit(self, name, func, pool=POOL_DEFAULT):
+        """Run func once as soon as a worker of the pool is free, without listing it as a job."""
+        job = Job(self, name, func, pool=pool)
+        self.start()
+        with self.condition:
+            self.push(job, time.monotonic())
+        return job
+
+    def jitter(self, job):
+        return random.uniform(0, job.jitter) if job.jitter else 0
+
+    def push(self, job, when):
+        # Older heap entries of the job stay behind and are dropped when they come up
+        job.seq = next(self.counter)
+        job.next_run = when
+        heapq.heappush(self.heap, (when, job.seq, job))
+        self.condition.notify()
+
+    def cancel(self, job):
+        with self.condition:
+            job.cancelled = True
+            job.next_run = None
+            if self.jobs.get(job.name) is job:
+                del self.jobs[job.name]
+            self.condition.notify()
+
+    def trigger(self, job, delay=0):
+        with self.condition:
+            if job.cancelled:
+                return
+            if job.running:
+                # Run again right after the current run instead of overlapping it
+                job.pending = True
+                return
+            when = time.monotonic() + delay
+            if job.next_run is None or when < job.next_run:
+                self.push(job, when)
+
+    def loop(self):
+        with self.condition:
+            while self.running:
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+                when, seq, job = self.heap[0]
+                if job.cancelled or seq != job.seq:
+                    heapq.heappop(self.heap)
+                    continue
+                now = time.monotonic()
+                if when > now:
+                    self.condition.wait(when - now)
+                    continue
+                heapq.heappop(self.heap)
+                job.next_run = None
+                job.running = True
+                try:
+                    self.executors[job.pool].submit(self.run_job, job, when)
+                except RuntimeError:
+                    # The pool was shut down by stop()
+                    job.running = False
+                    return
+
+    def run_job(self, job, due):
+        started_at = time.monotonic()
+        lateness = started_at - due
+        JOB_LATENESS_SECONDS.observe(lateness, job=job.name)
+        if job.misfire == MISFIRE_SKIP and lateness > job.misfire_grace:
+            job.skipped += 1
+            JOB_RUNS.inc(job=job.name, result="skipped")
+            self.logger.warning("Skipping job %s, it is %.1fs late", job.name, lateness)
+        else:
+            try:
+                job.func()
+                JOB_RUNS.inc(job=job.name, result="ok")
+                job.last_error = None
+            except Exception as e:
+                job.failures += 1
+                job.last_error = str(e)
+                JOB_RUNS.inc(job=job.name, result="error")
+                self.logger.error("Job %s failed: %s", job.name, e)
+            job.runs += 1
+            job.last_duration = time.monotonic() - started_at
+            JOB_SECONDS.observe(job.last_duration, job=job.name)
+        self.reschedule(job)
+
+    def reschedule(self, job):
+        try:
+            interval = job.get_interval()
+        except Exception as e:
+            self.logger.error("Job %s interval failed: %s", job.name, e)
+            interval = None
+        with self.condition:
+            job.running = False
+            if job.cancelled or not self.running:
+                return
+            if job.pending:
+                job.pending = False
+                self.push(job, time.monotonic())
+            elif interval:
+                self.push(job, time.monotonic() + interval + self.jitter(job))
+            elif self.jobs.get(job.name) is job:
+                del self.jobs[job.name]
+
+    def summary(self):
+        now = time.monotonic()
+        with self.condition:
+            jobs = sorted(self.jobs.values(), key=lambda job: job.name)
+        lines = [job.summary(now) for job in jobs]
+        return "\n".join(lines) if lines else "No scheduled jobs."
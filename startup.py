@@ -0,0 +1,123 @@
+"""
+Startup profiling for the server tools program.
+
+Run `python main.py --profile-startup` to start up, wait until the bot and the
+router are ready and print the time spent per startup phase and per import.
+"""
+
+import builtins
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_FLAG = "--profile-startup"
+
+# Imports slower than this are listed in the report
+IMPORT_REPORT_THRESHOLD = 0.001
+
+
+class ImportTimer:
+    """
+    Times every module imported through the import statement.
+
+    Cumulative time includes the modules a module imports itself, self time
+    doesn't. Nesting is tracked per thread since the bot and the router import
+    their libraries on their own threads.
+    """
+
+    def __init__(self):
+        self.times = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.original_import = None
+
+    def install(self):
+        if self.original_import is None:
+            self.original_import = builtins.__import__
+            builtins.__import__ = self.timed_import
+
+    def uninstall(self):
+        if self.original_import is not None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self.original_import(name, globals, locals, fromlist, level)
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        started_at = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self.lock:
+                self.times[name] = (elapsed, elapsed - children, threading.current_thread().name)
+
+    def slowest(self, count=15):
+        with self.lock:
+            items = list(self.times.items())
+        items.sort(key=lambda item: item[1][0], reverse=True)
+        return [(name, times) for name, times in items[:count] if times[0] >= IMPORT_REPORT_THRESHOLD]
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases = []
+        self.marks = []
+        self.imports = ImportTimer()
+        self.enabled = False
+
+    def enable(self):
+        self.enabled = True
+        self.imports.install()
+
+    @contextmanager
+    def phase(self, name):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, started_at - self.started_at, time.perf_counter() - started_at))
+
+    def mark(self, name):
+        """Record the moment something became ready, relative to process start."""
+        self.marks.append((name, time.perf_counter() - self.started_at))
+
+    def wait_for(self, name, predicate, timeout=60, interval=0.01):
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            if time.perf_counter() > deadline:
+                self.marks.append((f"{name} (timed out)", time.perf_counter() - self.started_at))
+                return False
+            time.sleep(interval)
+        self.mark(name)
+        return True
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    def report(self):
+        lines = [f"Startup profile ({self.elapsed():.3f}s since start):", "", "Phases:"]
+        for name, offset, duration in self.phases:
+            lines.append(f"  {name:<36} at {offset:7.3f}s  took {duration:7.3f}s")
+        if self.marks:
+            lines.append("")
+            lines.append("Ready:")
+            for name, offset in self.marks:
+                lines.append(f"  {name:<36} at {offset:7.3f}s")
+        slowest = self.imports.slowest()
+        if slowest:
+            lines.append("")
+            lines.append("Slowest imports (cumulative / self):")
+            for name, (cumulative, own, thread) in slowest:
+                lines.append(f"  {name:<36} {cumulative:7.3f}s / {own:7.3f}s  [{thread}]")
+        return "\n".join(lines)
+
+
+PROFILER = StartupProfiler()
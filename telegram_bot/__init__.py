@@ -1,3 +1,4 @@
 from .telegram_bot import TelegramBot, init_telegram_bot, init_bot_threaded
+from .queues import PRIORITY_ALERT, PRIORITY_INTERACTIVE, PRIORITY_BULK
 
-__all__ = ["TelegramBot", "init_telegram_bot", "init_bot_threaded"]
+__all__ = ["TelegramBot", "init_telegram_bot", "init_bot_threaded", "PRIORITY_ALERT", "PRIORITY_INTERACTIVE", "PRIORITY_BULK"]
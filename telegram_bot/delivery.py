@@ -0,0 +1,94 @@
+import gzip
+import hashlib
+import time
+
+# Telegram rejects text messages longer than this
+MESSAGE_LIMIT = 4096
+
+
+def chunk_text(text, limit=MESSAGE_LIMIT):
+    """
+    Split text into chunks no longer than `limit`, breaking at line boundaries.
+
+    Lines that are longer than the limit on their own are split hard.
+    """
+    if len(text) <= limit:
+        return [text]
+    chunks = []
+    current = []
+    size = 0
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                chunks.append("".join(current))
+                current, size = [], 0
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if size + len(line) > limit:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current:
+        chunks.append("".join(current))
+    return [chunk.rstrip("\n") for chunk in chunks if chunk.strip()]
+
+
+def tail_text(lines, limit=MESSAGE_LIMIT):
+    """Join the last lines that fit within `limit` characters."""
+    tail = []
+    size = 0
+    for line in reversed(lines):
+        if size + len(line) + 1 > limit:
+            break
+        tail.append(line)
+        size += len(line) + 1
+    return "\n".join(reversed(tail))
+
+
+def coalesce(items, limit=MESSAGE_LIMIT, separator="\n\n"):
+    """
+    Merge consecutive small messages into as few messages as possible.
+
+    Args:
+        items (list): (text, queued_at) tuples in queue order
+        limit (int): Max length of a merged message
+
+    Returns:
+        list: (text, queued_at) tuples, queued_at is the oldest of the merged items
+    """
+    merged = []
+    for text, queued_at in items:
+        if merged:
+            last_text, last_queued_at = merged[-1]
+            if len(last_text) + len(separator) + len(text) <= limit:
+                merged[-1] = (last_text + separator + text, last_queued_at)
+                continue
+        merged.append((text, queued_at))
+    return merged
+
+
+def compress_document(text):
+    return gzip.compress(text.encode())
+
+
+class DuplicateFilter:
+    """Drops messages identical to one already seen within `window` seconds."""
+
+    def __init__(self, window):
+        self.window = window
+        self.seen = {}
+
+    def is_duplicate(self, text):
+        if not self.window:
+            return False
+        now = time.monotonic()
+        # Prune expired entries so the table stays small
+        for digest, seen_at in list(self.seen.items()):
+            if now - seen_at >= self.window:
+                del self.seen[digest]
+        digest = hashlib.sha1(text.encode()).digest()
+        if digest in self.seen:
+            return True
+        self.seen[digest] = now
+        return False
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from collections import deque
+
+# Priority classes for outbound messages, lower sends first
+PRIORITY_ALERT = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BULK = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_ALERT: "alert",
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BULK: "bulk",
+}
+
+
+class PriorityMessageQueue:
+    """
+    Bounded queue with one FIFO per priority class.
+
+    Items can be put from any thread and are taken by a coroutine on the bot
+    event loop, highest priority first. When the queue is full a new item
+    pushes out the oldest item of a lower class, if there is none the new
+    item is rejected, so bulk output is shed before replies and replies
+    before alerts.
+    """
+
+    def __init__(self, maxsize=0, on_drop=None):
+        self.maxsize = maxsize
+        self.on_drop = on_drop
+        self.queues = {priority: deque() for priority in PRIORITY_NAMES}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.ready = None
+
+    def bind(self, loop):
+        """Wake the consumer on this event loop when items arrive, must be called on the loop."""
+        with self.lock:
+            self.loop = loop
+            self.ready = asyncio.Event() if loop else None
+            if self.ready and self.qsize_locked():
+                self.ready.set()
+
+    def qsize_locked(self):
+        return sum(len(items) for items in self.queues.values())
+
+    def qsize(self):
+        with self.lock:
+            return self.qsize_locked()
+
+    def sizes(self):
+        with self.lock:
+            return {PRIORITY_NAMES[priority]: len(items) for priority, items in self.queues.items()}
+
+    def put(self, item, priority=PRIORITY_INTERACTIVE):
+        """
+        Queue an item, safe to call from any thread.
+
+        Returns:
+            bool: False if the item was rejected because the queue is full
+        """
+        dropped = None
+        with self.lock:
+            if self.maxsize and self.qsize_locked() >= self.maxsize:
+                victim = next((p for p in sorted(self.queues, reverse=True) if p > priority and self.queues[p]), None)
+                if victim is None:
+                    dropped = (item, priority, "full")
+                else:
+                    dropped = (self.queues[victim].popleft(), victim, "evicted")
+            if dropped is None or dropped[2] == "evicted":
+                self.queues[priority].append(item)
+                if self.loop is not None:
+                    self.loop.call_soon_threadsafe(self.ready.set)
+        if dropped and self.on_drop:
+            self.on_drop(*dropped)
+        return dropped is None or dropped[2] == "evicted"
+
+    def get_nowait(self):
+        """The next (item, priority) pair, or None if the queue is empty."""
+        with self.lock:
+            for priority in sorted(self.queues):
+                if self.queues[priority]:
+                    return self.queues[priority].popleft(), priority
+        return None
+
+    async def get(self):
+        while True:
+            # Cleared before the check, a put in between sets it again
+            self.ready.clear()
+            item = self.get_nowait()
+            if item is not None:
+                return item
+            await self.ready.wait()
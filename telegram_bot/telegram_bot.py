@@ -3,8 +3,59 @@ import logging
 import queue
 import asyncio
 import time
-from telegram import Update, Bot
-from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters
+import secrets
+
+import metrics
+
+from .rate_limit import TokenBucket
+from .queues import PriorityMessageQueue, PRIORITY_ALERT, PRIORITY_BULK, PRIORITY_INTERACTIVE, PRIORITY_NAMES
+from .webhook import WebhookServer
+from .delivery import MESSAGE_LIMIT, DuplicateFilter, chunk_text, coalesce, compress_document, tail_text
+
+# Telegram allows about 30 messages per second overall, one per second in a
+# private chat and 20 per minute in a group
+GLOBAL_RATE = 30
+PRIVATE_CHAT_RATE = 1
+GROUP_CHAT_RATE = 20 / 60
+MAX_SEND_ATTEMPTS = 5
+
+# Inbound commands a chat may send per second, and the burst on top of that
+COMMAND_RATE = 1
+COMMAND_BURST = 5
+
+UPDATES_RECEIVED = metrics.counter("telegram_updates_received_total", "Messages received from Telegram")
+UPDATES_REJECTED = metrics.counter("telegram_updates_rejected_total", "Messages not passed on to the dispatcher", ("reason",))
+MESSAGES_DROPPED = metrics.counter("telegram_messages_dropped_total", "Outbound messages dropped from a full queue", ("priority", "reason"))
+MESSAGES_SENT = metrics.counter("telegram_messages_sent_total", "Messages and documents delivered to Telegram", ("kind",))
+SEND_RETRIES = metrics.counter("telegram_send_retries_total", "Send attempts retried", ("reason",))
+SEND_FAILURES = metrics.counter("telegram_send_failures_total", "Messages dropped after all retries")
+DELIVERY_SECONDS = metrics.histogram("telegram_delivery_seconds", "Time from queueing a message to Telegram accepting it")
+OUTBOUND_QUEUE_DEPTH = metrics.gauge("telegram_outbound_queue_depth", "Messages waiting to be sent")
+
+MODE_POLLING = "polling"
+MODE_WEBHOOK = "webhook"
+
+
+class DeliveryStats:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.dropped = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def record(self, latency):
+        self.sent += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def summary(self):
+        average = self.total_latency / self.sent if self.sent else 0.0
+        return (
+            f"sent={self.sent} failed={self.failed} retries={self.retries} dropped={self.dropped} "
+            f"latency avg={average:.3f}s max={self.max_latency:.3f}s"
+        )
 
 
 class TelegramBot:
@@ -15,8 +66,21 @@ class TelegramBot:
         self.logger = logger or logging.getLogger(__name__)
         self.thread = None
         self.app = None
-        self.command_queue = command_queue or queue.Queue()
-        self.message_queue = queue.Queue()
+        self.command_queue = command_queue or queue.Queue(telegram_config.get("command_queue_size", 100))
+        # Messages queued before the event loop is up wait here as well
+        self.message_queue = PriorityMessageQueue(telegram_config.get("outbound_queue_size", 500), on_drop=self.on_drop)
+        self.queue_lock = threading.Lock()
+        self.loop = None
+        self.stop_event = None
+        self.global_bucket = TokenBucket(telegram_config.get("rate_limit_global", GLOBAL_RATE),
+                                         telegram_config.get("rate_limit_burst", 3))
+        self.chat_buckets = {}
+        self.command_buckets = {}
+        self.throttled_chats = set()
+        self.rejected = {}
+        self.delivery_stats = DeliveryStats()
+        self.duplicates = DuplicateFilter(telegram_config.get("duplicate_window", 60))
+        OUTBOUND_QUEUE_DEPTH.set_function(self.queue_depth)
         self.running = False
         
         if self.token is None or self.chat_id is None:
@@ -30,37 +94,77 @@ class TelegramBot:
             else:
                 print(f"{key}: {value}")
     
-    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def start_command(self, update, context):
         pass  # Removed, handled in handle_message
     
-    async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    def is_allowed_chat(self, chat_id):
+        allowed = self.telegram_config.get("allowed_chat_ids", []) or [self.chat_id]
+        return str(chat_id) in {str(allowed_id) for allowed_id in allowed}
+
+    def get_command_bucket(self, chat_id):
+        if chat_id not in self.command_buckets:
+            self.command_buckets[chat_id] = TokenBucket(self.telegram_config.get("command_rate_per_chat", COMMAND_RATE),
+                                                        self.telegram_config.get("command_burst", COMMAND_BURST))
+        return self.command_buckets[chat_id]
+
+    def reject(self, reason, chat_id, text):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        UPDATES_REJECTED.inc(reason=reason)
+        self.logger.warning("Rejected message from chat %s (%s): %s", chat_id, reason, text)
+
+    async def handle_message(self, update, context):
         try:
             chat_id = update.effective_chat.id
             text = update.message.text
-            self.logger.info(f"Received message from chat {chat_id}: {text}")
+            self.logger.info("Received message from chat %s: %s", chat_id, text)
+            UPDATES_RECEIVED.inc()
 
-            # Put all messages to queue for main loop to process
-            self.command_queue.put(text)
-
-            if text.startswith("/"):
-                await update.message.reply_text(f"Command received: {text}")
-            else:
+            # Admission control, anything turned away here never reaches the dispatcher
+            if not self.is_allowed_chat(chat_id):
+                self.reject("chat", chat_id, text)
+                return
+            if not self.get_command_bucket(chat_id).try_acquire():
+                self.reject("rate_limited", chat_id, text)
+                # One notice per burst, a flood must not turn into a flood of replies
+                if chat_id not in self.throttled_chats:
+                    self.throttled_chats.add(chat_id)
+                    await update.message.reply_text("Too many messages, slow down. Commands are ignored for a moment.")
+                return
+            self.throttled_chats.discard(chat_id)
+            if not text.startswith("/"):
+                self.reject("not_command", chat_id, text)
                 await update.message.reply_text("Message received but not a command.")
+                return
+            try:
+                self.command_queue.put_nowait((text, time.monotonic()))
+            except queue.Full:
+                self.reject("queue_full", chat_id, text)
+                await update.message.reply_text(f"Busy, {text} was not queued. Try again in a moment.")
+                return
+            await update.message.reply_text(f"Command received: {text}")
         except Exception as e:
-            self.logger.error(f"Error handling message: {e}")
+            self.logger.error("Error handling message: %s", e)
             try:
                 await update.message.reply_text("An error occurred while processing your message.")
             except Exception as reply_error:
-                self.logger.error(f"Failed to send error reply: {reply_error}")
+                self.logger.error("Failed to send error reply: %s", reply_error)
     
     def initialize(self):
         if self.token is None:
             raise ValueError("No bot token")
+        # Imported here so it happens on the bot thread, in parallel with the router connecting
+        from telegram.ext import ApplicationBuilder, MessageHandler, filters
         try:
-            self.app = ApplicationBuilder().token(self.token).build()
+            builder = ApplicationBuilder().token(self.token)
+            base_url = self.telegram_config.get("base_url")
+            if base_url:
+                # Point the bot at another Bot API server, e.g. a local stand-in for testing
+                base_url = base_url.rstrip("/")
+                builder = builder.base_url(f"{base_url}/bot").base_file_url(f"{base_url}/file/bot")
+            self.app = builder.build()
             self.logger.info("Telegram bot application built successfully")
         except Exception as e:
-            self.logger.error(f"Failed to build Telegram bot application: {e}")
+            self.logger.error("Failed to build Telegram bot application: %s", e)
             raise
         
         # Add handlers
@@ -68,16 +172,153 @@ class TelegramBot:
         self.app.add_handler(MessageHandler(filters.COMMAND, self.handle_message))
         self.logger.info("Telegram bot initialized with handlers")
     
+    def get_chat_bucket(self, chat_id):
+        if chat_id not in self.chat_buckets:
+            is_group = str(chat_id).startswith("-")
+            rate = GROUP_CHAT_RATE if is_group else self.telegram_config.get("rate_limit_per_chat", PRIVATE_CHAT_RATE)
+            self.chat_buckets[chat_id] = TokenBucket(rate, self.telegram_config.get("rate_limit_burst", 3))
+        return self.chat_buckets[chat_id]
+
+    async def next_batch(self):
+        """
+        Wait for a message, then keep collecting for the coalescing window.
+
+        Returns:
+            list: ((text, queued_at), priority) pairs
+        """
+        batch = [await self.message_queue.get()]
+        window = self.telegram_config.get("coalesce_window", 0.3)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + window
+        size = len(batch[0][0][0])
+        while size < MESSAGE_LIMIT:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.message_queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0][0])
+        return batch
+
     async def send_messages_task(self):
         while self.running:
+            batch = await self.next_batch()
+            # Only repeated alerts are dropped, asking the same command twice gets two replies
+            batch = [item for item, priority in batch
+                     if priority != PRIORITY_ALERT or not self.duplicates.is_duplicate(item[0])]
+            for text, queued_at in coalesce(batch):
+                try:
+                    await self.send_text(text, queued_at)
+                except Exception as e:
+                    self.logger.error("Error sending message: %s", e)
+
+    async def send_text(self, text, queued_at):
+        if len(text) > self.telegram_config.get("document_threshold", 3 * MESSAGE_LIMIT):
+            document = compress_document(text)
+            caption = text.splitlines()[0][:200] if text.strip() else None
+            await self.deliver(
+                lambda: self.app.bot.send_document(chat_id=self.chat_id, document=document,
+                                                   filename="output.txt.gz", caption=caption),
+                f"document ({len(text)} chars, {len(document)} bytes compressed)",
+                queued_at,
+                kind="document",
+            )
+            return
+        for chunk in chunk_text(text):
+            await self.deliver(lambda: self.app.bot.send_message(chat_id=self.chat_id, text=chunk), chunk, queued_at)
+
+    async def deliver(self, send, description, queued_at, kind="message"):
+        from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+        chat_bucket = self.get_chat_bucket(self.chat_id)
+        for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+            await self.global_bucket.acquire()
+            await chat_bucket.acquire()
             try:
-                text = self.message_queue.get(timeout=1)
-                await self.app.bot.send_message(chat_id=self.chat_id, text=text)
-                self.logger.info(f"Sent message: {text}")
-            except queue.Empty:
-                await asyncio.sleep(0.1)
-            except Exception as e:
-                self.logger.error(f"Error sending message: {e}")
+                result = await send()
+                latency = time.monotonic() - queued_at
+                self.delivery_stats.record(latency)
+                DELIVERY_SECONDS.observe(latency)
+                MESSAGES_SENT.inc(kind=kind)
+                self.logger.info("Sent message after %.3fs: %s", latency, description)
+                return result
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if hasattr(retry_after, "total_seconds"):
+                    retry_after = retry_after.total_seconds()
+                self.delivery_stats.retries += 1
+                SEND_RETRIES.inc(reason="retry_after")
+                self.logger.warning("Rate limited by Telegram, retrying in %ss", retry_after)
+                await asyncio.sleep(retry_after)
+            except BadRequest as e:
+                # A subclass of NetworkError, but sending it again gets the same answer
+                self.fail_delivery(description, e)
+                return
+            except NetworkError as e:
+                self.delivery_stats.retries += 1
+                SEND_RETRIES.inc(reason="network")
+                delay = min(2 ** attempt, 30)
+                self.logger.warning("Network error sending message (attempt %s/%s): %s", attempt, MAX_SEND_ATTEMPTS, e)
+                await asyncio.sleep(delay)
+            except TelegramError as e:
+                # Forbidden, InvalidToken and the like are permanent too
+                self.fail_delivery(description, e)
+                return
+        self.delivery_stats.failed += 1
+        SEND_FAILURES.inc()
+        self.logger.error("Giving up on message after %s attempts: %s", MAX_SEND_ATTEMPTS, description)
+
+    def fail_delivery(self, description, error):
+        self.delivery_stats.failed += 1
+        SEND_FAILURES.inc()
+        self.logger.error("Telegram rejected message, not retrying (%s): %s", error, description)
+
+    async def run_async(self):
+        self.stop_event = asyncio.Event()
+        with self.queue_lock:
+            self.loop = asyncio.get_running_loop()
+            self.message_queue.bind(self.loop)
+
+        send_task = asyncio.create_task(self.send_messages_task())
+        try:
+            async with self.app:
+                await self.app.start()
+                if self.telegram_config.get("mode", MODE_POLLING) == MODE_WEBHOOK:
+                    await self.run_webhook()
+                else:
+                    await self.app.updater.start_polling()
+                    await self.stop_event.wait()
+                    await self.app.updater.stop()
+                await self.app.stop()
+        finally:
+            with self.queue_lock:
+                self.loop = None
+                self.message_queue.bind(None)
+            send_task.cancel()
+
+    async def run_webhook(self):
+        url = self.telegram_config.get("webhook_url")
+        if not url:
+            raise ValueError("webhook mode needs webhook_url")
+        path = self.telegram_config.get("webhook_path", "/telegram")
+        secret_token = self.telegram_config.get("webhook_secret") or secrets.token_urlsafe(32)
+        server = WebhookServer(
+            self.app,
+            path,
+            secret_token,
+            host=self.telegram_config.get("webhook_listen", "127.0.0.1"),
+            port=self.telegram_config.get("webhook_port", 8443),
+            logger=self.logger,
+        )
+        await server.start()
+        try:
+            await self.app.bot.set_webhook(url=url.rstrip("/") + server.path, secret_token=secret_token)
+            self.logger.info("Telegram webhook registered")
+            await self.stop_event.wait()
+        finally:
+            await server.stop()
 
     def run(self):
         self.running = True
@@ -87,19 +328,14 @@ class TelegramBot:
             try:
                 if self.app is None:
                     self.initialize()
-                self.logger.info("Starting Telegram bot polling...")
+                self.logger.info("Starting Telegram bot in %s mode...", self.telegram_config.get('mode', MODE_POLLING))
                 self.running = True
-                # Start the message sending task in the same event loop
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                send_task = loop.create_task(self.send_messages_task())
-                loop.run_until_complete(self.app.run_polling(stop_signals=None))
-                send_task.cancel()
-                # If run_polling() exits normally, break the loop
+                asyncio.run(self.run_async())
+                # If polling stops normally, break the loop
                 break
             except Exception as e:
                 retry_count += 1
-                self.logger.error(f"Error running bot (attempt {retry_count}/{max_retries}): {e}")
+                self.logger.error("Error running bot (attempt %s/%s): %s", retry_count, max_retries, e)
                 if retry_count < max_retries:
                     self.logger.info("Retrying in 5 seconds...")
                     time.sleep(5)
@@ -115,24 +351,127 @@ class TelegramBot:
             self.thread.start()
             self.logger.info("Telegram bot started in a separate thread")
         except Exception as e:
-            self.logger.error(f"Error starting bot thread: {e}")
+            self.logger.error("Error starting bot thread: %s", e)
             self.running = False
             self.disconnect()
             raise ValueError(f"Failed to start bot: {e}")
 
-    def send_message(self, text):
+    def send_message(self, text, priority=None):
+        """
+        Queue a message, safe to call from any thread.
+
+        Alerts go out before command replies and those before bulk output.
+        Without a priority, text too long for a single message counts as bulk.
+        """
         if not self.running:
             self.logger.warning("Bot not running!")
             return
+        if priority is None:
+            priority = PRIORITY_BULK if len(text) > MESSAGE_LIMIT else PRIORITY_INTERACTIVE
+        try:
+            if self.message_queue.put((text, time.monotonic()), priority):
+                self.logger.info("Queued %s message: %s", PRIORITY_NAMES[priority], text)
+        except Exception as e:
+            self.logger.error("Error queuing message: %s", e)
+
+    def on_drop(self, item, priority, reason):
+        self.delivery_stats.dropped += 1
+        MESSAGES_DROPPED.inc(priority=PRIORITY_NAMES[priority], reason=reason)
+        self.logger.warning("Outbound queue full, dropped %s message (%s): %s", PRIORITY_NAMES[priority], reason, item[0][:200])
+
+    def run_coroutine(self, coroutine, timeout=30):
+        """Run a coroutine on the bot event loop from another thread and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    async def wait_for_alerts(self):
+        """Let queued alerts go out before stream output, which does not pass through the queue."""
+        while self.message_queue.sizes()[PRIORITY_NAMES[PRIORITY_ALERT]]:
+            await asyncio.sleep(0.05)
+
+    async def start_stream(self, text):
+        """Send the message a stream edits, returns None if it could not be sent."""
+        await self.wait_for_alerts()
+        return await self.deliver(lambda: self.app.bot.send_message(chat_id=self.chat_id, text=text),
+                                  text, time.monotonic())
+
+    async def edit_message(self, message_id, text):
+        from telegram.error import RetryAfter, TelegramError
+        await self.wait_for_alerts()
+        await self.global_bucket.acquire()
+        await self.get_chat_bucket(self.chat_id).acquire()
+        # A failed edit is skipped, the next one carries the newer output anyway
+        try:
+            await self.app.bot.edit_message_text(chat_id=self.chat_id, message_id=message_id, text=text)
+        except RetryAfter as e:
+            self.logger.warning("Rate limited while editing message: %s", e)
+        except TelegramError as e:
+            # e.g. BadRequest "message is not modified"
+            self.logger.warning("Skipped message edit: %s", e)
+
+    def stream_message(self, lines, title):
+        """
+        Send output that is still being produced as one message that is edited in place.
+
+        Meant to be called from a command worker thread. Edits are throttled to
+        stream_edit_interval seconds and show the tail of the output, the full
+        output is sent as a normal message at the end if it did not fit. The
+        lines generator is closed on every exit, which ends the command.
+        """
+        if self.loop is None:
+            try:
+                self.send_message(f"{title}\n" + "\n".join(lines))
+            finally:
+                lines.close()
+            return
+        interval = self.telegram_config.get("stream_edit_interval", 1.5)
+        limit = MESSAGE_LIMIT - len(title) - 32
+        message = None
+        output = []
+        shown = None
+        last_edit = time.monotonic()
+        status = "✅ done"
         try:
-            self.message_queue.put(text)
-            self.logger.info(f"Queued message: {text}")
+            # Long enough for deliver's retries, the default 30s is not
+            message = self.run_coroutine(self.start_stream(f"{title}\n…"), timeout=120)
+            for line in lines:
+                output.append(line)
+                if message and time.monotonic() - last_edit >= interval:
+                    text = f"{title}\n{tail_text(output, limit)}\n…"
+                    if text != shown:
+                        self.run_coroutine(self.edit_message(message.message_id, text))
+                        shown = text
+                    last_edit = time.monotonic()
         except Exception as e:
-            self.logger.error(f"Error queuing message: {e}")
+            status = f"❌ {e}"
+            raise
+        finally:
+            lines.close()
+            full_output = "\n".join(output)
+            # Must not raise, that would hide the command's own exception
+            try:
+                if message is None:
+                    # The first send failed, the output still goes out as a normal message
+                    self.send_message(f"{title}\n{full_output}\n{status}")
+                else:
+                    self.run_coroutine(self.edit_message(message.message_id, f"{title}\n{tail_text(output, limit)}\n{status}"))
+                    if len(full_output) > limit:
+                        self.send_message(f"{title} (full output)\n{full_output}", PRIORITY_BULK)
+            except Exception as e:
+                self.logger.error("Error sending final stream output for %s: %s", title, e)
+
+    def queue_depth(self):
+        return self.message_queue.qsize()
+
+    def delivery_summary(self):
+        queued = " ".join(f"{name}={size}" for name, size in self.message_queue.sizes().items())
+        rejected = " ".join(f"{reason}={count}" for reason, count in sorted(self.rejected.items())) or "none"
+        return f"queued {queued}\n{self.delivery_stats.summary()}\nrejected inbound: {rejected}"
 
     def disconnect(self):
         self.running = False
-        # Note: No need to explicitly stop the app since the thread is daemon and will die with the process
+        with self.queue_lock:
+            if self.loop is not None and self.stop_event is not None:
+                self.loop.call_soon_threadsafe(self.stop_event.set)
         # No need to join daemon threads
 
 
@@ -140,7 +479,7 @@ def init_telegram_bot(telegram_config, logger) -> TelegramBot:
     try:
         bot = TelegramBot(telegram_config, logger)
     except Exception as e:
-        logger.error(f"Error initializing Telegram bot: {e}")
+        logger.error("Error initializing Telegram bot: %s", e)
         raise e
     return bot
 
@@ -0,0 +1,91 @@
+import asyncio
+import hmac
+import json
+import logging
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class WebhookServer:
+    """
+    Minimal embedded HTTP server receiving Telegram webhook updates.
+
+    Only POST requests to the configured path with the right secret token are
+    accepted, each update is handed straight to the application.
+    """
+
+    def __init__(self, app, path, secret_token, host="127.0.0.1", port=8443, logger=None):
+        self.app = app
+        self.path = path if path.startswith("/") else f"/{path}"
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.logger = logger or logging.getLogger(__name__)
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.logger.info("Webhook server listening on %s:%s%s", self.host, self.port, self.path)
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def handle_connection(self, reader, writer):
+        try:
+            status = await self.handle_request(reader)
+        except Exception as e:
+            self.logger.error("Error handling webhook request: %s", e)
+            status = "500 Internal Server Error"
+        try:
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def handle_request(self, reader):
+        request_line = (await reader.readline()).decode(errors="replace").split()
+        if len(request_line) < 2:
+            return "400 Bad Request"
+        method, path = request_line[0], request_line[1]
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode(errors="replace")
+            if line in ("\r\n", "\n", ""):
+                break
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        if path != self.path:
+            return "404 Not Found"
+        if method != "POST":
+            return "405 Method Not Allowed"
+        # Compared as bytes, compare_digest raises TypeError on non-ASCII str
+        secret = headers.get(SECRET_HEADER, "").encode(errors="replace")
+        if self.secret_token and not hmac.compare_digest(secret, self.secret_token.encode()):
+            self.logger.warning("Rejected webhook request with invalid secret token")
+            return "403 Forbidden"
+
+        # Bad requests get a 4xx, Telegram keeps redelivering updates answered with a 5xx
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            return "400 Bad Request"
+        if length <= 0 or length > MAX_BODY_SIZE:
+            return "400 Bad Request"
+        try:
+            body = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            return "400 Bad Request"
+        from telegram import Update
+        try:
+            update = Update.de_json(json.loads(body), self.app.bot)
+        except Exception as e:
+            self.logger.warning("Rejected malformed webhook update: %s", e)
+            return "400 Bad Request"
+        await self.app.update_queue.put(update)
+        return "200 OK"
@@ -0,0 +1,10 @@
+import pytest
+
+from scheduler import Scheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler(max_workers=2)
+    yield scheduler
+    scheduler.stop()
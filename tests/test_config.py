@@ -0,0 +1,62 @@
+import pytest
+import tomli_w
+
+from config import Config, CONFIG_TELEGRAM
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        tomli_w.dump(data, f)
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "telegram.toml"
+    write(path, {"token": "123:abc", "chat_id": 42, "allowed_chat_ids": [1, 2]})
+    return str(path)
+
+
+def test_validate_accepts_defaults_types(config_path):
+    config = Config(config_path, config_type=CONFIG_TELEGRAM)
+    config.validate()
+    assert config.get("allowed_chat_ids") == [1, 2]
+
+
+@pytest.mark.parametrize("key, value", [
+    ("allowed_chat_ids", "1,2"),
+    ("rate_limit_global", "fast"),
+    ("rate_limit_global", True),
+])
+def test_validate_rejects_wrong_type(config_path, key, value):
+    config = Config(config_path, config_type=CONFIG_TELEGRAM)
+    with pytest.raises(ValueError):
+        config.validate({key: value})
+
+
+def test_reload_reports_changed_keys(config_path):
+    config = Config(config_path, config_type=CONFIG_TELEGRAM)
+    seen = []
+    config.subscribe(lambda config, changed: seen.append(changed))
+    write(config_path, {"token": "123:abc", "chat_id": 43, "allowed_chat_ids": [1, 2]})
+    assert config.reload() == {"chat_id"}
+    assert seen == [{"chat_id"}]
+    assert config.get("chat_id") == 43
+
+
+def test_reload_keeps_old_config_when_invalid(config_path):
+    config = Config(config_path, config_type=CONFIG_TELEGRAM)
+    write(config_path, {"token": "123:abc", "chat_id": 42, "allowed_chat_ids": "1"})
+    with pytest.raises(ValueError):
+        config.reload()
+    assert config.get("allowed_chat_ids") == [1, 2]
+
+
+def test_reload_keeps_unsaved_changes(config_path):
+    config = Config(config_path, config_type=CONFIG_TELEGRAM)
+    config.set("rate_limit_global", 5)
+    write(config_path, {"token": "123:abc", "chat_id": 43, "allowed_chat_ids": [1, 2]})
+    assert config.reload() == {"chat_id"}
+    assert config.get("rate_limit_global") == 5
+    assert config.is_dirty()
+    config.flush()
+    assert Config(config_path, config_type=CONFIG_TELEGRAM).get("rate_limit_global") == 5
@@ -0,0 +1,39 @@
+from telegram_bot.delivery import DuplicateFilter, chunk_text, coalesce, tail_text
+
+
+def test_chunk_text_keeps_short_text():
+    assert chunk_text("hello") == ["hello"]
+
+
+def test_chunk_text_breaks_at_lines():
+    text = "\n".join(f"line {index:02d}" for index in range(10))
+    chunks = chunk_text(text, limit=30)
+    assert all(len(chunk) <= 30 for chunk in chunks)
+    assert "\n".join(chunks) == text
+
+
+def test_chunk_text_splits_long_line_hard():
+    chunks = chunk_text("x" * 25, limit=10)
+    assert chunks == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_tail_text_keeps_newest_lines():
+    assert tail_text(["one", "two", "three"], limit=10) == "two\nthree"
+
+
+def test_coalesce_merges_until_limit():
+    items = [("a" * 4, 1.0), ("b" * 4, 2.0), ("c" * 4, 3.0)]
+    assert coalesce(items, limit=10, separator="\n") == [("aaaa\nbbbb", 1.0), ("cccc", 3.0)]
+
+
+def test_coalesce_keeps_order_of_large_items():
+    items = [("a" * 8, 1.0), ("b", 2.0)]
+    assert coalesce(items, limit=8) == items
+
+
+def test_duplicate_filter():
+    duplicates = DuplicateFilter(window=60)
+    assert not duplicates.is_duplicate("alert")
+    assert duplicates.is_duplicate("alert")
+    assert not duplicates.is_duplicate("other")
+    assert not DuplicateFilter(window=0).is_duplicate("alert")
@@ -0,0 +1,16 @@
+from router_utils.devices import parse_arp_line
+
+
+def test_parse_arp_line_busybox():
+    line = "? (192.168.1.37) at AA:BB:CC:DD:EE:FF [ether]  on br-lan"
+    assert parse_arp_line(line) == ("aa:bb:cc:dd:ee:ff", "192.168.1.37", None, "br-lan")
+
+
+def test_parse_arp_line_with_hostname_and_flags():
+    line = "laptop.lan (192.168.1.20) at 00:11:22:33:44:55 [ether] PERM on eth0"
+    assert parse_arp_line(line) == ("00:11:22:33:44:55", "192.168.1.20", "laptop.lan", "eth0")
+
+
+def test_parse_arp_line_skips_incomplete():
+    assert parse_arp_line("? (192.168.1.9) at <incomplete>  on br-lan") is None
+    assert parse_arp_line("garbage") is None
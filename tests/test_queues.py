@@ -0,0 +1,37 @@
+from telegram_bot.queues import PriorityMessageQueue, PRIORITY_ALERT, PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+
+def drain(queue):
+    items = []
+    while (item := queue.get_nowait()) is not None:
+        items.append(item)
+    return items
+
+
+def test_higher_priority_comes_out_first():
+    queue = PriorityMessageQueue()
+    queue.put("bulk", PRIORITY_BULK)
+    queue.put("reply", PRIORITY_INTERACTIVE)
+    queue.put("alert", PRIORITY_ALERT)
+    assert drain(queue) == [("alert", PRIORITY_ALERT), ("reply", PRIORITY_INTERACTIVE), ("bulk", PRIORITY_BULK)]
+
+
+def test_full_queue_evicts_oldest_lower_priority():
+    dropped = []
+    queue = PriorityMessageQueue(maxsize=3, on_drop=lambda *args: dropped.append(args))
+    queue.put("bulk 1", PRIORITY_BULK)
+    queue.put("bulk 2", PRIORITY_BULK)
+    queue.put("reply", PRIORITY_INTERACTIVE)
+    assert queue.put("alert", PRIORITY_ALERT)
+    assert dropped == [("bulk 1", PRIORITY_BULK, "evicted")]
+    assert queue.sizes() == {"alert": 1, "interactive": 1, "bulk": 1}
+
+
+def test_full_queue_rejects_when_nothing_lower():
+    dropped = []
+    queue = PriorityMessageQueue(maxsize=2, on_drop=lambda *args: dropped.append(args))
+    queue.put("alert 1", PRIORITY_ALERT)
+    queue.put("reply", PRIORITY_INTERACTIVE)
+    assert not queue.put("bulk", PRIORITY_BULK)
+    assert dropped == [("bulk", PRIORITY_BULK, "full")]
+    assert queue.qsize() == 2
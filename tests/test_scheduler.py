@@ -0,0 +1,89 @@
+import threading
+import time
+
+from scheduler import MISFIRE_SKIP, POOL_ROUTER
+
+
+def test_trigger_runs_job_before_its_interval(scheduler):
+    ran = threading.Event()
+    job = scheduler.add("job", ran.set, interval=60)
+    job.trigger()
+    assert ran.wait(2)
+    assert job.runs == 1
+
+
+def test_trigger_while_running_runs_again_after(scheduler):
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def func():
+        runs.append(time.monotonic())
+        started.set()
+        release.wait(2)
+
+    job = scheduler.add("job", func, interval=60, delay=0)
+    assert started.wait(2)
+    job.trigger()
+    job.trigger()
+    release.set()
+    deadline = time.monotonic() + 2
+    while len(runs) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    # Both triggers during the run fold into one follow-up run
+    assert len(runs) == 2
+
+
+def test_cancel_stops_job(scheduler):
+    runs = []
+    job = scheduler.add("job", lambda: runs.append(1), interval=0.05, delay=0.2)
+    job.cancel()
+    time.sleep(0.4)
+    assert runs == []
+    assert "job" not in scheduler.jobs
+
+
+def test_add_replaces_job_with_same_name(scheduler):
+    runs = []
+    scheduler.add("job", lambda: runs.append("old"), delay=0.1)
+    scheduler.add("job", lambda: runs.append("new"), delay=0.1)
+    time.sleep(0.4)
+    assert runs == ["new"]
+
+
+def test_misfire_skip_drops_late_run(scheduler):
+    runs = []
+    job = scheduler.add("job", lambda: runs.append(1), delay=60, misfire=MISFIRE_SKIP,
+                        misfire_grace=0.5)
+    # Called directly as if the timer thread had handed it over a second late
+    job.running = True
+    scheduler.run_job(job, time.monotonic() - 1)
+    assert runs == []
+    assert job.skipped == 1
+
+
+def test_failing_job_is_counted(scheduler):
+    done = threading.Event()
+
+    def func():
+        done.set()
+        raise RuntimeError("boom")
+
+    job = scheduler.add("job", func, delay=0)
+    assert done.wait(2)
+    time.sleep(0.05)
+    assert job.failures == 1
+    assert job.last_error == "boom"
+
+
+def test_router_pool_does_not_block_other_jobs(scheduler):
+    release = threading.Event()
+    for index in range(scheduler.router_workers + 1):
+        scheduler.submit(f"router_{index}", lambda: release.wait(2), pool=POOL_ROUTER)
+    ran = threading.Event()
+    scheduler.add("config_watcher", ran.set, delay=0)
+    try:
+        assert ran.wait(1)
+    finally:
+        release.set()
@@ -0,0 +1,48 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from router_utils.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return "result"
+
+    with ThreadPoolExecutor(4) as executor:
+        leader = executor.submit(flight.do, "key", fetch)
+        while not flight.in_flight():
+            pass
+        followers = [executor.submit(flight.do, "key", fetch) for _ in range(3)]
+        while flight.in_flight().get("key") != 3:
+            pass
+        release.set()
+        results = [future.result(2) for future in [leader] + followers]
+
+    assert results == ["result"] * 4
+    assert calls == [1]
+    assert flight.in_flight() == {}
+
+
+def test_error_reaches_every_caller_and_frees_key():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: "again") == "again"
+
+
+def test_keys_are_independent():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
@@ -0,0 +1,26 @@
+import subprocess
+
+from router_utils.snapshot import build_snapshot_script, split_sections
+
+
+def test_split_sections():
+    output = "\n".join([
+        "@@SNAPSHOT uptime@@",
+        " 12:00:00 up 1 day",
+        "@@SNAPSHOT_END uptime 0@@",
+        "@@SNAPSHOT load@@",
+        "@@SNAPSHOT_END load 1@@",
+        "@@SNAPSHOT memory@@",
+        "MemTotal: 1 kB",
+    ])
+    assert split_sections(output) == {
+        "uptime": (0, " 12:00:00 up 1 day"),
+        "load": (1, ""),
+        "memory": (None, "MemTotal: 1 kB"),
+    }
+
+
+def test_snapshot_script_round_trip():
+    script = build_snapshot_script([("one", "echo 1"), ("two", "false")])
+    output = subprocess.run(["sh", "-c", script], capture_output=True, text=True).stdout
+    assert split_sections(output) == {"one": (0, "1"), "two": (1, "")}
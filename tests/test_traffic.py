@@ -0,0 +1,45 @@
+import math
+
+from router_utils.traffic import RingBuffer, TieredSeries
+
+
+def test_ring_buffer_overwrites_oldest():
+    ring = RingBuffer(3)
+    for value in range(5):
+        ring.append(value)
+    assert ring.values() == [2, 3, 4]
+    assert ring.values(last=2) == [3, 4]
+    assert ring.latest() == 4
+
+
+def test_tiered_series_averages_per_interval():
+    series = TieredSeries(((None, 10), (60, 10)))
+    for timestamp, value in ((0, 1.0), (30, 3.0), (60, 5.0), (120, 7.0)):
+        series.add(timestamp, value)
+    assert series.values() == [1.0, 3.0, 5.0, 7.0]
+    # A point is stored once its interval is over, 120 is still open
+    assert series.values(tier=1) == [2.0, 5.0]
+
+
+def test_tiered_series_gaps():
+    series = TieredSeries(((None, 10), (60, 10)))
+    series.add(0, 4.0)
+    series.add(10, math.nan)
+    series.add(60, math.nan)
+    assert math.isnan(series.latest())
+    assert series.current() == 0.0
+    assert series.values(tier=1) == [4.0]
+
+
+def test_tiered_series_keeps_gaps_in_higher_tiers():
+    series = TieredSeries(((None, 10), (60, 10)))
+    series.add(0, 1.0)
+    series.add(60, math.nan)
+    series.add(90, math.nan)
+    # Nothing at all between 120 and 240
+    series.add(240, 3.0)
+    series.add(300, 5.0)
+    values = series.values(tier=1)
+    assert values[0] == 1.0
+    assert [math.isnan(value) for value in values[1:4]] == [True, True, True]
+    assert values[4] == 3.0
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+from telegram_bot.webhook import WebhookServer, SECRET_HEADER
+
+SECRET = "s3cret"
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 7,
+        "date": 0,
+        "chat": {"id": 42, "type": "private"},
+        "text": "/help",
+    },
+}
+
+
+class FakeApp:
+    def __init__(self):
+        self.bot = None
+        self.update_queue = asyncio.Queue()
+
+
+async def post(port, body, headers):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    lines = ["POST /telegram HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}"]
+    lines += [f"{key}: {value}" for key, value in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+    await writer.drain()
+    status = (await reader.readline()).decode().split(" ", 1)[1].strip()
+    writer.close()
+    return status
+
+
+def run_requests(*requests):
+    """Start a WebhookServer, send each (body, headers) request and return the statuses and queued updates."""
+    async def main():
+        app = FakeApp()
+        server = WebhookServer(app, "/telegram", SECRET, port=0)
+        await server.start()
+        port = server.server.sockets[0].getsockname()[1]
+        try:
+            statuses = [await post(port, body, headers) for body, headers in requests]
+        finally:
+            await server.stop()
+        updates = []
+        while not app.update_queue.empty():
+            updates.append(app.update_queue.get_nowait())
+        return statuses, updates
+
+    return asyncio.run(main())
+
+
+def test_update_with_secret_is_delivered():
+    statuses, updates = run_requests((json.dumps(UPDATE).encode(), {SECRET_HEADER: SECRET}))
+    assert statuses == ["200 OK"]
+    assert [update.message.text for update in updates] == ["/help"]
+
+
+def test_wrong_secret_is_rejected():
+    statuses, updates = run_requests(
+        (json.dumps(UPDATE).encode(), {SECRET_HEADER: "wrong"}),
+        (json.dumps(UPDATE).encode(), {SECRET_HEADER: "geheimnis-ä"}),
+        (json.dumps(UPDATE).encode(), {}),
+    )
+    assert statuses == ["403 Forbidden"] * 3
+    assert updates == []
+
+
+def test_malformed_update_is_a_client_error():
+    statuses, updates = run_requests(
+        (b"not json", {SECRET_HEADER: SECRET}),
+        (b"[1, 2]", {SECRET_HEADER: SECRET}),
+    )
+    assert statuses == ["400 Bad Request"] * 2
+    assert updates == []